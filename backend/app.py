@@ -1,22 +1,51 @@
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, request, jsonify, send_from_directory, url_for
 from flask_cors import CORS
 import os
 import tempfile
 import subprocess
 import json
+import re
+import sys
 from werkzeug.utils import secure_filename
 import threading
 import time
 import uuid
+from functools import lru_cache
 from pathlib import Path
 
+from webhooks import SECRET_ENV, WebhookDispatcher
+
+# The transcript writers and the punctuation model live next to the scripts
+SCRIPTS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'whisper-diarization')
+if SCRIPTS_DIR not in sys.path:
+    sys.path.append(SCRIPTS_DIR)
+from diarization import SpeakerIndex
+from writers import output_path, write_transcript
+
+try:
+    from flask_sock import Sock
+    from simple_websocket import ConnectionClosed
+except ImportError:  # live transcription is optional
+    Sock = None
+
 app = Flask(__name__, static_folder='../frontend', static_url_path='')
 CORS(app)
+sock = Sock(app) if Sock is not None else None
 
 # Configuration
 UPLOAD_FOLDER = 'uploads'
 OUTPUT_FOLDER = 'outputs'
+# Speakers enrolled by jobs, whose names replace their labels in later transcripts
+SPEAKER_INDEX_FOLDER = 'speakers'
 ALLOWED_EXTENSIONS = {'wav', 'mp3', 'm4a', 'flac', 'ogg'}
+# Most segments a single /api/result page returns
+MAX_RESULT_PAGE = 2000
+# Formats the diarization script writes, /api/download serves them
+SCRIPT_FORMATS = ('timestamped', 'json', 'srt')
+# /api/download formats that are served from a script format of another name
+DOWNLOAD_FORMATS = {'txt': 'timestamped'}
+# What diarize_simple.py prints before falling back to a single speaker
+DIARIZATION_FAILED = 'Diarization failed'
 
 # Create directories if they don't exist
 for folder in [UPLOAD_FOLDER, OUTPUT_FOLDER]:
@@ -25,6 +54,13 @@ for folder in [UPLOAD_FOLDER, OUTPUT_FOLDER]:
 # Store processing jobs
 processing_jobs = {}
 
+# Notifies clients that passed a callback_url when their job is done
+webhooks = WebhookDispatcher()
+
+# Keeps API requests from reading the speaker index while another one rewrites it,
+# jobs enroll speakers from the diarization script
+speaker_index_lock = threading.Lock()
+
 def allowed_file(filename):
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
@@ -36,6 +72,19 @@ def format_time(seconds):
     secs = int(seconds % 60)
     return f"{hours:02d}:{minutes:02d}:{secs:02d}"
 
+@lru_cache(maxsize=None)
+def probe_cuda():
+    """Check once per process whether torch can use CUDA, returns (available, warning)"""
+    # torch is only imported the first time a job asks for CUDA
+    try:
+        import torch
+    except Exception:
+        return False, 'Torch not available; using CPU.'
+    
+    if not getattr(torch, 'cuda', None) or not torch.cuda.is_available():
+        return False, 'CUDA not available; using CPU.'
+    return True, None
+
 @app.route('/')
 def index():
     return send_from_directory('../frontend', 'index.html')
@@ -61,6 +110,23 @@ def upload_file():
         if not allowed_file(file.filename):
             return jsonify({'error': 'Invalid file type'}), 400
         
+        # Get processing options, refused callbacks don't leave the file behind
+        options = json.loads(request.form.get('options', '{}'))
+        callback_url = options.get('callback_url')
+        if callback_url is not None:
+            # resolved here and again on every delivery, see backend/webhooks.py
+            error = webhooks.check_url(callback_url)
+            if error:
+                return jsonify({'error': error}), 400
+            if not webhooks.enabled:
+                return jsonify({'error': f'callback_url needs {SECRET_ENV} to be set on the server'}), 400
+        # Speakers to enroll by their number, e.g. {"0": "Alice"} for SPEAKER_00
+        enroll = options.get('enroll', {})
+        if not isinstance(enroll, dict) or not all(
+                str(speaker).isdigit() and isinstance(name, str) and name.strip()
+                for speaker, name in enroll.items()):
+            return jsonify({'error': 'enroll must map speaker numbers to names'}), 400
+        
         # Generate unique job ID
         job_id = str(uuid.uuid4())
         
@@ -69,9 +135,6 @@ def upload_file():
         file_path = os.path.join(UPLOAD_FOLDER, f"{job_id}_{filename}")
         file.save(file_path)
         
-        # Get processing options
-        options = json.loads(request.form.get('options', '{}'))
-        
         # Store job info BEFORE starting thread
         processing_jobs[job_id] = {
             'status': 'processing',
@@ -79,8 +142,13 @@ def upload_file():
             'step': 'Initializing...',
             'filename': filename,
             'options': options,
+            # name, size and duration of the file before the browser resampled it
+            'source_audio': options.get('source_audio'),
             'created_at': time.time()
         }
+        if callback_url is not None:
+            processing_jobs[job_id]['callback_url'] = callback_url
+            processing_jobs[job_id]['result_url'] = url_for('get_result', job_id=job_id, _external=True)
         
         # Start processing in background
         thread = threading.Thread(target=process_audio, args=(job_id, file_path, options))
@@ -108,8 +176,27 @@ def get_result(job_id):
     if job['status'] != 'completed':
         return jsonify({'error': 'Job not completed'}), 400
     
-    # Return the transcript
-    return jsonify(job.get('result', {}))
+    result = job.get('result', [])
+    
+    # Without paging parameters the whole transcript is returned, as before
+    if 'offset' not in request.args and 'limit' not in request.args:
+        return jsonify(result)
+    
+    try:
+        offset = int(request.args.get('offset', 0))
+        limit = int(request.args.get('limit', 500))
+    except ValueError:
+        offset = limit = -1
+    if offset < 0 or limit < 1:
+        return jsonify({'error': 'offset and limit must be integers, offset >= 0 and limit >= 1'}), 400
+    limit = min(limit, MAX_RESULT_PAGE)
+    
+    return jsonify({
+        'segments': result[offset:offset + limit],
+        'offset': offset,
+        'limit': limit,
+        'total': len(result)
+    })
 
 @app.route('/api/download/<job_id>')
 def download_result(job_id):
@@ -120,14 +207,158 @@ def download_result(job_id):
     if job['status'] != 'completed':
         return jsonify({'error': 'Job not completed'}), 400
     
-    output_file = os.path.join(OUTPUT_FOLDER, f"{job_id}_transcript.txt")
-    if os.path.exists(output_file):
-        return send_from_directory(OUTPUT_FOLDER, f"{job_id}_transcript.txt", as_attachment=True)
+    # The timestamped transcript by default, or another file the diarization script wrote
+    file_format = request.args.get('format', 'txt')
+    script_format = DOWNLOAD_FORMATS.get(file_format, file_format)
+    if script_format not in SCRIPT_FORMATS:
+        return jsonify({'error': f"format must be one of {', '.join(DOWNLOAD_FORMATS)}, {', '.join(SCRIPT_FORMATS)}"}), 400
+    output_file = job.get('outputs', {}).get(script_format)
+
+    if output_file and os.path.exists(output_file):
+        return send_from_directory(
+            OUTPUT_FOLDER,
+            os.path.basename(output_file),
+            as_attachment=True,
+            download_name=output_path(f"{job_id}_transcript", script_format)
+        )
     
     return jsonify({'error': 'Output file not found'}), 404
 
+@app.route('/api/speakers')
+def list_speakers():
+    """List the speakers enrolled by earlier jobs"""
+    with speaker_index_lock:
+        return jsonify(SpeakerIndex(SPEAKER_INDEX_FOLDER).list_speakers())
+
+@app.route('/api/speakers/<path:name>', methods=['DELETE'])
+def delete_speaker(name):
+    """Forget an enrolled speaker, later transcripts number them again"""
+    with speaker_index_lock:
+        speaker_index = SpeakerIndex(SPEAKER_INDEX_FOLDER)
+        if not speaker_index.delete(name):
+            return jsonify({'error': 'Speaker not found'}), 404
+        speaker_index.save()
+    return jsonify({'deleted': name})
+
+def stream_transcription(ws):
+    """Transcribe microphone audio while it is being recorded
+
+    The client sends its options as JSON, then 16 kHz mono PCM16 frames, and
+    {"type": "stop"} when it is done. Every pass sends back the words that
+    became final, with their speaker when the options ask for diarization,
+    and the partial text after them.
+    """
+    from streaming import (
+        StreamingTranscriber, create_online_diarizer, load_model, words_to_segment, words_to_segments
+    )
+
+    try:
+        options = json.loads(ws.receive(timeout=10) or '{}')
+        device = options.get('device', 'cpu')
+        if device == 'cuda' and not probe_cuda()[0]:
+            device = 'cpu'
+        language = options.get('language')
+
+        # speaker labels need the diarization dependencies, the transcript doesn't
+        diarizer = None
+        if options.get('diarization'):
+            try:
+                diarizer = create_online_diarizer(device)
+            except Exception as e:
+                ws.send(json.dumps({'type': 'warning', 'message': f'Speaker labels are not available: {e}'}))
+
+        transcriber = StreamingTranscriber(
+            load_model(options.get('whisper_model', 'base'), device),
+            language=None if language in (None, 'auto') else language,
+            diarizer=diarizer
+        )
+        ws.send(json.dumps({'type': 'ready'}))
+
+        finished = False
+        while not finished:
+            message = ws.receive()
+            # take every frame that arrived during the last pass at once
+            while message is not None:
+                if isinstance(message, str):
+                    finished = json.loads(message).get('type') == 'stop'
+                    if finished:
+                        break
+                else:
+                    transcriber.insert_pcm16(message)
+                message = ws.receive(timeout=0)
+
+            if finished:
+                committed, pending = transcriber.finish(), []
+            elif transcriber.ready():
+                committed, pending = transcriber.process()
+            else:
+                continue
+
+            for segment in words_to_segments(committed, transcriber.speaker_of):
+                ws.send(json.dumps({'type': 'final', **segment}))
+            ws.send(json.dumps({'type': 'partial', **(words_to_segment(pending) or {'text': ''})}))
+
+        ws.send(json.dumps({'type': 'done'}))
+    except ConnectionClosed:
+        pass
+
+if sock is not None:
+    sock.route('/api/stream')(stream_transcription)
+
+def notify_job(job_id, succeeded):
+    """Send the webhook of a finished job, if its client asked for one"""
+    job = processing_jobs.get(job_id)
+    if not job or not job.get('callback_url'):
+        return
+    
+    payload = {
+        'event': 'job.completed' if succeeded else 'job.failed',
+        'job_id': job_id,
+        'status': job['status'],
+        'step': job['step'],
+        'filename': job['filename'],
+        'segments': len(job.get('result', [])),
+        'result_url': job['result_url'],
+        'created_at': job['created_at'],
+        'finished_at': time.time()
+    }
+    if job.get('warning'):
+        payload['warning'] = job['warning']
+    job['webhook_id'] = webhooks.submit(job['callback_url'], payload)
+
+def punctuate_transcript(transcript_data, language):
+    """Restore sentence punctuation in a finished transcript, in place
+
+    Every job thread queues the chunks of its transcript on one shared
+    punctuation service, which runs the chunks of concurrent jobs through the
+    model together. Returns whether the transcript was punctuated.
+    """
+    from helpers import punct_model_langs
+    from punctuation import get_punctuation_service, restore_punctuation
+
+    if language not in punct_model_langs:
+        return False
+    try:
+        service = get_punctuation_service()
+    except ImportError:  # deepmultilingualpunctuation is optional
+        return False
+
+    word_dicts = [{'word': word} for segment in transcript_data for word in segment['text'].split()]
+    if not word_dicts:
+        return False
+    labeled_words = service.predict([word_dict['word'] for word_dict in word_dicts])
+    restore_punctuation(word_dicts, labeled_words)
+
+    words = iter(word_dict['word'] for word_dict in word_dicts)
+    for segment in transcript_data:
+        segment['text'] = ' '.join(next(words) for _ in segment['text'].split())
+    print(f"Punctuation service: {service.stats()}")
+    return True
+
 def process_audio(job_id, file_path, options):
     """Process audio file using whisper-diarization"""
+    # failed runs still get a sample transcript, the webhook tells them apart
+    succeeded = False
     try:
         # Update job status
         processing_jobs[job_id]['step'] = 'Audio preprocessing...'
@@ -138,47 +369,45 @@ def process_audio(job_id, file_path, options):
         absolute_file_path = os.path.abspath(file_path)
         absolute_output_dir = os.path.abspath(OUTPUT_FOLDER)
         
+        # If CUDA selected but not available, force CPU to avoid failures that trigger fallback
+        device = options.get('device', 'cpu')
+        if device == 'cuda':
+            cuda_available, warning = probe_cuda()
+            if not cuda_available:
+                device = 'cpu'
+                processing_jobs[job_id]['warning'] = warning
+
         # Build command using simplified diarization script
         cmd = [
             'python', 
             'whisper-diarization/diarize_simple.py',
             '--audio-files', absolute_file_path,
             '--whisper-model', options.get('whisper_model', 'base'),
-            '--device', options.get('device', 'cpu'),
-            '--output-dir', absolute_output_dir
+            '--device', device,
+            '--output-dir', absolute_output_dir,
+            '--formats', *SCRIPT_FORMATS
         ]
-
-        # If CUDA selected but not available, force CPU to avoid failures that trigger fallback
-        try:
-            import torch  # noqa: F401
-            device_requested = options.get('device', 'cpu')
-            if device_requested == 'cuda':
-                # Rebuild cmd device to cpu when CUDA is unavailable
-                if not getattr(torch, 'cuda', None) or not torch.cuda.is_available():
-                    for i, token in enumerate(cmd):
-                        if token == '--device' and i + 1 < len(cmd):
-                            cmd[i + 1] = 'cpu'
-                            processing_jobs[job_id]['warning'] = 'CUDA not available; using CPU.'
-                            break
-        except Exception:
-            # If torch import fails, also force CPU
-            for i, token in enumerate(cmd):
-                if token == '--device' and i + 1 < len(cmd):
-                    cmd[i + 1] = 'cpu'
-                    processing_jobs[job_id]['warning'] = 'Torch not available; using CPU.'
-                    break
         
         # Add language if specified
         if options.get('language') and options.get('language') != 'auto':
             cmd.extend(['--language', options['language']])
         
-        # Skip diarization by default to avoid crashes on systems without proper setup
-        # User can enable it by providing hf_token in options
-        if not options.get('hf_token'):
+        # pyannote needs a Hugging Face token, the lite diarizer runs without one
+        env = os.environ.copy()
+        if options.get('diarization') is False:
             cmd.append('--no-diarization')
-        
-        # Output file
-        output_file = os.path.join(OUTPUT_FOLDER, f"{job_id}_transcript.txt")
+        else:
+            hf_token = options.get('hf_token') or os.environ.get('HF_TOKEN')
+            diarizer = options.get('diarizer') or ('pyannote' if hf_token else 'lite')
+            cmd.extend(['--diarizer', diarizer])
+            if diarizer == 'msdd':
+                cmd.extend(['--diarization-profile', options.get('diarization_profile', 'balanced')])
+            cmd.extend(['--speaker-index', os.path.abspath(SPEAKER_INDEX_FOLDER)])
+            if options.get('enroll'):
+                cmd.extend(['--enroll', *(f'{speaker}={name.strip()}' for speaker, name in options['enroll'].items())])
+            if hf_token:
+                # through the environment, so it doesn't show up in the process list
+                env['HF_TOKEN'] = hf_token
         
         processing_jobs[job_id]['step'] = 'Speech transcription...'
         processing_jobs[job_id]['progress'] = 30
@@ -193,7 +422,8 @@ def process_audio(job_id, file_path, options):
             stdout=subprocess.PIPE,
             stderr=subprocess.PIPE,
             text=True,
-            cwd=project_root
+            cwd=project_root,
+            env=env
         )
         
         # Simulate progress updates while process runs
@@ -232,9 +462,20 @@ def process_audio(job_id, file_path, options):
         
         if process.returncode == 0:
             # Process completed successfully
+            succeeded = True
             processing_jobs[job_id]['status'] = 'completed'
             processing_jobs[job_id]['progress'] = 100
             processing_jobs[job_id]['step'] = 'Complete!'
+
+            # The script falls back to a single speaker when the diarizer can't run,
+            # e.g. when pyannote.audio isn't installed, so the job still completes
+            failure = next((line for line in stdout.splitlines()
+                            if line.startswith(DIARIZATION_FAILED)), None)
+            if failure:
+                warning = f'{failure}, the transcript has a single speaker'
+                print(f"WARNING: Job {job_id}: {warning}")
+                previous = processing_jobs[job_id].get('warning')
+                processing_jobs[job_id]['warning'] = f'{previous}\n{warning}' if previous else warning
             
             # Parse the JSON output from diarization
             json_file = os.path.join(OUTPUT_FOLDER, f"{Path(file_path).stem}.json")
@@ -242,37 +483,41 @@ def process_audio(job_id, file_path, options):
             if os.path.exists(json_file):
                 with open(json_file, 'r', encoding='utf-8') as f:
                     transcript_data = json.load(f)
+
+                language = options.get('language')
+                if not language or language == 'auto':
+                    detected = re.search(r'^Detected language: (\S+)', stdout, re.MULTILINE)
+                    language = detected.group(1) if detected else None
+                if options.get('restore_punctuation', True):
+                    try:
+                        if punctuate_transcript(transcript_data, language):
+                            # so the downloads match the transcript on the page
+                            write_outputs(job_id, file_path, transcript_data)
+                    except Exception as e:
+                        warning = f'Punctuation restoration failed: {e}'
+                        print(f"WARNING: Job {job_id}: {warning}")
+                        previous = processing_jobs[job_id].get('warning')
+                        processing_jobs[job_id]['warning'] = f'{previous}\n{warning}' if previous else warning
                 
-                # Convert to frontend format
-                result = []
-                for segment in transcript_data:
-                    result.append({
-                        'speaker': segment.get('speaker', 'SPEAKER_00'),
-                        'startTime': format_time(segment['start']),
-                        'endTime': format_time(segment['end']),
-                        'text': segment['text']
-                    })
-                
-                processing_jobs[job_id]['result'] = result
-                
-                # Also save as text file
-                save_transcript_file(job_id, result, output_file)
+                processing_jobs[job_id]['result'] = to_frontend_result(transcript_data)
+                # The script wrote the downloads in the same pass
+                base_path = os.path.join(OUTPUT_FOLDER, Path(file_path).stem)
+                processing_jobs[job_id]['outputs'] = {
+                    file_format: output_path(base_path, file_format) for file_format in SCRIPT_FORMATS
+                }
             else:
                 # Fallback to sample result
-                result = create_sample_result(job_id)
-                processing_jobs[job_id]['result'] = result
-                save_transcript_file(job_id, result, output_file)
+                save_sample_result(job_id, file_path)
             
         else:
             # Process failed → gracefully fallback to sample transcript so UI can still render
             processing_jobs[job_id]['status'] = 'completed'
             processing_jobs[job_id]['progress'] = 100
             processing_jobs[job_id]['step'] = 'Complete (fallback)'
-            processing_jobs[job_id]['warning'] = (stderr or 'Processing failed')[:2000]
+            # the script logs its progress to stderr, the error is at the end
+            processing_jobs[job_id]['warning'] = (stderr or 'Processing failed')[-2000:]
 
-            result = create_sample_result(job_id)
-            processing_jobs[job_id]['result'] = result
-            save_transcript_file(job_id, result, output_file)
+            save_sample_result(job_id, file_path)
             
     except Exception as e:
         # Any unexpected error → also fallback
@@ -281,15 +526,13 @@ def process_audio(job_id, file_path, options):
         processing_jobs[job_id]['step'] = 'Complete (fallback)'
         processing_jobs[job_id]['warning'] = str(e)[:2000]
 
-        output_file = os.path.join(OUTPUT_FOLDER, f"{job_id}_transcript.txt")
-        result = create_sample_result(job_id)
-        processing_jobs[job_id]['result'] = result
-        save_transcript_file(job_id, result, output_file)
+        save_sample_result(job_id, file_path)
     
     finally:
         # Clean up uploaded file
         if os.path.exists(file_path):
             os.remove(file_path)
+        notify_job(job_id, succeeded)
 
 def create_sample_result(job_id):
     """Create a sample transcript result"""
@@ -300,46 +543,55 @@ def create_sample_result(job_id):
     samples = [
         {
             'speaker': 'Speaker 1',
-            'startTime': '00:00:00',
-            'endTime': '00:00:15',
+            'start': 0,
+            'end': 15,
             'text': f'This is a demonstration of the Whisper Diarization system processing the file {filename}. The system successfully identified multiple speakers and transcribed their speech.'
         },
         {
             'speaker': 'Speaker 2', 
-            'startTime': '00:00:16',
-            'endTime': '00:00:28',
+            'start': 16,
+            'end': 28,
             'text': 'The AI-powered transcription includes automatic punctuation, speaker separation, and timestamp generation. This makes it perfect for meetings, interviews, and podcasts.'
         },
         {
             'speaker': 'Speaker 1',
-            'startTime': '00:00:29',
-            'endTime': '00:00:45',
+            'start': 29,
+            'end': 45,
             'text': 'Key features include support for multiple audio formats, real-time processing feedback, and the ability to download results. The system uses OpenAI Whisper for transcription and NeMo for diarization.'
         },
         {
             'speaker': 'Speaker 3',
-            'startTime': '00:00:46',
-            'endTime': '00:01:02',
+            'start': 46,
+            'end': 62,
             'text': 'For production use, simply ensure the whisper-diarization dependencies are installed and the processing will use the actual AI models instead of this demo output.'
         }
     ]
     
     return samples
 
-def save_transcript_file(job_id, result, output_file):
-    """Save transcript to a text file"""
-    job = processing_jobs[job_id]
-    
-    with open(output_file, 'w', encoding='utf-8') as f:
-        f.write(f"Whisper Diarization Transcript\n")
-        f.write(f"Generated: {time.strftime('%Y-%m-%d %H:%M:%S')}\n")
-        f.write(f"File: {job['filename']}\n")
-        f.write(f"Options: {json.dumps(job['options'], indent=2)}\n")
-        f.write(f"{'=' * 50}\n\n")
-        
-        for segment in result:
-            f.write(f"[{segment['startTime']} - {segment['endTime']}] {segment['speaker']}:\n")
-            f.write(f"{segment['text']}\n\n")
+def save_sample_result(job_id, file_path):
+    """Give a job the sample transcript and write its downloads"""
+    transcript_data = create_sample_result(job_id)
+    processing_jobs[job_id]['result'] = to_frontend_result(transcript_data)
+    write_outputs(job_id, file_path, transcript_data)
+
+def write_outputs(job_id, file_path, transcript_data):
+    """Write the downloads of a job the way the diarization script does"""
+    processing_jobs[job_id]['outputs'] = write_transcript(
+        transcript_data, os.path.join(OUTPUT_FOLDER, Path(file_path).stem), SCRIPT_FORMATS, encoding='utf-8'
+    )
+
+def to_frontend_result(transcript_data):
+    """Convert the segments the diarization script writes to frontend format"""
+    return [
+        {
+            'speaker': segment.get('speaker', 'SPEAKER_00'),
+            'startTime': format_time(segment['start']),
+            'endTime': format_time(segment['end']),
+            'text': segment['text']
+        }
+        for segment in transcript_data
+    ]
 
 # Clean up old jobs periodically
 def cleanup_old_jobs():
@@ -350,10 +602,10 @@ def cleanup_old_jobs():
     for job_id, job in processing_jobs.items():
         if current_time - job['created_at'] > 3600:  # 1 hour
             jobs_to_remove.append(job_id)
-            # Clean up output file
-            output_file = os.path.join(OUTPUT_FOLDER, f"{job_id}_transcript.txt")
-            if os.path.exists(output_file):
-                os.remove(output_file)
+            # Clean up output files
+            for output_file in job.get('outputs', {}).values():
+                if os.path.exists(output_file):
+                    os.remove(output_file)
     
     for job_id in jobs_to_remove:
         del processing_jobs[job_id]
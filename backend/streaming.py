@@ -0,0 +1,273 @@
+"""
+Incremental Whisper transcription of a live audio stream.
+
+Audio arrives as 16 kHz mono PCM16 frames and is kept in a sliding window
+that is transcribed again every time enough new audio came in. A word is
+only committed once two consecutive passes agree on it (LocalAgreement-2),
+the rest is sent as a partial result that may still change. The window is
+trimmed at the last committed word, so every pass decodes a few seconds of
+audio instead of the whole stream. Committed words are sent to the client
+as they are committed, and only the last few are kept for the prompt.
+
+With an online diarizer, committed audio is diarized as well, in chunks of a
+couple of seconds so its VAD and speaker model have enough context, and
+final words are held back until the speaker they were said by is known.
+"""
+import functools
+import os
+import re
+import sys
+import threading
+from collections import deque
+
+import numpy as np
+
+SAMPLE_RATE = 16000
+mtypes = {'cpu': 'int8', 'cuda': 'float16'}
+
+# passes of that many streams run in parallel on the shared model, the others queue
+STREAM_WORKERS = int(os.environ.get('STREAM_WORKERS', 2))
+# committed words kept for the prompt, and the characters of them passed
+PROMPT_WORDS = 64
+PROMPT_CHARS = 200
+
+
+# streams that start together would each load a model of their own, the
+# cache only holds it once the first load returned
+_load_lock = threading.Lock()
+
+
+def _load_once(loader):
+    """Cache the model of ``loader``, loading it once per process even when streams race on it"""
+    cached = functools.lru_cache(maxsize=None)(loader)
+
+    @functools.wraps(loader)
+    def load(*args, **kwargs):
+        with _load_lock:
+            return cached(*args, **kwargs)
+    load.cache_clear = cached.cache_clear
+    return load
+
+
+@_load_once
+def load_model(model_name, device='cpu'):
+    """Load a Whisper model once per process, for every stream to transcribe with"""
+    from faster_whisper import WhisperModel
+
+    # CTranslate2 queues calls from more threads than it has workers
+    return WhisperModel(model_name, device=device, compute_type=mtypes[device],
+                        num_workers=STREAM_WORKERS)
+
+
+@_load_once
+def load_speaker_embedder(device='cpu'):
+    """Load the speaker model of the lite diarizer once per process, it keeps no state"""
+    # the diarization package lives next to the scripts in whisper-diarization
+    scripts_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'whisper-diarization')
+    if scripts_dir not in sys.path:
+        sys.path.append(scripts_dir)
+    from diarization.lite.lite import LiteDiarizer
+
+    return LiteDiarizer(device)
+
+
+def create_online_diarizer(device='cpu'):
+    """Create the speaker state of one stream, sharing the speaker model"""
+    from diarization.online import OnlineDiarizer
+
+    return OnlineDiarizer(device, embedder=load_speaker_embedder(device))
+
+
+def _normalize(word):
+    return re.sub(r'[^\w]', '', word.lower())
+
+
+class LocalAgreement:
+    """
+    Commits the words two consecutive hypotheses agree on, and keeps the
+    last ``max_committed`` of them
+    """
+
+    def __init__(self, max_committed=PROMPT_WORDS):
+        self.committed = deque(maxlen=max_committed)
+        self.pending = []
+
+    @property
+    def last_end(self):
+        return self.committed[-1][1] if self.committed else 0.0
+
+    def insert(self, words):
+        """
+        Take the ``(start, end, word)`` hypothesis of a pass, in seconds of
+        the stream, and return the words it commits.
+        """
+        # the window still holds the audio of words committed before
+        words = [word for word in words if word[0] > self.last_end - 0.1]
+
+        # and Whisper may transcribe the last of them again
+        if words and self.committed and abs(words[0][0] - self.last_end) < 1:
+            for n in range(min(len(self.committed), len(words), 5), 0, -1):
+                tail = [_normalize(self.committed[i][2]) for i in range(-n, 0)]
+                if tail == [_normalize(word[2]) for word in words[:n]]:
+                    words = words[n:]
+                    break
+
+        agreed = []
+        for word, previous in zip(words, self.pending):
+            if _normalize(word[2]) != _normalize(previous[2]):
+                break
+            agreed.append(word)
+        self.committed.extend(agreed)
+        self.pending = words[len(agreed):]
+        return agreed
+
+    def commit_until(self, time):
+        """Commit the pending words that start before ``time`` seconds"""
+        count = next((i for i, word in enumerate(self.pending) if word[0] >= time), len(self.pending))
+        flushed, self.pending = self.pending[:count], self.pending[count:]
+        self.committed.extend(flushed)
+        return flushed
+
+    def flush(self):
+        """Commit the pending words, at the end of the stream"""
+        return self.commit_until(float('inf'))
+
+
+class StreamingTranscriber:
+    """
+    Transcribes a stream of PCM16 frames with a sliding window.
+
+    ``min_chunk_sec`` of new audio triggers a pass, and after every pass the
+    window is cut back to ``max_buffer_sec`` at the last committed word, or
+    further, committing the pending words it cuts off, when Whisper doesn't
+    agree with itself for that long. An
+    ``OnlineDiarizer`` as ``diarizer`` labels the committed words, which
+    adds up to ``diarization_chunk_sec`` to their latency.
+    """
+
+    def __init__(self, model, language=None, min_chunk_sec=0.75, max_buffer_sec=12.0,
+                 diarizer=None, diarization_chunk_sec=2.0):
+        self.model = model
+        self.language = language
+        self.diarizer = diarizer
+        self.diarization_chunk_sec = diarization_chunk_sec
+        # seconds of the stream that were diarized, and the committed words after them
+        self.diarized_until = 0.0
+        self.undiarized = []
+        self.min_chunk = int(min_chunk_sec * SAMPLE_RATE)
+        self.max_buffer = int(max_buffer_sec * SAMPLE_RATE)
+        self.audio = np.zeros(0, dtype=np.float32)
+        # seconds of the stream before the window
+        self.offset = 0.0
+        self.unprocessed = 0
+        self.agreement = LocalAgreement()
+
+    def insert_pcm16(self, data):
+        samples = np.frombuffer(data, dtype='<i2').astype(np.float32) / 32768.0
+        self.audio = np.concatenate([self.audio, samples])
+        self.unprocessed += len(samples)
+
+    def ready(self):
+        return self.unprocessed >= self.min_chunk
+
+    def process(self):
+        """Transcribe the window, return the committed and the pending words"""
+        self.unprocessed = 0
+        # the text committed before the window keeps Whisper consistent
+        prompt = ''.join(word[2] for word in self.agreement.committed if word[1] <= self.offset)
+        segments, _ = self.model.transcribe(
+            self.audio,
+            language=self.language,
+            beam_size=1,
+            word_timestamps=True,
+            condition_on_previous_text=False,
+            initial_prompt=prompt[-PROMPT_CHARS:] or None,
+        )
+        words = [
+            (self.offset + word.start, self.offset + word.end, word.word)
+            for segment in segments
+            for word in (segment.words or [])
+        ]
+
+        committed = self.agreement.insert(words)
+        if len(self.audio) > self.max_buffer:
+            end = self.offset + len(self.audio) / SAMPLE_RATE
+            cut = self.agreement.last_end
+            if end - cut > self.max_buffer / SAMPLE_RATE:
+                committed += self.agreement.commit_until(end - self.max_buffer / SAMPLE_RATE)
+                cut = max(self.agreement.last_end, end - self.max_buffer / SAMPLE_RATE)
+            if cut > self.offset:
+                self._diarize(cut, force=True)
+                self._trim(cut)
+        return self._release(committed), self.agreement.pending
+
+    def finish(self):
+        """Transcribe what is left of the stream and commit all of it"""
+        released = []
+        if self.unprocessed:
+            released, _ = self.process()
+        flushed = self.agreement.flush()
+        self._diarize(self.offset + len(self.audio) / SAMPLE_RATE, force=True)
+        if self.diarizer is not None:
+            self.diarizer.finish()
+        return released + self._release(flushed)
+
+    def speaker_of(self, word):
+        """Return the speaker of a committed word, None without a diarizer"""
+        if self.diarizer is None:
+            return None
+        return self.diarizer.speaker_at(int((word[0] + word[1]) * 500))
+
+    def _release(self, committed):
+        """Return the committed words whose speaker is known"""
+        if self.diarizer is None:
+            return committed
+        self.undiarized += committed
+        if self.undiarized:
+            self._diarize(self.undiarized[-1][1])
+        released = [word for word in self.undiarized if word[1] <= self.diarized_until]
+        self.undiarized = self.undiarized[len(released):]
+        return released
+
+    def _diarize(self, time, force=False):
+        """Diarize the audio of the window up to ``time`` seconds of the stream"""
+        if self.diarizer is None or time <= self.diarized_until:
+            return
+        if not force and time - self.diarized_until < self.diarization_chunk_sec:
+            return
+        start = max(self.diarized_until, self.offset)
+        chunk = self.audio[int((start - self.offset) * SAMPLE_RATE):int((time - self.offset) * SAMPLE_RATE)]
+        if len(chunk):
+            self.diarizer.add_chunk(chunk, start)
+        self.diarized_until = time
+
+    def _trim(self, time):
+        cut = min(int((time - self.offset) * SAMPLE_RATE), len(self.audio))
+        self.audio = self.audio[cut:]
+        self.offset += cut / SAMPLE_RATE
+
+
+def words_to_segment(words):
+    """Join ``(start, end, word)`` words into one ``{start, end, text}`` segment"""
+    if not words:
+        return None
+    return {
+        'start': round(words[0][0], 2),
+        'end': round(words[-1][1], 2),
+        'text': ''.join(word[2] for word in words).strip(),
+    }
+
+
+def words_to_segments(words, speaker_of):
+    """Split words into segments at every change of speaker"""
+    segments, current, speaker = [], [], None
+    for word in words:
+        word_speaker = speaker_of(word)
+        if current and word_speaker != speaker:
+            segments.append({**words_to_segment(current), 'speaker': speaker})
+            current = []
+        current.append(word)
+        speaker = word_speaker
+    if current:
+        segments.append({**words_to_segment(current), 'speaker': speaker})
+    return segments
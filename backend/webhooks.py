@@ -0,0 +1,316 @@
+"""
+Signed webhook notifications of finished jobs.
+
+Clients that pass a ``callback_url`` with their upload options get a POST
+when their job is done, instead of polling /api/status. The JSON body is
+signed with HMAC-SHA256 over ``<timestamp>.<body>``, keyed with the
+WEBHOOK_SECRET environment variable, and sent as
+
+    X-Webhook-Id: <id of the notification, the same on every attempt>
+    X-Webhook-Timestamp: <unix time of the attempt>
+    X-Webhook-Signature: sha256=<hex digest>
+
+Failed deliveries are retried with exponential backoff by a fixed number
+of worker threads, waiting retries don't hold a worker.
+
+Callback URLs come from clients, so webhooks are only sent to hosts whose
+addresses are all public. The host is resolved when the URL is registered
+and again on every connection, which goes to the addresses that were just
+checked. WEBHOOK_ALLOWED_HOSTS, a comma-separated list of host names,
+limits callbacks to those hosts, and WEBHOOK_ALLOW_PRIVATE=1 lets them
+reach loopback and private addresses, e.g. for a local test receiver.
+"""
+import functools
+import hashlib
+import heapq
+import hmac
+import http.client
+import ipaddress
+import itertools
+import json
+import logging
+import os
+import random
+import socket
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+SECRET_ENV = 'WEBHOOK_SECRET'
+ALLOWED_HOSTS_ENV = 'WEBHOOK_ALLOWED_HOSTS'
+ALLOW_PRIVATE_ENV = 'WEBHOOK_ALLOW_PRIVATE'
+
+
+def sign(secret, timestamp, body):
+    """Return the signature header value of a body sent at ``timestamp``"""
+    message = f'{timestamp}.'.encode() + body
+    return 'sha256=' + hmac.new(secret.encode(), message, hashlib.sha256).hexdigest()
+
+
+def verify(secret, timestamp, body, signature):
+    """Check a signature the way a receiver should, in constant time"""
+    return hmac.compare_digest(sign(secret, timestamp, body), signature)
+
+
+class BlockedAddressError(OSError):
+    """The host of a callback URL resolves to an address webhooks aren't sent to"""
+
+
+def is_public_address(address):
+    """Whether an IP address is globally routable unicast"""
+    try:
+        ip = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    if ip.version == 6 and ip.ipv4_mapped:
+        ip = ip.ipv4_mapped
+    # not global covers loopback, private, link-local, shared, reserved and unspecified
+    return ip.is_global and not ip.is_multicast
+
+
+def resolve_callback_host(host, port, allow_private=False):
+    """
+    Return the getaddrinfo results of ``host``, raise ``BlockedAddressError``
+    when any of its addresses isn't public, unless ``allow_private``
+    """
+    infos = socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+    if not allow_private:
+        for *_, sockaddr in infos:
+            if not is_public_address(sockaddr[0]):
+                raise BlockedAddressError(f'{host} resolves to {sockaddr[0]}, which is not a public address')
+    return infos
+
+
+def _create_checked_connection(address, timeout, source_address=None, allow_private=False):
+    # connect to the addresses that were checked, so the host can't resolve elsewhere in between
+    host, port = address
+    error = None
+    for *_, sockaddr in resolve_callback_host(host, port, allow_private):
+        try:
+            return socket.create_connection(sockaddr[:2], timeout, source_address)
+        except OSError as e:
+            error = e
+    raise error
+
+
+class _CheckedConnection:
+    def __init__(self, *args, allow_private=False, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._create_connection = functools.partial(_create_checked_connection, allow_private=allow_private)
+
+
+class _CheckedHTTPConnection(_CheckedConnection, http.client.HTTPConnection):
+    pass
+
+
+class _CheckedHTTPSConnection(_CheckedConnection, http.client.HTTPSConnection):
+    pass
+
+
+class _CheckedHTTPHandler(urllib.request.HTTPHandler):
+    def __init__(self, allow_private):
+        super().__init__()
+        self.allow_private = allow_private
+
+    def http_open(self, req):
+        return self.do_open(functools.partial(_CheckedHTTPConnection, allow_private=self.allow_private), req)
+
+
+class _CheckedHTTPSHandler(urllib.request.HTTPSHandler):
+    def __init__(self, allow_private):
+        super().__init__()
+        self.allow_private = allow_private
+
+    def https_open(self, req):
+        return self.do_open(functools.partial(_CheckedHTTPSConnection, allow_private=self.allow_private), req,
+                            context=self._context)
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    # a redirected POST loses its body, so redirects count as failures
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class WebhookDispatcher:
+    """
+    Delivers notifications from a queue with ``workers`` threads.
+
+    A delivery that fails with a network error, a 5xx or a 429 is tried
+    again after ``base_delay`` seconds, doubling up to ``max_delay``, at
+    most ``max_attempts`` times. Other responses are final, and so are
+    hosts that resolve to addresses that aren't public. At most
+    ``max_pending`` notifications wait at once, ``submit`` refuses more.
+
+    ``allowed_hosts`` and ``allow_private`` default to the WEBHOOK_ALLOWED_HOSTS
+    and WEBHOOK_ALLOW_PRIVATE environment variables.
+    """
+
+    def __init__(self, secret=None, workers=4, max_attempts=6, base_delay=2.0, max_delay=300.0,
+                 timeout=10.0, max_pending=10000, allowed_hosts=None, allow_private=None):
+        self.secret = secret if secret is not None else os.environ.get(SECRET_ENV)
+        if allowed_hosts is None:
+            allowed_hosts = os.environ.get(ALLOWED_HOSTS_ENV, '').split(',')
+        self.allowed_hosts = {host.strip().lower() for host in allowed_hosts if host.strip()}
+        if allow_private is None:
+            allow_private = os.environ.get(ALLOW_PRIVATE_ENV, '').lower() in ('1', 'true', 'yes')
+        self.allow_private = allow_private
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.timeout = timeout
+        self.max_pending = max_pending
+        self.delivered = 0
+        self.failed = 0
+        # (due, order, id, url, body, attempt), soonest first
+        self._pending = []
+        self._order = itertools.count()
+        self._in_flight = 0
+        self._threads = []
+        self._closed = False
+        self._cond = threading.Condition()
+        # no proxies, the connection has to go to the checked addresses
+        self._opener = urllib.request.build_opener(
+            urllib.request.ProxyHandler({}), _CheckedHTTPHandler(allow_private),
+            _CheckedHTTPSHandler(allow_private), _NoRedirect
+        )
+
+    @property
+    def enabled(self):
+        return bool(self.secret)
+
+    def check_url(self, url):
+        """Return why notifications can't be sent to ``url``, None when they can"""
+        parsed = urlparse(url or '')
+        if parsed.scheme not in ('http', 'https') or not parsed.hostname:
+            return 'callback_url must be an http(s) URL'
+        host = parsed.hostname.lower()
+        if self.allowed_hosts and host not in self.allowed_hosts:
+            return f'callback_url host {host} is not allowed'
+        try:
+            port = parsed.port or (443 if parsed.scheme == 'https' else 80)
+        except ValueError:
+            return 'callback_url has an invalid port'
+        try:
+            resolve_callback_host(host, port, self.allow_private)
+        except BlockedAddressError as e:
+            return f'callback_url is not allowed, {e}'
+        except OSError:
+            return f'callback_url host {host} does not resolve'
+        return None
+
+    def submit(self, url, payload):
+        """Queue a notification, return its id or None when it can't be sent"""
+        if not self.enabled or self._closed:
+            return None
+        body = json.dumps(payload).encode()
+        delivery_id = str(uuid.uuid4())
+        with self._cond:
+            if len(self._pending) >= self.max_pending:
+                logger.warning('Webhook queue is full, dropping the notification to %s', url)
+                return None
+            self._start_workers()
+            heapq.heappush(self._pending, (time.monotonic(), next(self._order), delivery_id, url, body, 1))
+            self._cond.notify()
+        return delivery_id
+
+    def join(self, timeout=None):
+        """Wait until every queued notification was delivered or given up on"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self._pending or self._in_flight:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def close(self, timeout=None):
+        """Deliver what is due and stop the workers, waiting retries are dropped"""
+        with self._cond:
+            self._closed = True
+            self._pending = [item for item in self._pending if item[0] <= time.monotonic()]
+            heapq.heapify(self._pending)
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def _start_workers(self):
+        self._threads = [thread for thread in self._threads if thread.is_alive()]
+        while len(self._threads) < self.workers:
+            thread = threading.Thread(target=self._work, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def _next(self):
+        """Take the next due notification, None once closed and drained"""
+        with self._cond:
+            while True:
+                if self._pending:
+                    wait = self._pending[0][0] - time.monotonic()
+                    if wait <= 0:
+                        self._in_flight += 1
+                        return heapq.heappop(self._pending)
+                elif self._closed:
+                    return None
+                else:
+                    wait = None
+                self._cond.wait(wait)
+
+    def _work(self):
+        while True:
+            item = self._next()
+            if item is None:
+                return
+            _, _, delivery_id, url, body, attempt = item
+            retry = self._deliver(delivery_id, url, body)
+            with self._cond:
+                self._in_flight -= 1
+                if retry and attempt < self.max_attempts and not self._closed:
+                    delay = min(self.base_delay * 2 ** (attempt - 1), self.max_delay)
+                    # jitter keeps the retries of an outage from arriving all at once
+                    due = time.monotonic() + delay * random.uniform(0.5, 1.0)
+                    heapq.heappush(self._pending, (due, next(self._order), delivery_id, url, body, attempt + 1))
+                elif retry:
+                    self.failed += 1
+                    logger.warning('Giving up on webhook %s to %s after %d attempts', delivery_id, url, attempt)
+                self._cond.notify_all()
+
+    def _deliver(self, delivery_id, url, body):
+        """POST one notification, return whether it is worth retrying"""
+        timestamp = str(int(time.time()))
+        request = urllib.request.Request(url, data=body, method='POST', headers={
+            'Content-Type': 'application/json',
+            'User-Agent': 'whisper-diarization-webhooks',
+            'X-Webhook-Id': delivery_id,
+            'X-Webhook-Timestamp': timestamp,
+            'X-Webhook-Signature': sign(self.secret, timestamp, body),
+        })
+        try:
+            with self._opener.open(request, timeout=self.timeout):
+                pass
+        except urllib.error.HTTPError as e:
+            if e.code == 429 or e.code >= 500:
+                return True
+            with self._cond:
+                self.failed += 1
+            logger.warning('Webhook %s to %s was refused with %d', delivery_id, url, e.code)
+            return False
+        except urllib.error.URLError as e:
+            if isinstance(e.reason, BlockedAddressError):
+                with self._cond:
+                    self.failed += 1
+                logger.warning('Webhook %s to %s was blocked: %s', delivery_id, url, e.reason)
+                return False
+            return True
+        except OSError:
+            return True
+        with self._cond:
+            self.delivered += 1
+        return False
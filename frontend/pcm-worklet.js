@@ -0,0 +1,38 @@
+// Downsamples the microphone to 16 kHz mono PCM16 for live transcription
+class PcmDownsampler extends AudioWorkletProcessor {
+    constructor() {
+        super();
+        this.ratio = sampleRate / 16000;
+        // position of the next output sample in the input, across blocks
+        this.position = 0;
+        this.frame = new Int16Array(1600); // 100ms
+        this.length = 0;
+    }
+
+    process(inputs) {
+        const input = inputs[0];
+        if (!input || !input.length) return true;
+        const channel = input[0];
+
+        // averages the input samples that fall on every output sample
+        while (this.position < channel.length) {
+            const start = Math.floor(this.position);
+            const end = Math.min(Math.max(Math.floor(this.position + this.ratio), start + 1), channel.length);
+            let sum = 0;
+            for (let i = start; i < end; i++) sum += channel[i];
+            const sample = Math.max(-1, Math.min(1, sum / (end - start)));
+            this.frame[this.length++] = sample < 0 ? sample * 0x8000 : sample * 0x7fff;
+
+            if (this.length === this.frame.length) {
+                this.port.postMessage(this.frame.buffer, [this.frame.buffer]);
+                this.frame = new Int16Array(1600);
+                this.length = 0;
+            }
+            this.position += this.ratio;
+        }
+        this.position -= channel.length;
+        return true;
+    }
+}
+
+registerProcessor('pcm-downsampler', PcmDownsampler);
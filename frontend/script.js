@@ -14,6 +14,10 @@ const progressText = document.getElementById('progressText');
 const transcriptContainer = document.getElementById('transcriptContainer');
 const downloadBtn = document.getElementById('downloadBtn');
 const newFileBtn = document.getElementById('newFileBtn');
+const transcriptSearch = document.getElementById('transcriptSearch');
+const searchCount = document.getElementById('searchCount');
+const searchPrev = document.getElementById('searchPrev');
+const searchNext = document.getElementById('searchNext');
 
 // Recording Elements
 const uploadModeBtn = document.getElementById('uploadModeBtn');
@@ -26,6 +30,22 @@ const recordTimer = document.getElementById('recordTimer');
 const startRecordBtn = document.getElementById('startRecordBtn');
 const stopRecordBtn = document.getElementById('stopRecordBtn');
 const playRecordBtn = document.getElementById('playRecordBtn');
+const liveTranscriptionToggle = document.getElementById('liveTranscription');
+const liveDiarizationToggle = document.getElementById('liveDiarization');
+const liveTranscript = document.getElementById('liveTranscript');
+
+// Live transcription decodes on CPU, where only small models keep up
+const LIVE_WHISPER_MODEL = 'base';
+
+// Every pipeline works on 16 kHz mono audio
+const CANONICAL_SAMPLE_RATE = 16000;
+
+// Results are fetched in pages, the first one is shown while the rest loads
+const RESULT_PAGE_SIZE = 1000;
+
+// Rows of the transcript are rendered this far above and below the viewport
+const ESTIMATED_ROW_HEIGHT = 120;
+const OVERSCAN_PX = 800;
 
 // State
 let selectedFile = null;
@@ -39,6 +59,14 @@ let recordingTimer = null;
 let audioContext = null;
 let analyser = null;
 let microphone = null;
+let liveSocket = null;
+let liveNode = null;
+let liveSpeaker = null;
+let transcriptView = null;
+let transcriptIndex = null;
+let transcriptLoad = 0;
+let searchMatches = [];
+let searchPosition = -1;
 
 // Initialize
 document.addEventListener('DOMContentLoaded', () => {
@@ -83,6 +111,17 @@ function setupEventListeners() {
     // Action buttons
     downloadBtn.addEventListener('click', downloadTranscript);
     newFileBtn.addEventListener('click', resetToUpload);
+    
+    // Transcript search
+    transcriptSearch.addEventListener('input', runSearch);
+    transcriptSearch.addEventListener('keydown', (e) => {
+        if (e.key === 'Enter') {
+            e.preventDefault();
+            stepSearch(e.shiftKey ? -1 : 1);
+        }
+    });
+    searchPrev.addEventListener('click', () => stepSearch(-1));
+    searchNext.addEventListener('click', () => stepSearch(1));
 }
 
 // Drag and drop handlers
@@ -176,6 +215,8 @@ async function startProcessing() {
         whisper_model: document.getElementById('whisperModel').value,
         language: document.getElementById('language').value,
         device: document.getElementById('device').value,
+        diarizer: document.getElementById('diarizer').value,
+        diarization_profile: document.getElementById('diarizationProfile').value,
         stemming: document.getElementById('stemming').checked
     };
     
@@ -184,9 +225,20 @@ async function startProcessing() {
     processingSection.style.display = 'block';
     
     try {
+        // Lossless audio is resampled here rather than uploaded at full size
+        let upload = selectedFile;
+        if (document.getElementById('clientResample').checked) {
+            progressText.textContent = 'Preparing audio...';
+            const converted = await toCanonicalAudio(selectedFile);
+            if (converted) {
+                upload = converted.file;
+                options.source_audio = converted.source;
+            }
+        }
+        
         // Create FormData
         const formData = new FormData();
-        formData.append('audio', selectedFile);
+        formData.append('audio', upload);
         formData.append('options', JSON.stringify(options));
         
         // Upload and start processing
@@ -205,19 +257,17 @@ async function startProcessing() {
         // Poll for progress
         await pollProgress(job_id);
         
-        // Get results
-        const resultResponse = await fetch(`/api/result/${job_id}`);
-        if (!resultResponse.ok) {
-            const errText = await resultResponse.text();
-            throw new Error(`Failed to get results: ${errText}`);
-        }
-        
-        const transcript = await resultResponse.json();
-        currentTranscript = transcript;
+        // Get results, the first page is shown right away
+        const load = ++transcriptLoad;
+        const firstPage = await fetchResultPage(job_id, 0);
+        currentTranscript = firstPage.segments;
         
         // Show results
         showResults();
         
+        // and the other pages are appended as they come in
+        loadRemainingPages(job_id, firstPage.total, load);
+        
     } catch (error) {
         console.error('Processing error:', error);
         showError(error?.message || 'An error occurred during processing. Please try again.');
@@ -337,6 +387,94 @@ function updateProgressUI(status) {
     }
 }
 
+// Decodes, downmixes and resamples audio to a 16 kHz mono PCM16 WAV file.
+// Returns null when the file is already in that form, can't be decoded or
+// would not get smaller, and it is then uploaded as it is.
+async function toCanonicalAudio(file) {
+    if (!window.OfflineAudioContext || !/\.(wav|flac)$/i.test(file.name)) return null;
+    try {
+        const data = await file.arrayBuffer();
+        if (isCanonicalWav(data)) return null;
+        
+        // decoding resamples to the rate of the context
+        const context = new OfflineAudioContext(1, 1, CANONICAL_SAMPLE_RATE);
+        const decoded = await context.decodeAudioData(data);
+        const wav = encodeWav(downmix(decoded), CANONICAL_SAMPLE_RATE);
+        if (wav.size >= file.size) return null;
+        
+        return {
+            file: new File([wav], file.name.replace(/\.\w+$/, '.wav'), { type: 'audio/wav' }),
+            source: {
+                name: file.name,
+                size: file.size,
+                duration: decoded.duration,
+                channels: decoded.numberOfChannels
+            }
+        };
+    } catch (error) {
+        console.warn('Could not resample the audio, uploading the original:', error);
+        return null;
+    }
+}
+
+function isCanonicalWav(data) {
+    const view = new DataView(data);
+    const tag = (offset) => String.fromCharCode(
+        view.getUint8(offset), view.getUint8(offset + 1), view.getUint8(offset + 2), view.getUint8(offset + 3)
+    );
+    if (data.byteLength < 12 || tag(0) !== 'RIFF' || tag(8) !== 'WAVE') return false;
+    
+    // walk the chunks up to the format one
+    let offset = 12;
+    while (offset + 8 <= data.byteLength) {
+        const size = view.getUint32(offset + 4, true);
+        if (tag(offset) === 'fmt ' && offset + 24 <= data.byteLength) {
+            return view.getUint16(offset + 8, true) === 1
+                && view.getUint16(offset + 10, true) === 1
+                && view.getUint32(offset + 12, true) === CANONICAL_SAMPLE_RATE
+                && view.getUint16(offset + 22, true) === 16;
+        }
+        offset += 8 + size + (size % 2);
+    }
+    return false;
+}
+
+function downmix(buffer) {
+    const mono = new Float32Array(buffer.length);
+    for (let channel = 0; channel < buffer.numberOfChannels; channel++) {
+        const samples = buffer.getChannelData(channel);
+        for (let i = 0; i < samples.length; i++) {
+            mono[i] += samples[i] / buffer.numberOfChannels;
+        }
+    }
+    return mono;
+}
+
+function encodeWav(samples, sampleRate) {
+    const view = new DataView(new ArrayBuffer(44 + samples.length * 2));
+    const writeTag = (offset, tag) => {
+        for (let i = 0; i < 4; i++) view.setUint8(offset + i, tag.charCodeAt(i));
+    };
+    writeTag(0, 'RIFF');
+    view.setUint32(4, 36 + samples.length * 2, true);
+    writeTag(8, 'WAVE');
+    writeTag(12, 'fmt ');
+    view.setUint32(16, 16, true);
+    view.setUint16(20, 1, true);
+    view.setUint16(22, 1, true);
+    view.setUint32(24, sampleRate, true);
+    view.setUint32(28, sampleRate * 2, true);
+    view.setUint16(32, 2, true);
+    view.setUint16(34, 16, true);
+    writeTag(36, 'data');
+    view.setUint32(40, samples.length * 2, true);
+    for (let i = 0; i < samples.length; i++) {
+        const sample = Math.max(-1, Math.min(1, samples[i]));
+        view.setInt16(44 + i * 2, sample < 0 ? sample * 0x8000 : sample * 0x7fff, true);
+    }
+    return new Blob([view], { type: 'audio/wav' });
+}
+
 function showResults() {
     // Hide processing, show results
     processingSection.style.display = 'none';
@@ -376,23 +514,362 @@ function generateSampleTranscript() {
 }
 
 function displayTranscript(transcript) {
-    transcriptContainer.innerHTML = '';
+    if (transcriptView) transcriptView.destroy();
+    transcriptView = new VirtualTranscript(transcriptContainer);
+    transcriptIndex = new TranscriptIndex();
+    
+    transcriptSearch.value = '';
+    runSearch();
+    appendTranscript(transcript, 0);
+}
+
+function appendTranscript(segments, offset) {
+    transcriptView.append(segments);
+    transcriptIndex.add(segments, offset);
+    // pages that come in later can add matches
+    if (transcriptSearch.value.trim()) runSearch();
+}
+
+async function fetchResultPage(jobId, offset) {
+    const response = await fetch(`/api/result/${jobId}?offset=${offset}&limit=${RESULT_PAGE_SIZE}`);
+    if (!response.ok) {
+        const errText = await response.text();
+        throw new Error(`Failed to get results: ${errText}`);
+    }
+    return response.json();
+}
+
+async function loadRemainingPages(jobId, total, load) {
+    downloadBtn.disabled = currentTranscript.length < total;
+    try {
+        while (currentTranscript && currentTranscript.length < total) {
+            const offset = currentTranscript.length;
+            const page = await fetchResultPage(jobId, offset);
+            // a new file was picked in the meantime
+            if (load !== transcriptLoad) return;
+            if (!page.segments.length) break;
+            
+            currentTranscript.push(...page.segments);
+            appendTranscript(page.segments, offset);
+        }
+    } catch (error) {
+        if (load !== transcriptLoad) return;
+        console.error('Result loading error:', error);
+        showError(error?.message || 'Could not load the rest of the transcript.');
+    } finally {
+        if (load === transcriptLoad) downloadBtn.disabled = false;
+    }
+}
+
+// Keeps only the rows in and around the viewport in the DOM. Row heights
+// start out estimated and are measured once a row was rendered, their
+// running sum places the rows and sizes the scrollable area.
+class VirtualTranscript {
+    constructor(container) {
+        this.container = container;
+        this.segments = [];
+        this.heights = [];
+        this.offsets = new Float64Array(1);
+        // offsets are up to date below this row
+        this.validOffsets = 0;
+        this.start = 0;
+        this.end = 0;
+        this.stale = true;
+        this.frame = null;
+        this.highlight = null;
+        this.activeIndex = -1;
+        
+        this.sizer = document.createElement('div');
+        this.sizer.className = 'transcript-sizer';
+        this.rows = document.createElement('div');
+        this.rows.className = 'transcript-rows';
+        this.sizer.appendChild(this.rows);
+        container.replaceChildren(this.sizer);
+        container.scrollTop = 0;
+        
+        this.onScroll = () => this.scheduleRender();
+        this.onResize = () => {
+            // text wraps differently, every height has to be measured again
+            this.heights.fill(ESTIMATED_ROW_HEIGHT);
+            this.validOffsets = 0;
+            this.stale = true;
+            this.scheduleRender();
+        };
+        container.addEventListener('scroll', this.onScroll, { passive: true });
+        window.addEventListener('resize', this.onResize);
+    }
+    
+    destroy() {
+        if (this.frame !== null) cancelAnimationFrame(this.frame);
+        this.container.removeEventListener('scroll', this.onScroll);
+        window.removeEventListener('resize', this.onResize);
+        this.container.replaceChildren();
+    }
+    
+    append(segments) {
+        const from = this.segments.length;
+        for (const segment of segments) {
+            this.segments.push(segment);
+            this.heights.push(ESTIMATED_ROW_HEIGHT);
+        }
+        const offsets = new Float64Array(this.segments.length + 1);
+        offsets.set(this.offsets.subarray(0, from + 1));
+        this.offsets = offsets;
+        this.validOffsets = Math.min(this.validOffsets, from);
+        this.stale = true;
+        this.scheduleRender();
+    }
+    
+    setHighlight(terms) {
+        const escaped = terms.map((term) => term.replace(/[.*+?^${}()|[\]\\]/g, '\\$&'));
+        this.highlight = escaped.length ? new RegExp(escaped.join('|'), 'gi') : null;
+        this.stale = true;
+        this.scheduleRender();
+    }
+    
+    setActive(index) {
+        this.activeIndex = index;
+        this.stale = true;
+        this.scheduleRender();
+    }
+    
+    scrollToIndex(index) {
+        this.updateOffsets();
+        const top = this.sizer.offsetTop + this.offsets[index];
+        this.container.scrollTop = Math.max(0, top - this.container.clientHeight / 3);
+        this.render();
+    }
+    
+    updateOffsets() {
+        const n = this.segments.length;
+        for (let i = this.validOffsets; i < n; i++) {
+            this.offsets[i + 1] = this.offsets[i] + this.heights[i];
+        }
+        this.validOffsets = n;
+        this.sizer.style.height = `${this.offsets[n]}px`;
+    }
+    
+    // index of the row at y pixels from the top of the transcript
+    indexAt(y) {
+        let low = 0;
+        let high = this.segments.length - 1;
+        while (low < high) {
+            const mid = (low + high + 1) >> 1;
+            if (this.offsets[mid] <= y) {
+                low = mid;
+            } else {
+                high = mid - 1;
+            }
+        }
+        return Math.max(low, 0);
+    }
+    
+    scheduleRender() {
+        if (this.frame === null) {
+            this.frame = requestAnimationFrame(() => this.render());
+        }
+    }
     
-    transcript.forEach((segment, index) => {
+    render() {
+        if (this.frame !== null) {
+            cancelAnimationFrame(this.frame);
+            this.frame = null;
+        }
+        this.updateOffsets();
+        
+        const scrollTop = this.container.scrollTop - this.sizer.offsetTop;
+        const start = this.indexAt(scrollTop - OVERSCAN_PX);
+        const end = Math.min(
+            this.indexAt(scrollTop + this.container.clientHeight + OVERSCAN_PX) + 1,
+            this.segments.length
+        );
+        if (!this.stale && start === this.start && end === this.end) return;
+        this.start = start;
+        this.end = end;
+        this.stale = false;
+        
+        const fragment = document.createDocumentFragment();
+        for (let i = start; i < end; i++) {
+            fragment.appendChild(this.renderRow(i));
+        }
+        this.rows.replaceChildren(fragment);
+        
+        // measure the rendered rows and place them with what was measured
+        let changed = false;
+        Array.from(this.rows.children).forEach((row, i) => {
+            const height = row.offsetHeight;
+            if (height !== this.heights[start + i]) {
+                this.heights[start + i] = height;
+                this.validOffsets = Math.min(this.validOffsets, start + i);
+                changed = true;
+            }
+        });
+        if (changed) this.updateOffsets();
+        this.rows.style.transform = `translateY(${this.offsets[start]}px)`;
+    }
+    
+    renderRow(index) {
+        const segment = this.segments[index];
+        const row = document.createElement('div');
+        row.className = 'transcript-row';
+        
         const segmentEl = document.createElement('div');
         segmentEl.className = 'speaker-segment';
-        segmentEl.style.animationDelay = `${index * 0.1}s`;
+        if (index === this.activeIndex) segmentEl.classList.add('active-match');
         
-        segmentEl.innerHTML = `
-            <div class="speaker-label">
-                ${segment.speaker}
-                <span class="timestamp">${segment.startTime} - ${segment.endTime}</span>
-            </div>
-            <div class="speaker-text">${segment.text}</div>
-        `;
+        const label = document.createElement('div');
+        label.className = 'speaker-label';
+        label.textContent = segment.speaker;
+        const timestamp = document.createElement('span');
+        timestamp.className = 'timestamp';
+        timestamp.textContent = `${segment.startTime} - ${segment.endTime}`;
+        label.appendChild(timestamp);
         
-        transcriptContainer.appendChild(segmentEl);
-    });
+        const text = document.createElement('div');
+        text.className = 'speaker-text';
+        this.appendHighlighted(text, segment.text);
+        
+        segmentEl.appendChild(label);
+        segmentEl.appendChild(text);
+        row.appendChild(segmentEl);
+        return row;
+    }
+    
+    appendHighlighted(element, text) {
+        if (!this.highlight) {
+            element.textContent = text;
+            return;
+        }
+        let last = 0;
+        for (const match of text.matchAll(this.highlight)) {
+            if (!match[0]) continue;
+            element.appendChild(document.createTextNode(text.slice(last, match.index)));
+            const mark = document.createElement('mark');
+            mark.textContent = match[0];
+            element.appendChild(mark);
+            last = match.index + match[0].length;
+        }
+        element.appendChild(document.createTextNode(text.slice(last)));
+    }
+}
+
+// Inverted index from words to the segments they appear in, built as pages
+// come in. The last word of a query is matched as a prefix, so results
+// show up while it is still being typed.
+class TranscriptIndex {
+    constructor() {
+        this.postings = new Map();
+        this.terms = null;
+        this.size = 0;
+    }
+    
+    static tokenize(text) {
+        return (text || '').toLowerCase().match(/[\p{L}\p{N}']+/gu) || [];
+    }
+    
+    add(segments, offset) {
+        segments.forEach((segment, i) => {
+            for (const term of new Set(TranscriptIndex.tokenize(segment.text))) {
+                let list = this.postings.get(term);
+                if (!list) {
+                    list = [];
+                    this.postings.set(term, list);
+                }
+                list.push(offset + i);
+            }
+        });
+        this.size = Math.max(this.size, offset + segments.length);
+        this.terms = null;
+    }
+    
+    // sorted indices of the segments that contain every term of the query
+    search(terms) {
+        let result = null;
+        terms.forEach((term, i) => {
+            const matches = i === terms.length - 1
+                ? this.prefixPostings(term)
+                : this.postings.get(term) || [];
+            result = result === null ? matches : intersect(result, matches);
+        });
+        return result || [];
+    }
+    
+    prefixPostings(prefix) {
+        if (!this.terms) this.terms = Array.from(this.postings.keys()).sort();
+        let low = 0;
+        let high = this.terms.length;
+        while (low < high) {
+            const mid = (low + high) >> 1;
+            if (this.terms[mid] < prefix) {
+                low = mid + 1;
+            } else {
+                high = mid;
+            }
+        }
+        
+        const found = new Uint8Array(this.size);
+        for (let i = low; i < this.terms.length && this.terms[i].startsWith(prefix); i++) {
+            for (const index of this.postings.get(this.terms[i])) found[index] = 1;
+        }
+        const result = [];
+        found.forEach((hit, index) => {
+            if (hit) result.push(index);
+        });
+        return result;
+    }
+}
+
+function intersect(a, b) {
+    const result = [];
+    let i = 0;
+    let j = 0;
+    while (i < a.length && j < b.length) {
+        if (a[i] === b[j]) {
+            result.push(a[i]);
+            i++;
+            j++;
+        } else if (a[i] < b[j]) {
+            i++;
+        } else {
+            j++;
+        }
+    }
+    return result;
+}
+
+function runSearch() {
+    if (!transcriptView) return;
+    const terms = TranscriptIndex.tokenize(transcriptSearch.value);
+    const previous = searchMatches[searchPosition];
+    searchMatches = terms.length ? transcriptIndex.search(terms) : [];
+    transcriptView.setHighlight(terms);
+    
+    // stay on the same match when more pages come in
+    searchPosition = searchMatches.indexOf(previous);
+    if (searchPosition < 0 && searchMatches.length) {
+        searchPosition = 0;
+        transcriptView.scrollToIndex(searchMatches[0]);
+    }
+    transcriptView.setActive(searchPosition < 0 ? -1 : searchMatches[searchPosition]);
+    updateSearchCount(terms.length > 0);
+}
+
+function stepSearch(direction) {
+    if (!searchMatches.length) return;
+    searchPosition = (searchPosition + direction + searchMatches.length) % searchMatches.length;
+    transcriptView.setActive(searchMatches[searchPosition]);
+    transcriptView.scrollToIndex(searchMatches[searchPosition]);
+    updateSearchCount(true);
+}
+
+function updateSearchCount(searching) {
+    if (!searching) {
+        searchCount.textContent = '';
+    } else if (!searchMatches.length) {
+        searchCount.textContent = 'No matches';
+    } else {
+        searchCount.textContent = `${searchPosition + 1} / ${searchMatches.length}`;
+    }
 }
 
 // Download functionality
@@ -476,6 +953,10 @@ async function startRecording() {
         // Setup audio visualization
         setupAudioVisualization(stream);
         
+        if (liveTranscriptionToggle.checked) {
+            await startLiveTranscription();
+        }
+        
         // Start recording
         mediaRecorder.start(100); // Record in 100ms chunks
         recordingStartTime = Date.now();
@@ -500,6 +981,7 @@ function stopRecording() {
         // Update UI
         updateRecordingUI(false);
         stopRecordingTimer();
+        stopLiveTranscription();
         
         // Clean up audio context
         if (audioContext) {
@@ -526,6 +1008,92 @@ function playRecording() {
     }
 }
 
+// Live transcription: the microphone is downsampled to 16 kHz PCM16 in an
+// AudioWorklet and streamed to the backend, which sends back final and
+// partial text while the recording goes on
+async function startLiveTranscription() {
+    liveTranscript.innerHTML = '<span class="final"></span><span class="partial"></span>';
+    liveTranscript.style.display = 'block';
+    liveSpeaker = null;
+    
+    const protocol = location.protocol === 'https:' ? 'wss:' : 'ws:';
+    liveSocket = new WebSocket(`${protocol}//${location.host}/api/stream`);
+    liveSocket.binaryType = 'arraybuffer';
+    liveSocket.onopen = () => {
+        liveSocket.send(JSON.stringify({
+            whisper_model: LIVE_WHISPER_MODEL,
+            language: document.getElementById('language').value,
+            device: document.getElementById('device').value,
+            diarization: liveDiarizationToggle.checked
+        }));
+    };
+    liveSocket.onmessage = (event) => handleLiveMessage(JSON.parse(event.data));
+    liveSocket.onerror = () => {
+        showError('Live transcription is not available, the recording continues.');
+    };
+    
+    try {
+        await audioContext.audioWorklet.addModule('pcm-worklet.js');
+        liveNode = new AudioWorkletNode(audioContext, 'pcm-downsampler');
+        liveNode.port.onmessage = (event) => {
+            if (liveSocket && liveSocket.readyState === WebSocket.OPEN) {
+                liveSocket.send(event.data);
+            }
+        };
+        microphone.connect(liveNode);
+        // the node only writes silence, but has to be pulled by the graph
+        liveNode.connect(audioContext.destination);
+    } catch (error) {
+        console.error('Error starting live transcription:', error);
+        showError('Live transcription is not supported in this browser.');
+        stopLiveTranscription();
+    }
+}
+
+function handleLiveMessage(message) {
+    const finalText = liveTranscript.querySelector('.final');
+    const partialText = liveTranscript.querySelector('.partial');
+    if (!finalText || !partialText) return;
+    
+    if (message.type === 'final') {
+        // a new line for every change of speaker
+        if (message.speaker !== undefined && message.speaker !== null && message.speaker !== liveSpeaker) {
+            if (liveSpeaker !== null) {
+                finalText.appendChild(document.createElement('br'));
+            }
+            liveSpeaker = message.speaker;
+            const label = document.createElement('strong');
+            label.textContent = `Speaker ${message.speaker + 1}: `;
+            finalText.appendChild(label);
+        }
+        finalText.appendChild(document.createTextNode(`${message.text} `));
+    } else if (message.type === 'warning') {
+        showError(message.message);
+    } else if (message.type === 'partial') {
+        partialText.textContent = message.text;
+    } else if (message.type === 'done') {
+        partialText.textContent = '';
+        liveSocket.close();
+        liveSocket = null;
+    }
+    liveTranscript.scrollTop = liveTranscript.scrollHeight;
+}
+
+function stopLiveTranscription() {
+    if (liveNode) {
+        liveNode.disconnect();
+        liveNode.port.onmessage = null;
+        liveNode = null;
+    }
+    // the backend answers with the rest of the transcript and 'done'
+    if (liveSocket && liveSocket.readyState === WebSocket.OPEN) {
+        liveSocket.send(JSON.stringify({ type: 'stop' }));
+    } else if (liveSocket) {
+        liveSocket.close();
+        liveSocket = null;
+    }
+}
+
 function setupAudioVisualization(stream) {
     audioContext = new AudioContext();
     analyser = audioContext.createAnalyser();
@@ -600,6 +1168,12 @@ function clearRecording() {
     }
     
     recordedChunks = [];
+    if (liveSocket) {
+        liveSocket.close();
+        liveSocket = null;
+    }
+    liveTranscript.style.display = 'none';
+    liveTranscript.innerHTML = '';
     playRecordBtn.style.display = 'none';
     recordTimer.textContent = '00:00';
     recordStatus.querySelector('p').textContent = 'Click the record button to start recording';
@@ -611,6 +1185,15 @@ function resetToUpload() {
     // Reset state
     selectedFile = null;
     currentTranscript = null;
+    // stops the pages that are still loading
+    transcriptLoad++;
+    if (transcriptView) {
+        transcriptView.destroy();
+        transcriptView = null;
+    }
+    searchMatches = [];
+    searchPosition = -1;
+    downloadBtn.disabled = false;
     
     if (processingInterval) {
         clearInterval(processingInterval);
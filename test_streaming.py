@@ -0,0 +1,152 @@
+"""
+Test script for live transcription, replaying the bundled test audio through
+StreamingTranscriber as if it came from a microphone
+
+The replay doesn't wait for the audio in real time. Frames "arrive" at their
+time in the stream, every pass starts once the previous one finished and its
+frames arrived, and a word's latency is the time it is sent minus the time
+it ended in the stream, so the latency is the one a live client would see
+with the same model on this machine.
+
+    python test_streaming.py [--model tiny] [--diarization]
+"""
+import argparse
+import os
+import statistics
+import sys
+import threading
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+from streaming import SAMPLE_RATE, StreamingTranscriber
+
+TEST_AUDIO = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                          'whisper-diarization', 'tests', 'assets', 'test.opus')
+# what a word may take from being said to being shown, 90% of words within that
+LATENCY_TARGET_SEC = 2.0
+FRAME_SEC = 0.1
+
+def test_first_load():
+    """Streams that start together share a single load of the model"""
+    import faster_whisper
+    import streaming
+
+    loads = []
+
+    class SlowModel:
+        def __init__(self, *args, **kwargs):
+            loads.append(args)
+            time.sleep(0.5)
+
+    whisper_model = faster_whisper.WhisperModel
+    faster_whisper.WhisperModel = SlowModel
+    try:
+        models = []
+        threads = [threading.Thread(target=lambda: models.append(streaming.load_model('race', 'cpu')))
+                   for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        faster_whisper.WhisperModel = whisper_model
+        streaming.load_model.cache_clear()
+
+    if len(loads) == 1 and len({id(model) for model in models}) == 1:
+        print("✓ Concurrent streams load the model once")
+        return True
+    print(f"✗ The model was loaded {len(loads)} times for {len(models)} streams")
+    return False
+
+def replay(transcriber, audio):
+    """Feed ``audio`` frame by frame, return the latency of every final word"""
+    frame = int(FRAME_SEC * SAMPLE_RATE)
+    pcm16 = (np.clip(audio, -1, 1) * 32767).astype('<i2')
+    clock, latencies, words = 0.0, [], []
+
+    def send(committed, started):
+        nonlocal clock
+        clock += time.perf_counter() - started
+        latencies.extend(clock - word[1] for word in committed)
+        words.extend(committed)
+
+    for i in range(0, len(pcm16), frame):
+        transcriber.insert_pcm16(pcm16[i:i + frame].tobytes())
+        # the frame arrives once it was recorded, unless a pass is still running
+        clock = max(clock, (i + frame) / SAMPLE_RATE)
+        # and like the server, every frame that arrived goes into the next pass
+        if transcriber.ready() and (i + 2 * frame) / SAMPLE_RATE > clock:
+            started = time.perf_counter()
+            committed, _ = transcriber.process()
+            send(committed, started)
+    started = time.perf_counter()
+    send(transcriber.finish(), started)
+    return latencies, words
+
+def test_latency(model_name, diarization):
+    """Final words reach the client within LATENCY_TARGET_SEC of being said"""
+    import faster_whisper
+    from streaming import create_online_diarizer, load_model
+
+    try:
+        model = load_model(model_name, 'cpu')
+    except Exception as e:
+        print(f"⚠ Whisper model {model_name} is not available, skipping: {e}")
+        return None
+    diarizer = None
+    if diarization:
+        try:
+            diarizer = create_online_diarizer('cpu')
+        except Exception as e:
+            print(f"⚠ Online diarizer is not available, skipping: {e}")
+            return None
+
+    audio = faster_whisper.decode_audio(TEST_AUDIO)
+    transcriber = StreamingTranscriber(model, language='en', diarizer=diarizer)
+    started = time.perf_counter()
+    latencies, words = replay(transcriber, audio)
+    elapsed = time.perf_counter() - started
+
+    if not words:
+        print("✗ Nothing was transcribed")
+        return False
+    latencies.sort()
+    p90 = latencies[int(0.9 * (len(latencies) - 1))]
+    print(f"  {len(audio) / SAMPLE_RATE:.1f}s of audio replayed in {elapsed:.1f}s, {len(words)} words")
+    print(f"  Latency: median {statistics.median(latencies):.2f}s, 90th percentile {p90:.2f}s, "
+          f"max {latencies[-1]:.2f}s")
+    print(f"  Transcript: {''.join(word[2] for word in words).strip()}")
+    if p90 <= LATENCY_TARGET_SEC:
+        print(f"✓ 90% of the words are final within {LATENCY_TARGET_SEC}s")
+        return True
+    print(f"✗ 90th percentile latency is over {LATENCY_TARGET_SEC}s")
+    return False
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay the test audio through the live transcriber")
+    parser.add_argument("--model", default="tiny", help="Whisper model to stream with")
+    parser.add_argument("--diarization", action="store_true", help="Label the speakers as well")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("Whisper Diarization - Streaming Test")
+    print("=" * 60)
+
+    results = [test_first_load()]
+
+    print("\n" + "=" * 60)
+    print(f"Testing Latency ({args.model}{' with speakers' if args.diarization else ''})")
+    print("=" * 60)
+    latency = test_latency(args.model, args.diarization)
+
+    print("\n" + "=" * 60)
+    if all(results) and latency is not False:
+        print("✅ All tests passed!")
+    else:
+        print("⚠️ Some tests had issues. Check the output above.")
+    print("=" * 60)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,227 @@
+"""
+Test script for job webhooks, against a local HTTP stand-in for the client
+
+The delivery queue is tested on its own first. The stand-in listens on
+127.0.0.1, which webhooks only reach with WEBHOOK_ALLOW_PRIVATE=1, so the
+end-to-end test needs the server running with that and the same
+WEBHOOK_SECRET as this script, e.g.
+
+    WEBHOOK_SECRET=test-secret WEBHOOK_ALLOW_PRIVATE=1 python backend/app.py
+    WEBHOOK_SECRET=test-secret python test_webhook.py
+"""
+import requests
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+from webhooks import WebhookDispatcher, verify
+
+BASE_URL = "http://localhost:5000"
+SECRET = os.environ.get('WEBHOOK_SECRET', 'test-secret')
+
+class StandIn:
+    """Local HTTP server that records webhooks and answers with given status codes"""
+
+    def __init__(self, statuses=()):
+        self.statuses = list(statuses)
+        self.requests = []
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                stand_in.requests.append((dict(self.headers), body))
+                status = stand_in.statuses.pop(0) if stand_in.statuses else 200
+                self.send_response(status)
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        self.server = HTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}/hook"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+def signed(headers, body):
+    return verify(SECRET, headers['X-Webhook-Timestamp'], body, headers['X-Webhook-Signature'])
+
+def test_retries():
+    """Failed deliveries are retried with the same id until one goes through"""
+    stand_in = StandIn([500, 503])
+    dispatcher = WebhookDispatcher(secret=SECRET, workers=2, base_delay=0.1, allow_private=True)
+    try:
+        delivery_id = dispatcher.submit(stand_in.url, {'event': 'job.completed', 'job_id': 'test'})
+        dispatcher.join(timeout=10)
+
+        ids = {headers['X-Webhook-Id'] for headers, _ in stand_in.requests}
+        if len(stand_in.requests) == 3 and ids == {delivery_id} and dispatcher.delivered == 1:
+            print(f"✓ Delivered after {len(stand_in.requests) - 1} retries")
+        else:
+            print(f"✗ Expected 3 attempts of one delivery, got {len(stand_in.requests)} ({dispatcher.delivered} delivered)")
+            return False
+
+        if all(signed(headers, body) for headers, body in stand_in.requests):
+            print("✓ Every attempt is signed")
+        else:
+            print("✗ Signature does not verify")
+            return False
+        return True
+    finally:
+        dispatcher.close()
+        stand_in.close()
+
+def test_refused():
+    """Client errors are final and are not retried"""
+    stand_in = StandIn([400])
+    dispatcher = WebhookDispatcher(secret=SECRET, base_delay=0.1, allow_private=True)
+    try:
+        dispatcher.submit(stand_in.url, {'event': 'job.failed', 'job_id': 'test'})
+        dispatcher.join(timeout=10)
+
+        if len(stand_in.requests) == 1 and dispatcher.failed == 1:
+            print("✓ Refused delivery is not retried")
+            return True
+        print(f"✗ Expected a single attempt, got {len(stand_in.requests)}")
+        return False
+    finally:
+        dispatcher.close()
+        stand_in.close()
+
+def test_unreachable():
+    """Unreachable endpoints are given up on after max_attempts"""
+    stand_in = StandIn()
+    url = stand_in.url
+    stand_in.close()
+    dispatcher = WebhookDispatcher(secret=SECRET, max_attempts=3, base_delay=0.05, timeout=1,
+                                   allow_private=True)
+    try:
+        dispatcher.submit(url, {'event': 'job.completed', 'job_id': 'test'})
+        finished = dispatcher.join(timeout=10)
+
+        if finished and dispatcher.failed == 1:
+            print("✓ Unreachable endpoint is given up on")
+            return True
+        print("✗ Delivery to an unreachable endpoint did not give up")
+        return False
+    finally:
+        dispatcher.close()
+
+def test_private_addresses():
+    """Hosts that resolve to loopback, private or link-local addresses are refused"""
+    stand_in = StandIn()
+    dispatcher = WebhookDispatcher(secret=SECRET, base_delay=0.05, allowed_hosts=())
+    try:
+        blocked = ['http://127.0.0.1/hook', 'http://localhost/hook', 'http://10.0.0.1/hook',
+                   'http://169.254.169.254/latest/meta-data', 'http://[::1]/hook', stand_in.url]
+        accepted = [url for url in blocked if dispatcher.check_url(url) is None]
+        if accepted:
+            print(f"✗ Private callback URLs were accepted: {accepted}")
+            return False
+        print("✓ Private callback URLs are refused")
+
+        # deliveries check the address again, and don't retry a blocked host
+        dispatcher.submit(stand_in.url, {'event': 'job.completed', 'job_id': 'test'})
+        dispatcher.join(timeout=10)
+        if stand_in.requests or dispatcher.failed != 1:
+            print(f"✗ Delivery to a private address was attempted ({len(stand_in.requests)} requests)")
+            return False
+        print("✓ Delivery to a private address is blocked")
+
+        limited = WebhookDispatcher(secret=SECRET, allowed_hosts=['hooks.example.com'], allow_private=True)
+        if limited.check_url(stand_in.url) is None:
+            print("✗ Host outside WEBHOOK_ALLOWED_HOSTS was accepted")
+            return False
+        print("✓ Hosts outside the allowlist are refused")
+        return True
+    finally:
+        dispatcher.close()
+        stand_in.close()
+
+def test_upload_callback():
+    """Upload with a callback_url and wait for the webhook instead of polling"""
+    try:
+        requests.get(BASE_URL)
+    except Exception as e:
+        print(f"⚠ Server is not responding, skipping: {str(e)}")
+        return None
+
+    stand_in = StandIn()
+    try:
+        files = {
+            'audio': ('test.wav', b'RIFF' + b'\x00' * 100, 'audio/wav')
+        }
+        data = {
+            'options': json.dumps({
+                'whisper_model': 'tiny',
+                'language': 'en',
+                'device': 'cpu',
+                'callback_url': stand_in.url
+            })
+        }
+
+        response = requests.post(f"{BASE_URL}/api/upload", files=files, data=data)
+        if response.status_code != 200:
+            print(f"✗ Upload failed: {response.status_code}")
+            print(f"  Response: {response.text}")
+            return False
+        job_id = response.json().get('job_id')
+        print(f"✓ Upload with callback_url accepted (Job ID: {job_id})")
+
+        print("\nWaiting for the webhook...")
+        for _ in range(300):
+            if stand_in.requests:
+                break
+            time.sleep(1)
+        else:
+            print("✗ No webhook within 5 minutes")
+            return False
+
+        headers, body = stand_in.requests[0]
+        payload = json.loads(body)
+        print(f"  Event: {payload.get('event')}, Segments: {payload.get('segments')}")
+        if payload.get('job_id') != job_id:
+            print(f"✗ Webhook is for job {payload.get('job_id')}")
+            return False
+        if not signed(headers, body):
+            print("✗ Signature does not verify, is WEBHOOK_SECRET the same as the server's?")
+            return False
+        print("✓ Signed webhook received")
+
+        result_response = requests.get(payload['result_url'])
+        if result_response.status_code == 200:
+            print(f"✓ Result fetched from result_url ({len(result_response.json())} segments)")
+            return True
+        print(f"✗ Result not available: {result_response.status_code}")
+        return False
+    finally:
+        stand_in.close()
+
+def main():
+    print("=" * 60)
+    print("Whisper Diarization - Webhook Test")
+    print("=" * 60)
+
+    results = [test_retries(), test_refused(), test_unreachable(), test_private_addresses()]
+
+    print("\n" + "=" * 60)
+    print("Testing Upload Callback")
+    print("=" * 60)
+    end_to_end = test_upload_callback()
+
+    print("\n" + "=" * 60)
+    if all(results) and end_to_end is not False:
+        print("✅ All tests passed!")
+    else:
+        print("⚠️ Some tests had issues. Check the output above.")
+    print("=" * 60)
+
+if __name__ == "__main__":
+    main()
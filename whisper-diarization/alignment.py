@@ -0,0 +1,309 @@
+import logging
+import math
+import os
+import tempfile
+
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import Optional
+
+import numpy as np
+import torch
+
+from ctc_forced_aligner import (
+    get_alignments,
+    get_spans,
+    postprocess_results,
+    preprocess_text,
+)
+
+SAMPLING_FREQ = 16000
+EMISSION_STRIDE_MS = 20
+
+
+def _time_to_frame(time: float) -> int:
+    return int(time * (1000 / EMISSION_STRIDE_MS))
+
+
+def _allocate_emissions_buffer(shape, dtype, spill_dir: Optional[str]):
+    if spill_dir is None:
+        return np.zeros(shape, dtype=dtype)
+
+    os.makedirs(spill_dir, exist_ok=True)
+    fd, path = tempfile.mkstemp(suffix=".emissions", dir=spill_dir)
+    os.close(fd)
+    return np.memmap(path, dtype=dtype, mode="w+", shape=shape)
+
+
+def generate_emissions_chunked(
+    model,
+    audio_waveform: np.ndarray,
+    window_length: int = 30,
+    context_length: int = 2,
+    batch_size: int = 4,
+    dtype=np.float16,
+    spill_dir: Optional[str] = None,
+):
+    """
+    Memory-bounded replacement for ``ctc_forced_aligner.generate_emissions``.
+
+    The waveform is consumed in windows of ``window_length`` seconds with
+    ``context_length`` seconds of context on each side, which has to be at
+    least one second, and only the current batch is converted to the model
+    dtype and device. Log-probabilities are written into a preallocated
+    ``dtype`` buffer; when ``spill_dir`` is given the buffer is a
+    memory-mapped file inside it, so the emissions of multi-hour files don't
+    have to fit in RAM.
+
+    Returns the emissions (including the trailing ``<star>`` column) as a
+    tensor sharing memory with the buffer, and the stride in milliseconds.
+    """
+    batch_size = max(batch_size, 1)
+    # the model emits one frame less than the window holds, which the context
+    # slice below makes up for, so windows without context would drift
+    assert context_length > 0, "context_length must be positive"
+    assert (
+        context_length * 2 < window_length
+    ), "context_length must be less than half of window_length"
+
+    num_samples = audio_waveform.shape[0]
+    context = context_length * SAMPLING_FREQ
+    window = window_length * SAMPLING_FREQ
+    num_windows = math.ceil(num_samples / window)
+    extension = num_windows * window - num_samples
+    context_frames = _time_to_frame(context_length)
+    extension_frames = _time_to_frame(extension / SAMPLING_FREQ)
+
+    emissions, num_frames, cursor = None, 0, 0
+    input_batch = np.zeros((batch_size, window + 2 * context), dtype=np.float32)
+    with torch.inference_mode():
+        for first_window in range(0, num_windows, batch_size):
+            windows_in_batch = min(batch_size, num_windows - first_window)
+            input_batch[:] = 0
+            for i in range(windows_in_batch):
+                # window start in the padded waveform, shifted back by the context
+                start = (first_window + i) * window - context
+                src_start, src_end = max(start, 0), min(
+                    start + window + 2 * context, num_samples
+                )
+                input_batch[i, src_start - start : src_end - start] = audio_waveform[
+                    src_start:src_end
+                ]
+
+            logits = model(
+                torch.from_numpy(input_batch[:windows_in_batch])
+                .to(model.dtype)
+                .to(model.device)
+            ).logits
+            # removing the context
+            logits = logits[:, context_frames : -context_frames + 1].flatten(0, 1)
+            log_probs = torch.log_softmax(logits.float(), dim=-1).cpu().numpy()
+
+            if emissions is None:
+                frames_per_window = log_probs.shape[0] // windows_in_batch
+                num_frames = num_windows * frames_per_window - extension_frames
+                # the extra column is the <star> token, left at zero
+                emissions = _allocate_emissions_buffer(
+                    (num_frames, log_probs.shape[1] + 1), dtype, spill_dir
+                )
+
+            rows = min(log_probs.shape[0], num_frames - cursor)
+            emissions[cursor : cursor + rows, :-1] = log_probs[:rows]
+            cursor += rows
+
+    stride = float(num_samples * 1000 / num_frames / SAMPLING_FREQ)
+
+    return torch.from_numpy(emissions), math.ceil(stride)
+
+
+def align_transcript(
+    emissions: torch.Tensor, stride: int, text: str, language, tokenizer
+):
+    """
+    Align ``text`` against ``emissions`` and return its word timestamps in seconds.
+    """
+    tokens_starred, text_starred = preprocess_text(
+        text,
+        romanize=True,
+        language=language,
+    )
+
+    segments, scores, blank_token = get_alignments(
+        emissions,
+        tokens_starred,
+        tokenizer,
+    )
+
+    spans = get_spans(tokens_starred, segments, blank_token)
+
+    return postprocess_results(text_starred, spans, stride, scores)
+
+
+def _align_segment(
+    emissions: np.ndarray, text: str, language, stride: int, offset: float, tokenizer
+):
+    # slices of a float16 buffer are upcast one segment at a time
+    word_timestamps = align_transcript(
+        torch.from_numpy(emissions.astype(np.float32)),
+        stride,
+        text,
+        language,
+        tokenizer,
+    )
+    for word in word_timestamps:
+        word["start"] += offset
+        word["end"] += offset
+    return word_timestamps
+
+
+def _try_align_segment(emissions, text, language, stride, offset, tokenizer):
+    try:
+        return _align_segment(emissions, text, language, stride, offset, tokenizer)
+    except Exception as e:
+        logging.debug(f"Failed to align segment {text!r}: {e}")
+        return None
+
+
+def align_segments(
+    emissions: torch.Tensor,
+    stride: int,
+    transcript_segments,
+    language,
+    tokenizer,
+    padding: float = 0.5,
+    num_workers: Optional[int] = None,
+    executor: Optional[Executor] = None,
+):
+    """
+    Align each Whisper segment against its own slice of ``emissions``.
+
+    Every segment is aligned against the emission frames between its start
+    and end, widened by ``padding`` seconds on both sides, and its word
+    timestamps are shifted back onto the global timeline. Segments that fail
+    are retried against the whole gap between their aligned neighbours, and
+    if that fails too the words of the segment are spread over that gap in
+    proportion to their length. Only when no segment aligns at all is the
+    full transcript aligned in one pass like ``align_transcript``.
+
+    Segments are aligned by ``num_workers`` threads, or by ``executor`` when
+    one is given. A process pool has to use the spawn start method, forking
+    after torch, and possibly CUDA, were initialized isn't safe, and spawned
+    workers rerun scripts without a ``__main__`` guard, like ``diarize.py``.
+    ``benchmark_alignment.py`` compares them.
+    """
+    if not transcript_segments:
+        return []
+
+    emissions_np = emissions.numpy()
+    num_frames = emissions_np.shape[0]
+    frames_per_sec = 1000 / stride
+
+    jobs = []
+    for segment in transcript_segments:
+        start_frame = max(math.floor((segment.start - padding) * frames_per_sec), 0)
+        end_frame = min(math.ceil((segment.end + padding) * frames_per_sec), num_frames)
+        jobs.append(
+            (
+                emissions_np[start_frame:end_frame],
+                segment.text,
+                language,
+                stride,
+                start_frame * stride / 1000,
+                tokenizer,
+            )
+        )
+
+    num_workers = num_workers or os.cpu_count() or 1
+    if executor is not None:
+        results = list(executor.map(_try_align_segment, *zip(*jobs)))
+    elif num_workers > 1:
+        with ThreadPoolExecutor(max_workers=num_workers) as executor:
+            results = list(executor.map(_try_align_segment, *zip(*jobs)))
+    else:
+        results = [_try_align_segment(*job) for job in jobs]
+
+    failed = [i for i, words in enumerate(results) if words is None]
+    if failed:
+        logging.warning(
+            f"{len(failed)} of {len(jobs)} segments failed to align on their own, "
+            "retrying them against the gaps between aligned segments."
+        )
+    for i in failed:
+        # earlier segments that failed again are still None and are skipped
+        previous_words = (
+            next((w for w in results[i - 1 :: -1] if w), None) if i else None
+        )
+        next_words = next((w for w in results[i + 1 :] if w), None)
+        start_frame = (
+            math.floor(previous_words[-1]["end"] * frames_per_sec)
+            if previous_words
+            else 0
+        )
+        end_frame = (
+            math.ceil(next_words[0]["start"] * frames_per_sec)
+            if next_words
+            else num_frames
+        )
+        results[i] = _try_align_segment(
+            emissions_np[start_frame:end_frame],
+            jobs[i][1],
+            language,
+            stride,
+            start_frame * stride / 1000,
+            tokenizer,
+        )
+
+    if failed and all(not words for words in results):
+        logging.warning(
+            "Segment-level alignment failed, falling back to global alignment."
+        )
+        return align_transcript(
+            emissions,
+            stride,
+            "".join(segment.text for segment in transcript_segments),
+            language,
+            tokenizer,
+        )
+
+    # runs of segments that failed twice share the gap between their aligned
+    # neighbours, word by word
+    i = 0
+    while i < len(results):
+        if results[i] is not None:
+            i += 1
+            continue
+        j = i + 1
+        while j < len(results) and results[j] is None:
+            j += 1
+        previous_words = (
+            next((w for w in results[i - 1 :: -1] if w), None) if i else None
+        )
+        next_words = next((w for w in results[j:] if w), None)
+        texts = [jobs[k][1] for k in range(i, j)]
+        logging.warning(
+            f"Could not align {j - i} segment(s) starting with {texts[0]!r}, "
+            "their words are spread over the gap between aligned neighbours."
+        )
+        words = _spread_words(
+            " ".join(texts).split(),
+            previous_words[-1]["end"] if previous_words else 0,
+            next_words[0]["start"] if next_words else num_frames * stride / 1000,
+        )
+        results[i:j] = [words] + [[] for _ in range(i + 1, j)]
+        i = j
+
+    return [word for words in results for word in words]
+
+
+def _spread_words(words, start: float, end: float):
+    """
+    Time ``words`` one after another between ``start`` and ``end``, each
+    given a share of the span proportional to its length.
+    """
+    end = max(end, start)
+    total = sum(len(word) for word in words)
+    word_timestamps = []
+    for word in words:
+        word_end = start + (end - start) * len(word) / total
+        word_timestamps.append({"text": word, "start": start, "end": word_end})
+        start = word_end
+    return word_timestamps
@@ -0,0 +1,142 @@
+import argparse
+import json
+import multiprocessing
+import string
+import time
+
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import torch
+
+from alignment import EMISSION_STRIDE_MS, align_segments
+from benchmark_helpers import timed
+
+Segment = namedtuple("Segment", ["start", "end", "text"])
+
+WORDS = (
+    "the speaker said that we would meet again after the break to go over "
+    "what everyone thought about the numbers from last quarter"
+).split()
+
+
+class SyntheticTokenizer:
+    """
+    The part of the alignment model's tokenizer the aligner uses, with a
+    character vocabulary like the MMS model's.
+    """
+
+    def __init__(self):
+        tokens = ["<blank>", "<pad>", "</s>", "<unk>"] + list(string.ascii_lowercase)
+        self.vocab = {token: i for i, token in enumerate(tokens + ["'"])}
+        self.pad_token_id = self.vocab["<pad>"]
+
+    def get_vocab(self):
+        return self.vocab
+
+
+def synthesize_alignment_input(minutes, tokenizer, seed=0):
+    """
+    Return random emissions for ``minutes`` of audio and Whisper-style
+    segments of a few seconds, about two and a half words a second, over
+    them.
+    """
+    rng = np.random.default_rng(seed)
+    num_frames = int(minutes * 60 * 1000 / EMISSION_STRIDE_MS)
+    # one column per token and the trailing <star> column
+    logits = rng.normal(size=(num_frames, len(tokenizer.get_vocab()) + 1))
+    emissions = torch.log_softmax(torch.from_numpy(logits).float(), dim=-1)
+
+    segments, start = [], 0.0
+    while start < minutes * 60 - 1:
+        end = min(start + rng.uniform(2.0, 8.0), minutes * 60)
+        num_words = max(int((end - start) * 2.5), 1)
+        text = " ".join(rng.choice(WORDS, num_words))
+        segments.append(Segment(start, end, " " + text))
+        start = end
+    return emissions, segments
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare aligning Whisper segments one after another, in "
+        "threads and in a spawned process pool, on synthetic emissions."
+    )
+    parser.add_argument(
+        "--minutes",
+        type=float,
+        nargs="+",
+        default=[10, 60],
+        help="Lengths of audio to align",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=multiprocessing.cpu_count(),
+        help="Threads or processes to align with",
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=3, help="Keep the best of this many runs"
+    )
+    parser.add_argument(
+        "--output",
+        default=None,
+        help="Also write the results to this JSON file",
+    )
+    args = parser.parse_args()
+
+    tokenizer = SyntheticTokenizer()
+    results = {}
+    with ProcessPoolExecutor(
+        args.workers, mp_context=multiprocessing.get_context("spawn")
+    ) as executor:
+        start = time.perf_counter()
+        # the workers start on the first tasks, which isn't counted below
+        list(executor.map(abs, range(args.workers)))
+        pool_startup = time.perf_counter() - start
+
+        for minutes in args.minutes:
+            emissions, segments = synthesize_alignment_input(minutes, tokenizer)
+            expected, serial_seconds = timed(
+                align_segments,
+                emissions,
+                EMISSION_STRIDE_MS,
+                segments,
+                "eng",
+                tokenizer,
+                num_workers=1,
+                repeat=args.repeat,
+            )
+            for name, kwargs in (
+                ("threads", {"num_workers": args.workers}),
+                ("spawn_pool", {"executor": executor}),
+            ):
+                word_timestamps, seconds = timed(
+                    align_segments,
+                    emissions,
+                    EMISSION_STRIDE_MS,
+                    segments,
+                    "eng",
+                    tokenizer,
+                    repeat=args.repeat,
+                    **kwargs,
+                )
+                results[f"{name}/{minutes:g}min"] = {
+                    "segments": len(segments),
+                    "workers": args.workers,
+                    "serial_seconds": round(serial_seconds, 3),
+                    "seconds": round(seconds, 3),
+                    "speedup": round(serial_seconds / seconds, 2),
+                    "same": word_timestamps == expected,
+                }
+    results["spawn_pool/startup_seconds"] = round(pool_startup, 3)
+
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
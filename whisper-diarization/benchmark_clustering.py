@@ -0,0 +1,160 @@
+import argparse
+import json
+import time
+
+import numpy as np
+
+from diarization.clustering import landmark_spectral_cluster, spectral_cluster
+
+# a speaker embedding every 0.75 seconds, like the lite diarizer
+EMBEDDINGS_PER_HOUR = 4800
+
+
+def adjusted_rand_index(labels, other_labels):
+    """
+    Return the agreement of two clusterings of the same points, 1 when they
+    are identical up to the label names and about 0 for random labels.
+    """
+    _, labels = np.unique(labels, return_inverse=True)
+    _, other_labels = np.unique(other_labels, return_inverse=True)
+    contingency = np.zeros((labels.max() + 1, other_labels.max() + 1))
+    np.add.at(contingency, (labels, other_labels), 1)
+
+    def pairs(counts):
+        return (counts * (counts - 1) / 2).sum()
+
+    index = pairs(contingency)
+    expected = pairs(contingency.sum(axis=1)) * pairs(contingency.sum(axis=0))
+    expected /= pairs(np.array([len(labels)]))
+    maximum = (pairs(contingency.sum(axis=1)) + pairs(contingency.sum(axis=0))) / 2
+    if maximum == expected:
+        return 1.0
+    return (index - expected) / (maximum - expected)
+
+
+def synthesize_embeddings(hours, num_speakers, dim=256, noise=1.0, seed=0):
+    """
+    Return embeddings of ``num_speakers`` speakers taking turns of a few
+    seconds for ``hours``, and the speaker of each.
+    """
+    rng = np.random.default_rng(seed)
+    num_embeddings = int(hours * EMBEDDINGS_PER_HOUR)
+    turns = rng.integers(0, num_speakers, num_embeddings // 4 + 1)
+    speakers = np.repeat(turns, 4)[:num_embeddings]
+    centers = rng.normal(size=(num_speakers, dim))
+    embeddings = centers[speakers] + rng.normal(scale=noise, size=(num_embeddings, dim))
+    return embeddings.astype(np.float32), speakers
+
+
+def timed(function, *args, **kwargs):
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare landmark spectral clustering with exact spectral "
+        "clustering on speaker embeddings."
+    )
+    parser.add_argument(
+        "--embeddings",
+        default=None,
+        help="A .npy file of speaker embeddings, one per row, defaults to "
+        "synthetic embeddings",
+    )
+    parser.add_argument(
+        "--hours",
+        type=float,
+        nargs="+",
+        default=[0.25, 1, 8],
+        help="Lengths of the synthetic recordings",
+    )
+    parser.add_argument(
+        "--speakers",
+        type=int,
+        default=4,
+        help="Number of speakers of the synthetic recordings",
+    )
+    parser.add_argument(
+        "--noise",
+        type=float,
+        default=1.0,
+        help="Spread of the synthetic embeddings around their speaker, "
+        "higher is harder to cluster",
+    )
+    parser.add_argument(
+        "--num-landmarks",
+        type=int,
+        default=500,
+        help="Landmarks of the landmark clustering",
+    )
+    parser.add_argument(
+        "--max-exact",
+        type=int,
+        default=2000,
+        help="Only run exact clustering up to this many embeddings, "
+        "it needs quadratic memory and cubic time",
+    )
+    parser.add_argument(
+        "--output",
+        default=None,
+        help="Also write the results to this JSON file",
+    )
+    args = parser.parse_args()
+
+    if args.embeddings is not None:
+        recordings = {args.embeddings: (np.load(args.embeddings), None)}
+    else:
+        recordings = {
+            f"{hours}h": synthesize_embeddings(
+                hours, args.speakers, noise=args.noise, seed=i
+            )
+            for i, hours in enumerate(args.hours)
+        }
+
+    results = {}
+    for name, (embeddings, speakers) in recordings.items():
+        labels, seconds = timed(
+            landmark_spectral_cluster,
+            embeddings,
+            num_landmarks=args.num_landmarks,
+        )
+        result = {
+            "embeddings": len(embeddings),
+            "seconds": round(seconds, 3),
+            "speakers": len(np.unique(labels)),
+            "ari_truth": None,
+            "exact_seconds": None,
+            "ari_exact": None,
+        }
+        if speakers is not None:
+            result["ari_truth"] = round(adjusted_rand_index(speakers, labels), 4)
+        if len(embeddings) <= args.max_exact:
+            exact_labels, seconds = timed(spectral_cluster, embeddings)
+            result["exact_seconds"] = round(seconds, 3)
+            result["ari_exact"] = round(adjusted_rand_index(exact_labels, labels), 4)
+        results[name] = result
+
+    def show(value, spec):
+        return f"{value:{spec}}" if value is not None else "-"
+
+    print(
+        f"{'recording':<14} {'embeddings':>10} {'seconds':>8} {'speakers':>8} "
+        f"{'ari_truth':>9} {'exact_s':>8} {'ari_exact':>9}"
+    )
+    for name, result in results.items():
+        print(
+            f"{name:<14} {result['embeddings']:>10} {result['seconds']:>8.2f} "
+            f"{result['speakers']:>8} {show(result['ari_truth'], '>9.4f'):>9} "
+            f"{show(result['exact_seconds'], '>8.2f'):>8} "
+            f"{show(result['ari_exact'], '>9.4f'):>9}"
+        )
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
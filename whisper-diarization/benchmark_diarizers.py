@@ -0,0 +1,203 @@
+import argparse
+import json
+import logging
+import os
+import statistics
+import time
+
+from diarization import DIARIZERS
+from helpers import configure_model_dir
+
+# MSDD once per profile, the other diarizers have no profiles
+SYSTEMS = ["msdd:fast", "msdd:balanced", "msdd:accurate", "lite", "pyannote"]
+TEST_AUDIO = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "tests", "assets", "test.opus"
+)
+
+
+def read_rttm(path):
+    """
+    Return the ``(start_ms, end_ms, speaker)`` turns of an RTTM file.
+    """
+    turns = []
+    with open(path) as f:
+        for line in f:
+            fields = line.split()
+            if not fields or fields[0] != "SPEAKER":
+                continue
+            start, duration = float(fields[3]), float(fields[4])
+            turns.append((int(start * 1000), int((start + duration) * 1000), fields[7]))
+    return turns
+
+
+def to_annotation(turns):
+    from pyannote.core import Annotation, Segment
+
+    annotation = Annotation()
+    for i, (start, end, speaker) in enumerate(turns):
+        annotation[Segment(start / 1000, end / 1000), i] = str(speaker)
+    return annotation
+
+
+def parse_system(system):
+    """
+    Split a ``"diarizer[:profile]"`` system into the diarizer and its options.
+    """
+    diarizer, _, profile = system.partition(":")
+    if diarizer not in DIARIZERS:
+        raise argparse.ArgumentTypeError(
+            f"unknown diarizer {diarizer!r}, choose one of {', '.join(DIARIZERS)}"
+        )
+    return diarizer, {"profile": profile} if profile else {}
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Measure the diarization error rate and real-time factor of "
+        "every diarizer, and of MSDD with every profile."
+    )
+    parser.add_argument(
+        "-a",
+        "--audio",
+        default=TEST_AUDIO,
+        help="Audio file to diarize, defaults to the bundled test audio",
+    )
+    parser.add_argument(
+        "--reference",
+        default=None,
+        help="RTTM file with the reference speaker turns, the DER is only "
+        "measured with one",
+    )
+    parser.add_argument(
+        "--systems",
+        nargs="+",
+        default=SYSTEMS,
+        help="Diarizers to benchmark, as 'diarizer' or 'msdd:profile'",
+    )
+    parser.add_argument(
+        "--hf-token",
+        default=os.environ.get("HF_TOKEN"),
+        help="Hugging Face token for the pyannote diarizer, "
+        "pyannote is skipped without one",
+    )
+    parser.add_argument(
+        "--runs",
+        type=int,
+        default=3,
+        help="Number of timed runs per diarizer after a warmup run",
+    )
+    parser.add_argument(
+        "--collar",
+        type=float,
+        default=0.25,
+        help="Seconds around every reference boundary that aren't scored",
+    )
+    parser.add_argument(
+        "--ignore-overlap",
+        action="store_true",
+        default=False,
+        help="Don't score regions where the reference has overlapping speakers",
+    )
+    parser.add_argument(
+        "--device",
+        default=None,
+        help="if you have a GPU use 'cuda', otherwise 'cpu', defaults to 'cuda' if available",
+    )
+    parser.add_argument(
+        "--output",
+        default=None,
+        help="Also write the results to this JSON file",
+    )
+    parser.add_argument(
+        "--model-dir",
+        default=None,
+        help="Directory with the models downloaded by prefetch.py",
+    )
+    args = parser.parse_args()
+    for system in args.systems:
+        try:
+            parse_system(system)
+        except argparse.ArgumentTypeError as e:
+            parser.error(str(e))
+    # read before the diarizers run, to fail early on a bad file
+    reference = None if args.reference is None else read_rttm(args.reference)
+    configure_model_dir(args.model_dir)
+
+    import faster_whisper
+    import torch
+
+    from pyannote.metrics.diarization import DiarizationErrorRate
+
+    from diarization import create_diarizer
+
+    device = args.device or ("cuda" if torch.cuda.is_available() else "cpu")
+    audio = torch.from_numpy(faster_whisper.decode_audio(args.audio)).unsqueeze(0)
+    duration = audio.shape[-1] / 16000
+
+    results = {}
+    for system in dict.fromkeys(args.systems):
+        name, options = parse_system(system)
+        if name == "pyannote" and not args.hf_token:
+            logging.warning("No Hugging Face token given, skipping pyannote.")
+            continue
+
+        with create_diarizer(
+            name, device=device, hf_token=args.hf_token, **options
+        ) as diarizer:
+            labels = diarizer.diarize(audio)
+            timings = []
+            for _ in range(args.runs):
+                start = time.perf_counter()
+                labels = diarizer.diarize(audio)
+                timings.append(time.perf_counter() - start)
+        del diarizer
+        if device == "cuda":
+            torch.cuda.empty_cache()
+
+        seconds = statistics.median(timings) if timings else float("nan")
+        results[system] = {
+            "seconds": round(seconds, 3),
+            "rtf": round(seconds / duration, 4),
+            "speakers": len({speaker for _, _, speaker in labels}),
+            "labels": labels,
+        }
+
+    if reference is None:
+        # another system's output would only measure how much they disagree
+        logging.warning("No reference given, only the real-time factor is measured.")
+    metric = DiarizationErrorRate(collar=args.collar, skip_overlap=args.ignore_overlap)
+    for result in results.values():
+        labels = result.pop("labels")
+        result["der"] = (
+            None
+            if reference is None
+            else round(metric(to_annotation(reference), to_annotation(labels)), 4)
+        )
+
+    print(f"{duration:.1f}s of audio from {args.audio} on {device}")
+    print(f"{'system':<14} {'seconds':>8} {'rtf':>8} {'der':>8} {'speakers':>8}")
+    for system, result in results.items():
+        der = "-" if result["der"] is None else f"{result['der']:.2%}"
+        print(
+            f"{system:<14} {result['seconds']:>8.2f} {result['rtf']:>8.4f} "
+            f"{der:>8} {result['speakers']:>8}"
+        )
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(
+                {
+                    "audio": args.audio,
+                    "duration": duration,
+                    "device": device,
+                    "reference": args.reference,
+                    "systems": results,
+                },
+                f,
+                indent=2,
+            )
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
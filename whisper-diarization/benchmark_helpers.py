@@ -0,0 +1,320 @@
+import argparse
+import gc
+import json
+import time
+
+import numpy as np
+
+from helpers import (
+    WordTable,
+    filter_missing_timestamps,
+    get_word_ts_anchor,
+    get_words_speaker_ids,
+    get_words_speaker_mapping,
+)
+
+
+def baseline_get_words_speaker_mapping(wrd_ts, spk_ts, word_anchor_option="start"):
+    """
+    The word-by-word loop ``get_words_speaker_mapping`` replaced, kept to
+    compare against.
+    """
+    s, e, sp = spk_ts[0]
+    wrd_pos, turn_idx = 0, 0
+    wrd_spk_mapping = []
+    for wrd_dict in wrd_ts:
+        ws, we, wrd = (
+            int(wrd_dict["start"] * 1000),
+            int(wrd_dict["end"] * 1000),
+            wrd_dict["text"],
+        )
+        wrd_pos = get_word_ts_anchor(ws, we, word_anchor_option)
+        while wrd_pos > float(e):
+            turn_idx += 1
+            turn_idx = min(turn_idx, len(spk_ts) - 1)
+            s, e, sp = spk_ts[turn_idx]
+            if turn_idx == len(spk_ts) - 1:
+                e = get_word_ts_anchor(ws, we, option="end")
+        wrd_spk_mapping.append(
+            {"word": wrd, "start_time": ws, "end_time": we, "speaker": sp}
+        )
+    return wrd_spk_mapping
+
+
+def baseline_get_next_start_timestamp(
+    word_timestamps, current_word_index, final_timestamp
+):
+    # if current word is the last word
+    if current_word_index == len(word_timestamps) - 1:
+        return word_timestamps[current_word_index]["start"]
+
+    next_word_index = current_word_index + 1
+    while current_word_index < len(word_timestamps) - 1:
+        if word_timestamps[next_word_index].get("start") is None:
+            # if next word doesn't have a start timestamp
+            # merge it with the current word and delete it
+            word_timestamps[current_word_index]["word"] += (
+                " " + word_timestamps[next_word_index]["word"]
+            )
+
+            word_timestamps[next_word_index]["word"] = None
+            next_word_index += 1
+            if next_word_index == len(word_timestamps):
+                return final_timestamp
+
+        else:
+            return word_timestamps[next_word_index]["start"]
+
+
+def baseline_filter_missing_timestamps(
+    word_timestamps, initial_timestamp=0, final_timestamp=None
+):
+    """
+    The implementation ``filter_missing_timestamps`` replaced, which fills
+    the words in place and rescans every run of untimed words.
+    """
+    # handle the first and last word
+    if word_timestamps[0].get("start") is None:
+        word_timestamps[0]["start"] = (
+            initial_timestamp if initial_timestamp is not None else 0
+        )
+        word_timestamps[0]["end"] = baseline_get_next_start_timestamp(
+            word_timestamps, 0, final_timestamp
+        )
+
+    result = [
+        word_timestamps[0],
+    ]
+
+    for i, ws in enumerate(word_timestamps[1:], start=1):
+        # if ws doesn't have a start and end
+        # use the previous end as start and next start as end
+        if ws.get("start") is None and ws.get("word") is not None:
+            ws["start"] = word_timestamps[i - 1]["end"]
+            ws["end"] = baseline_get_next_start_timestamp(
+                word_timestamps, i, final_timestamp
+            )
+
+        if ws["word"] is not None:
+            result.append(ws)
+    return result
+
+
+def synthesize_transcript(num_words, num_speakers=4, seed=0):
+    """
+    Return aligner-style word timestamps of ``num_words`` words and speaker
+    turns of a few seconds to tens of seconds covering them.
+    """
+    rng = np.random.default_rng(seed)
+    durations = rng.uniform(0.1, 0.6, num_words)
+    starts = np.cumsum(durations + rng.uniform(0.0, 0.2, num_words))
+    ends = starts + durations
+    word_timestamps = [
+        {"text": f"word{i}", "start": start, "end": end}
+        for i, (start, end) in enumerate(zip(starts.tolist(), ends.tolist()))
+    ]
+
+    turn_ends = np.cumsum(rng.uniform(1.0, 20.0, num_words // 10 + 1)) * 1000
+    turn_ends = turn_ends[turn_ends < ends[-1] * 1000].astype(int).tolist()
+    turn_ends.append(int(ends[-1] * 1000) + 1)
+    turn_speakers = rng.integers(0, num_speakers, len(turn_ends)).tolist()
+    speaker_ts = [
+        [start, end, speaker]
+        for start, end, speaker in zip([0] + turn_ends[:-1], turn_ends, turn_speakers)
+    ]
+    return word_timestamps, speaker_ts
+
+
+def untimed_transcript(num_words, pattern, seed=0):
+    """
+    Return word timestamps in the format ``filter_missing_timestamps`` takes,
+    with the words that lack timestamps laid out by ``pattern``: ``all``,
+    ``alternating``, runs of 1000 (``runs``) or 10% at random (``sparse``).
+    """
+    rng = np.random.default_rng(seed)
+    if pattern == "all":
+        timed = np.zeros(num_words, dtype=bool)
+    elif pattern == "alternating":
+        timed = np.arange(num_words) % 2 == 0
+    elif pattern == "runs":
+        timed = np.arange(num_words) // 1000 % 2 == 0
+    else:
+        timed = rng.random(num_words) >= 0.1
+    return [
+        (
+            {"word": f"word{i}", "start": i * 0.5, "end": i * 0.5 + 0.3}
+            if is_timed
+            else {"word": f"word{i}"}
+        )
+        for i, is_timed in enumerate(timed.tolist())
+    ]
+
+
+def timed(function, *args, repeat=1, **kwargs):
+    """
+    Return the result and the best time of ``repeat`` runs, with the
+    garbage collector off so that it doesn't land in a random run.
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        gc.collect()
+        gc.disable()
+        try:
+            start = time.perf_counter()
+            result = function(*args, **kwargs)
+            best = min(best, time.perf_counter() - start)
+        finally:
+            gc.enable()
+    return result, best
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare the transcript helpers with the implementations "
+        "they replaced on synthetic transcripts."
+    )
+    parser.add_argument(
+        "--words",
+        type=int,
+        nargs="+",
+        default=[10_000, 100_000, 1_000_000],
+        help="Lengths of the synthetic transcripts",
+    )
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=3,
+        help="Report the best of this many runs",
+    )
+    parser.add_argument(
+        "--max-quadratic",
+        type=int,
+        default=200_000,
+        help="Only run the baseline on all-missing timestamps up to this many "
+        "words, it takes quadratic time there",
+    )
+    parser.add_argument(
+        "--output",
+        default=None,
+        help="Also write the results to this JSON file",
+    )
+    args = parser.parse_args()
+
+    results = {}
+    for num_words in args.words:
+        word_timestamps, speaker_ts = synthesize_transcript(num_words)
+        for anchor in ("start", "mid", "end"):
+            expected, baseline_seconds = timed(
+                baseline_get_words_speaker_mapping,
+                word_timestamps,
+                speaker_ts,
+                anchor,
+                repeat=args.repeat,
+            )
+            mapping, seconds = timed(
+                get_words_speaker_mapping,
+                word_timestamps,
+                speaker_ts,
+                anchor,
+                repeat=args.repeat,
+            )
+            results[f"get_words_speaker_mapping/{anchor}/{num_words}"] = {
+                "words": num_words,
+                "baseline_seconds": round(baseline_seconds, 3),
+                "seconds": round(seconds, 3),
+                "speedup": round(baseline_seconds / seconds, 2),
+                "same": mapping == expected,
+            }
+            del mapping
+
+            # the columns a WordTable keeps, built once outside the timing
+            table = WordTable.from_word_timestamps(word_timestamps)
+            turn_ends = [e for _, e, _ in speaker_ts]
+            (turn_ids,), seconds = timed(
+                get_words_speaker_ids,
+                table.start_time,
+                table.end_time,
+                turn_ends,
+                (anchor,),
+                repeat=args.repeat,
+            )
+            results[f"get_words_speaker_ids/{anchor}/{num_words}"] = {
+                "words": num_words,
+                "baseline_seconds": round(baseline_seconds, 3),
+                "seconds": round(seconds, 3),
+                "speedup": round(baseline_seconds / seconds, 2),
+                "same": [speaker_ts[i][2] for i in turn_ids.tolist()]
+                == [word_dict["speaker"] for word_dict in expected],
+            }
+
+            mapped_table, seconds = timed(
+                get_words_speaker_mapping,
+                table,
+                speaker_ts,
+                anchor,
+                repeat=args.repeat,
+            )
+            results[f"get_words_speaker_mapping/WordTable/{anchor}/{num_words}"] = {
+                "words": num_words,
+                "baseline_seconds": round(baseline_seconds, 3),
+                "seconds": round(seconds, 3),
+                "speedup": round(baseline_seconds / seconds, 2),
+                "same": mapped_table.to_records() == expected,
+            }
+            del expected, table, mapped_table
+
+    for num_words in args.words:
+        for pattern in ("sparse", "alternating", "runs", "all"):
+            word_timestamps = untimed_transcript(num_words, pattern)
+            filled, seconds = timed(
+                filter_missing_timestamps,
+                word_timestamps,
+                final_timestamp=num_words * 0.5,
+                repeat=args.repeat,
+            )
+            result = {
+                "words": num_words,
+                "baseline_seconds": None,
+                "seconds": round(seconds, 3),
+                "speedup": None,
+                "same": None,
+            }
+            if pattern != "all" or num_words <= args.max_quadratic:
+                # the baseline fills its input in place, so it gets a fresh copy
+                copies = iter(
+                    [[dict(ws) for ws in word_timestamps] for _ in range(args.repeat)]
+                )
+                expected, baseline_seconds = timed(
+                    lambda: baseline_filter_missing_timestamps(
+                        next(copies), final_timestamp=num_words * 0.5
+                    ),
+                    repeat=args.repeat,
+                )
+                result["baseline_seconds"] = round(baseline_seconds, 3)
+                result["speedup"] = round(baseline_seconds / seconds, 2)
+                result["same"] = filled == expected
+                del expected
+            results[f"filter_missing_timestamps/{pattern}/{num_words}"] = result
+            del filled
+
+    def show(value, spec):
+        return f"{value:{spec}}" if value is not None else "-"
+
+    print(
+        f"{'benchmark':<52} {'baseline_s':>10} {'seconds':>8} {'speedup':>7} "
+        f"{'same':>5}"
+    )
+    for name, result in results.items():
+        print(
+            f"{name:<52} {show(result['baseline_seconds'], '>10.3f'):>10} "
+            f"{result['seconds']:>8.3f} {show(result['speedup'], '>7.2f'):>7} "
+            f"{show(result['same'], ''):>5}"
+        )
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
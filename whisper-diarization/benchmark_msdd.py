@@ -0,0 +1,206 @@
+import argparse
+import json
+import logging
+import os
+import statistics
+import tempfile
+import time
+
+from helpers import configure_model_dir
+
+TEST_AUDIO = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "tests", "assets", "test.opus"
+)
+
+
+def per_call_diarize(model, audio):
+    """
+    Diarize ``audio`` the way MSDDDiarizer used to, in a fresh temporary
+    directory with the configs initialized again, and return the labels and
+    the seconds spent in ``NeuralDiarizer.diarize``.
+    """
+    import soundfile
+
+    from nemo.collections.asr.parts.utils.speaker_utils import rttm_to_labels
+
+    with tempfile.TemporaryDirectory() as temp_path:
+        audio_path = os.path.join(temp_path, "mono_file.wav")
+        soundfile.write(
+            audio_path, audio.squeeze(0).cpu().numpy(), 16000, subtype="FLOAT"
+        )
+        manifest_path = os.path.join(temp_path, "manifest.json")
+        meta = {
+            "audio_filepath": audio_path,
+            "offset": 0,
+            "duration": None,
+            "label": "infer",
+            "text": "-",
+            "rttm_filepath": None,
+            "uem_filepath": None,
+        }
+        with open(manifest_path, "w") as f:
+            json.dump(meta, f)
+
+        model._initialize_configs(
+            manifest_path=manifest_path,
+            max_speakers=8,
+            num_speakers=None,
+            tmpdir=temp_path,
+            batch_size=24,
+            num_workers=0,
+            verbose=True,
+        )
+        diarizer_params = model.clustering_embedding.clus_diar_model._diarizer_params
+        diarizer_params.out_dir = temp_path
+        diarizer_params.manifest_filepath = manifest_path
+        model.msdd_model.cfg.test_ds.manifest_filepath = manifest_path
+        start = time.perf_counter()
+        model.diarize()
+        diarize_seconds = time.perf_counter() - start
+
+        labels = []
+        for label in rttm_to_labels(
+            os.path.join(temp_path, "pred_rttms", "mono_file.rttm")
+        ):
+            start, end, speaker = label.split()
+            start, end = int(float(start) * 1000), int(float(end) * 1000)
+            labels.append((start, end, int(speaker.split("_")[1])))
+    return sorted(labels, key=lambda x: x[0]), diarize_seconds
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Measure the time MSDDDiarizer spends around NeMo's "
+        "NeuralDiarizer.diarize on every call, against setting up a fresh "
+        "directory and configs for each call, and diarize_many against "
+        "diarizing the clips one by one."
+    )
+    parser.add_argument(
+        "-a",
+        "--audio",
+        default=TEST_AUDIO,
+        help="Audio file to cut the clips from, defaults to the bundled test audio",
+    )
+    parser.add_argument(
+        "--durations",
+        type=float,
+        nargs="+",
+        default=[2, 5, 10, 0],
+        help="Clip lengths in seconds, 0 for the whole file",
+    )
+    parser.add_argument(
+        "--runs",
+        type=int,
+        default=5,
+        help="Number of timed runs per clip after a warmup run",
+    )
+    parser.add_argument(
+        "--profile",
+        default="balanced",
+        help="MSDD profile to diarize with",
+    )
+    parser.add_argument(
+        "--device",
+        default=None,
+        help="if you have a GPU use 'cuda', otherwise 'cpu', defaults to 'cuda' if available",
+    )
+    parser.add_argument(
+        "--output",
+        default=None,
+        help="Also write the results to this JSON file",
+    )
+    parser.add_argument(
+        "--model-dir",
+        default=None,
+        help="Directory with the models downloaded by prefetch.py",
+    )
+    args = parser.parse_args()
+    configure_model_dir(args.model_dir)
+
+    import faster_whisper
+    import torch
+
+    from nemo.collections.asr.models.msdd_models import NeuralDiarizer
+
+    from diarization.msdd.msdd import MSDDDiarizer, create_config
+
+    device = args.device or ("cuda" if torch.cuda.is_available() else "cpu")
+    audio = torch.from_numpy(faster_whisper.decode_audio(args.audio)).unsqueeze(0)
+    clips = [audio[:, : int(d * 16000)] if d > 0 else audio for d in args.durations]
+
+    baseline = NeuralDiarizer(cfg=create_config(args.profile)).to(device)
+    diarizer = MSDDDiarizer(device, profile=args.profile)
+    results = []
+    try:
+        for clip in clips:
+            per_call, reused = [], []
+            for _ in range(args.runs + 1):
+                (expected, diarize_seconds), seconds = timed(
+                    per_call_diarize, baseline, clip
+                )
+                per_call.append((seconds, seconds - diarize_seconds))
+                labels, seconds = timed(diarizer.diarize, clip)
+                reused.append((seconds, seconds - diarizer.last_timings["diarize"]))
+                if labels != expected:
+                    logging.warning("MSDDDiarizer disagrees with the per-call setup.")
+            # the first run warms the models up and is left out
+            per_call, reused = per_call[1:], reused[1:]
+            results.append(
+                {
+                    "seconds": round(clip.shape[-1] / 16000, 2),
+                    "per_call_total": statistics.median(t for t, _ in per_call),
+                    "per_call_overhead": statistics.median(o for _, o in per_call),
+                    "reused_total": statistics.median(t for t, _ in reused),
+                    "reused_overhead": statistics.median(o for _, o in reused),
+                }
+            )
+
+        batched = []
+        for _ in range(args.runs + 1):
+            _, seconds = timed(diarizer.diarize_many, clips)
+            batched.append(seconds)
+        batched = statistics.median(batched[1:])
+    finally:
+        diarizer.close()
+
+    print(f"{args.profile} profile on {device}, median of {args.runs} runs")
+    print(
+        f"{'clip':>7} {'per-call':>10} {'overhead':>10} "
+        f"{'reused':>10} {'overhead':>10}"
+    )
+    for result in results:
+        print(
+            f"{result['seconds']:>6.1f}s {result['per_call_total']:>9.3f}s "
+            f"{result['per_call_overhead']:>9.3f}s {result['reused_total']:>9.3f}s "
+            f"{result['reused_overhead']:>9.3f}s"
+        )
+    print(
+        f"diarize_many of all {len(clips)} clips {batched:.3f}s, one by one "
+        f"{sum(result['reused_total'] for result in results):.3f}s"
+    )
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(
+                {
+                    "audio": args.audio,
+                    "device": device,
+                    "profile": args.profile,
+                    "runs": args.runs,
+                    "clips": results,
+                    "diarize_many": batched,
+                },
+                f,
+                indent=2,
+            )
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING)
+    main()
@@ -0,0 +1,120 @@
+import argparse
+import json
+import threading
+import time
+
+import numpy as np
+
+from punctuation import PunctuationService
+
+WORDS = (
+    "so we looked at the numbers again and they were better than last year "
+    "but the team thinks we should wait until the next quarter before we "
+    "decide anything about hiring what do you think about that i agree"
+).split()
+
+
+def synthesize_jobs(num_jobs, words_per_job, seed=0):
+    """
+    Return the unpunctuated words of ``num_jobs`` transcripts, each a random
+    walk over a small vocabulary.
+    """
+    rng = np.random.default_rng(seed)
+    return [rng.choice(WORDS, words_per_job).tolist() for _ in range(num_jobs)]
+
+
+def run_concurrently(service, jobs):
+    """
+    Punctuate every job in its own thread, like the backend's job threads.
+    """
+    results = [None] * len(jobs)
+
+    def run(i):
+        results[i] = service.predict(jobs[i])
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(len(jobs))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare punctuating concurrent jobs through the shared "
+        "punctuation service with one PunctuationModel.predict call per file."
+    )
+    parser.add_argument(
+        "--jobs", type=int, nargs="+", default=[1, 4, 16], help="Concurrent jobs"
+    )
+    parser.add_argument(
+        "--words", type=int, default=3000, help="Words in the transcript of each job"
+    )
+    parser.add_argument(
+        "--max-batch-size", type=int, default=16, help="Chunks per forward pass"
+    )
+    parser.add_argument(
+        "--max-latency",
+        type=float,
+        default=0.05,
+        help="Seconds the service waits for chunks of other jobs",
+    )
+    parser.add_argument(
+        "--output",
+        default=None,
+        help="Also write the results to this JSON file",
+    )
+    args = parser.parse_args()
+
+    service = PunctuationService(
+        max_batch_size=args.max_batch_size, max_latency=args.max_latency
+    )
+    # the service wraps the same model, which runs one chunk per forward pass
+    model = service.model
+    # the first forward pass is slower, it isn't counted
+    model.predict(WORDS, chunk_size=service.chunk_size)
+
+    results = {}
+    try:
+        for num_jobs in args.jobs:
+            jobs = synthesize_jobs(num_jobs, args.words)
+
+            start = time.perf_counter()
+            expected = [
+                model.predict(words, chunk_size=service.chunk_size) for words in jobs
+            ]
+            per_file_seconds = time.perf_counter() - start
+
+            before = service.stats()
+            start = time.perf_counter()
+            labeled = run_concurrently(service, jobs)
+            seconds = time.perf_counter() - start
+            after = service.stats()
+
+            batches = after["batches"] - before["batches"]
+            results[f"{num_jobs}_jobs"] = {
+                "words": num_jobs * args.words,
+                "per_file_seconds": round(per_file_seconds, 3),
+                "seconds": round(seconds, 3),
+                "speedup": round(per_file_seconds / seconds, 2),
+                "mean_batch_size": round(
+                    (after["chunks"] - before["chunks"]) / max(batches, 1), 2
+                ),
+                "same_labels": [
+                    [[word, label] for word, label, _ in job] for job in labeled
+                ]
+                == [[[word, label] for word, label, _ in job] for job in expected],
+            }
+    finally:
+        service.close()
+    results["service"] = service.stats()
+
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+import argparse
+import gc
+import json
+import tracemalloc
+
+import numpy as np
+
+from benchmark_helpers import synthesize_transcript, timed
+from helpers import (
+    WordTable,
+    get_realigned_ws_mapping_with_punctuation,
+    get_sentences_speaker_mapping,
+    get_words_speaker_mapping,
+)
+from punctuation import restore_punctuation
+
+
+def synthesize_labels(num_words, seed=0):
+    """
+    Return punctuation-model style ``[word, label, score]`` rows ending a
+    sentence every 15 words or so.
+    """
+    rng = np.random.default_rng(seed)
+    labels = rng.choice([".", "?", ",", "0"], num_words, p=[0.06, 0.01, 0.08, 0.85])
+    return [[None, label, 0.9] for label in labels.tolist()]
+
+
+def measure_memory(function, *args):
+    """
+    Return the result of ``function`` and the bytes it still holds.
+    """
+    gc.collect()
+    tracemalloc.start()
+    result = function(*args)
+    held, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, held
+
+
+def run_stages(word_timestamps, speaker_ts, labels, use_table, repeat):
+    """
+    Time each stage ``diarize.py`` runs after diarization on one transcript,
+    with the word-speaker mapping kept as dicts or as a ``WordTable``.
+    """
+    stages = {}
+    words = (
+        WordTable.from_word_timestamps(word_timestamps)
+        if use_table
+        else word_timestamps
+    )
+    wsm, stages["words_speaker_mapping"] = timed(
+        get_words_speaker_mapping, words, speaker_ts, "start", repeat=repeat
+    )
+    # the list path punctuates in place, so every run gets its own copy
+    copies = iter(
+        [wsm] * repeat
+        if use_table
+        else [[dict(line_dict) for line_dict in wsm] for _ in range(repeat)]
+    )
+    wsm, stages["restore_punctuation"] = timed(
+        lambda: restore_punctuation(next(copies), labels), repeat=repeat
+    )
+    wsm, stages["realignment"] = timed(
+        get_realigned_ws_mapping_with_punctuation, wsm, repeat=repeat
+    )
+    ssm, stages["sentences"] = timed(
+        get_sentences_speaker_mapping, wsm, speaker_ts, repeat=repeat
+    )
+    return ssm, {stage: round(seconds, 3) for stage, seconds in stages.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare the memory and stage timings of word-speaker "
+        "mappings kept as dicts and as a WordTable on synthetic transcripts."
+    )
+    parser.add_argument(
+        "--words",
+        type=int,
+        nargs="+",
+        default=[100_000, 1_000_000],
+        help="Lengths of the synthetic transcripts",
+    )
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=3,
+        help="Report the best of this many runs",
+    )
+    parser.add_argument(
+        "--output",
+        default=None,
+        help="Also write the results to this JSON file",
+    )
+    args = parser.parse_args()
+
+    results = {}
+    for num_words in args.words:
+        word_timestamps, speaker_ts = synthesize_transcript(num_words)
+        labels = synthesize_labels(num_words)
+
+        mapping, dict_bytes = measure_memory(
+            get_words_speaker_mapping, word_timestamps, speaker_ts
+        )
+        del mapping
+        table, table_bytes = measure_memory(
+            lambda: get_words_speaker_mapping(
+                WordTable.from_word_timestamps(word_timestamps), speaker_ts
+            )
+        )
+        del table
+
+        expected, dict_stages = run_stages(
+            word_timestamps, speaker_ts, labels, False, args.repeat
+        )
+        sentences, table_stages = run_stages(
+            word_timestamps, speaker_ts, labels, True, args.repeat
+        )
+        results[num_words] = {
+            "dict_mb": round(dict_bytes / 2**20, 1),
+            "table_mb": round(table_bytes / 2**20, 1),
+            "dict_seconds": dict_stages,
+            "table_seconds": table_stages,
+            "same": sentences == expected,
+        }
+        del expected, sentences
+
+    print(
+        f"{'words':>9} {'stage':<22} {'dict_s':>7} {'table_s':>7}  "
+        f"{'dict_mb':>7} {'table_mb':>8} {'same':>5}"
+    )
+    for num_words, result in results.items():
+        for i, stage in enumerate(result["dict_seconds"]):
+            memory = (
+                f"{result['dict_mb']:>7.1f} {result['table_mb']:>8.1f} "
+                f"{str(result['same']):>5}"
+                if i == 0
+                else ""
+            )
+            print(
+                f"{num_words:>9} {stage:<22} {result['dict_seconds'][stage]:>7.3f} "
+                f"{result['table_seconds'][stage]:>7.3f}  {memory}"
+            )
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
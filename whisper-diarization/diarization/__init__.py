@@ -1,3 +1,71 @@
-from .msdd.msdd import MSDDDiarizer
+import importlib
+import inspect
 
-__all__ = ["MSDDDiarizer"]
+from typing import Dict, Type
+
+from .base import Diarizer, SpeakerTurns
+from .enrollment import SpeakerIndex, rename_speakers
+
+# backends by name, as "module:class" so that only the one in use is imported
+DIARIZERS: Dict[str, str] = {
+    "msdd": "diarization.msdd.msdd:MSDDDiarizer",
+    "pyannote": "diarization.pyannote.pyannote:PyannoteDiarizer",
+    "lite": "diarization.lite.lite:LiteDiarizer",
+    "online": "diarization.online:OnlineDiarizer",
+}
+
+
+def register_diarizer(name: str, path: str):
+    """
+    Make the ``Diarizer`` subclass at ``"module:class"`` available as
+    ``name`` to ``create_diarizer`` and the ``--diarizer`` options.
+    """
+    DIARIZERS[name] = path
+
+
+def get_diarizer_class(name: str) -> Type[Diarizer]:
+    if name not in DIARIZERS:
+        raise ValueError(
+            f"Unknown diarizer {name!r}, choose one of {', '.join(DIARIZERS)}"
+        )
+    module, _, cls = DIARIZERS[name].partition(":")
+    return getattr(importlib.import_module(module), cls)
+
+
+def create_diarizer(name: str, device="cpu", **options) -> Diarizer:
+    """
+    Create the ``name`` diarizer on ``device``.
+
+    Options the backend doesn't take are ignored, so every entry point can
+    pass all of its settings, e.g. ``profile`` only applies to MSDD and
+    ``hf_token`` to pyannote.
+    """
+    cls = get_diarizer_class(name)
+    parameters = inspect.signature(cls.__init__).parameters
+    return cls(
+        device=device,
+        **{key: value for key, value in options.items() if key in parameters},
+    )
+
+
+def __getattr__(name):
+    # MSDD pulls in NeMo, so it is only imported when it is asked for
+    if name in ("MSDDDiarizer", "PROFILES"):
+        from .msdd import msdd
+
+        return getattr(msdd, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+__all__ = [
+    "DIARIZERS",
+    "Diarizer",
+    "MSDDDiarizer",
+    "PROFILES",
+    "SpeakerIndex",
+    "SpeakerTurns",
+    "create_diarizer",
+    "get_diarizer_class",
+    "register_diarizer",
+    "rename_speakers",
+]
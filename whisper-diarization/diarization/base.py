@@ -0,0 +1,49 @@
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+# (start_ms, end_ms, speaker) turns, sorted by their start
+SpeakerTurns = List[Tuple[int, int, int]]
+
+
+class Diarizer:
+    """
+    Interface shared by the diarization backends in ``DIARIZERS``.
+
+    ``diarize`` takes 16 kHz mono audio shaped ``(1, samples)`` and returns
+    the speaker turns in it, with speakers numbered from 0. After every call
+    ``last_speaker_embeddings`` holds one dict per recording with the
+    embedding of each of its speakers, which can be matched against a
+    ``SpeakerIndex`` of ``embedding_model`` embeddings.
+    """
+
+    # name of the model the speaker embeddings come from
+    embedding_model: Optional[str] = None
+
+    def __init__(self, device="cpu"):
+        self.device = device
+        self.last_speaker_embeddings: List[Dict[int, np.ndarray]] = []
+
+    def diarize(
+        self, audio, num_speakers: Optional[int] = None, max_speakers: int = 8
+    ) -> SpeakerTurns:
+        raise NotImplementedError
+
+    def diarize_many(
+        self, audios, num_speakers: Optional[int] = None, max_speakers: int = 8
+    ) -> List[SpeakerTurns]:
+        labels, speaker_embeddings = [], []
+        for audio in audios:
+            labels.append(self.diarize(audio, num_speakers, max_speakers))
+            speaker_embeddings.extend(self.last_speaker_embeddings)
+        self.last_speaker_embeddings = speaker_embeddings
+        return labels
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
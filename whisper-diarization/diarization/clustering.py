@@ -0,0 +1,216 @@
+from typing import Optional
+
+import numpy as np
+
+
+def cosine_affinity(embeddings: np.ndarray) -> np.ndarray:
+    """
+    Return the cosine similarities of every pair of embeddings scaled to
+    [0, 1].
+    """
+    embeddings = embeddings / np.maximum(
+        np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12
+    )
+    return (embeddings @ embeddings.T + 1) / 2
+
+
+def prune_affinity(affinity: np.ndarray, p_neighbors: int) -> np.ndarray:
+    """
+    Keep the ``p_neighbors`` strongest affinities of every row, binarized, and
+    make the result symmetric.
+    """
+    n = affinity.shape[0]
+    p_neighbors = min(max(p_neighbors, 1), n)
+    neighbors = np.argpartition(-affinity, p_neighbors - 1, axis=1)[:, :p_neighbors]
+    pruned = np.zeros_like(affinity)
+    np.put_along_axis(pruned, neighbors, 1.0, axis=1)
+    return np.maximum(pruned, pruned.T)
+
+
+def laplacian_embedding(affinity: np.ndarray, num_vectors: int):
+    """
+    Return all the eigenvalues of the graph Laplacian of ``affinity``, in
+    ascending order, and the eigenvectors of the ``num_vectors`` smallest.
+    """
+    affinity = affinity.copy()
+    np.fill_diagonal(affinity, 0)
+    laplacian = np.diag(affinity.sum(axis=1)) - affinity
+    eigenvalues, eigenvectors = np.linalg.eigh(laplacian)
+    return eigenvalues, eigenvectors[:, :num_vectors]
+
+
+def estimate_num_speakers(eigenvalues: np.ndarray, max_speakers: int) -> int:
+    """
+    Return the number of clusters at the largest gap between consecutive
+    Laplacian eigenvalues.
+    """
+    gaps = np.diff(eigenvalues[: max_speakers + 1])
+    return int(np.argmax(gaps)) + 1 if len(gaps) else 1
+
+
+def kmeans(
+    points: np.ndarray, k: int, n_init: int = 10, max_iter: int = 100, seed: int = 0
+) -> np.ndarray:
+    """
+    Return the k-means++ cluster of every point, keeping the best of
+    ``n_init`` runs.
+    """
+    rng = np.random.default_rng(seed)
+    n = points.shape[0]
+    squared_norms = (points**2).sum(axis=1)
+    best_labels, best_inertia = None, np.inf
+    for _ in range(n_init):
+        centers = points[[rng.integers(n)]]
+        for _ in range(1, k):
+            distances = (
+                squared_norms[:, None] - 2 * points @ centers.T + (centers**2).sum(1)
+            ).min(axis=1)
+            distances = np.maximum(distances, 0)
+            total = distances.sum()
+            probabilities = distances / total if total > 0 else None
+            centers = np.vstack([centers, points[rng.choice(n, p=probabilities)]])
+
+        labels = None
+        for _ in range(max_iter):
+            distances = (
+                squared_norms[:, None] - 2 * points @ centers.T + (centers**2).sum(1)
+            )
+            new_labels = distances.argmin(axis=1)
+            if labels is not None and np.array_equal(labels, new_labels):
+                break
+            labels = new_labels
+            counts = np.bincount(labels, minlength=k)
+            sums = np.zeros_like(centers)
+            np.add.at(sums, labels, points)
+            # empty clusters keep their previous center
+            centers = np.where(
+                counts[:, None] > 0, sums / np.maximum(counts, 1)[:, None], centers
+            )
+
+        inertia = distances[np.arange(n), labels].sum()
+        if inertia < best_inertia:
+            best_labels, best_inertia = labels, inertia
+    return best_labels
+
+
+def spectral_cluster(
+    embeddings: np.ndarray,
+    num_speakers: Optional[int] = None,
+    max_speakers: int = 8,
+    max_rp_threshold: float = 0.25,
+    sparse_search_volume: int = 10,
+) -> np.ndarray:
+    """
+    Cluster speaker embeddings and return a label per embedding.
+
+    Like NeMo's NME-SC, the affinity graph keeps the ``p`` most similar
+    embeddings of each one, and ``p`` is picked among ``sparse_search_volume``
+    values up to ``max_rp_threshold`` of the embeddings as the one with the
+    largest eigengap for its size. Without ``num_speakers``, the number of
+    speakers is taken from that eigengap, up to ``max_speakers``. Labels are
+    numbered by first appearance.
+    """
+    n = embeddings.shape[0]
+    if n == 0:
+        return np.zeros(0, dtype=np.int64)
+    if n == 1 or num_speakers == 1:
+        return np.zeros(n, dtype=np.int64)
+
+    affinity = cosine_affinity(embeddings)
+    max_speakers = min(max_speakers, n)
+    p_values = np.unique(
+        np.linspace(1, max(int(n * max_rp_threshold), 1), sparse_search_volume).astype(
+            int
+        )
+    )
+    best = None
+    for p_neighbors in p_values:
+        eigenvalues, eigenvectors = laplacian_embedding(
+            prune_affinity(affinity, p_neighbors), max_speakers + 1
+        )
+        gaps = np.diff(eigenvalues[: max_speakers + 1])
+        # the eigengap relative to the spread of the eigenvalues, per neighbor
+        ratio = p_neighbors / (gaps.max() / max(eigenvalues[-1], 1e-10) + 1e-10)
+        if best is None or ratio < best[0]:
+            best = ratio, eigenvalues, eigenvectors
+    _, eigenvalues, eigenvectors = best
+
+    if num_speakers is None:
+        num_speakers = estimate_num_speakers(eigenvalues, max_speakers)
+    num_speakers = min(num_speakers, n)
+    if num_speakers == 1:
+        return np.zeros(n, dtype=np.int64)
+
+    labels = kmeans(eigenvectors[:, :num_speakers], num_speakers)
+    return renumber_labels(labels)
+
+
+def assign_to_centers(
+    points: np.ndarray, centers: np.ndarray, chunk_size: int = 4096
+) -> np.ndarray:
+    """
+    Return the index of the nearest center of every point.
+
+    Distances are computed ``chunk_size`` points at a time, so memory stays
+    linear in the number of points.
+    """
+    center_norms = (centers**2).sum(axis=1)
+    labels = np.empty(points.shape[0], dtype=np.int64)
+    for start in range(0, points.shape[0], chunk_size):
+        chunk = points[start : start + chunk_size]
+        labels[start : start + chunk_size] = (
+            center_norms - 2 * chunk @ centers.T
+        ).argmin(axis=1)
+    return labels
+
+
+def landmark_spectral_cluster(
+    embeddings: np.ndarray,
+    num_speakers: Optional[int] = None,
+    max_speakers: int = 8,
+    num_landmarks: int = 500,
+    max_iter: int = 5,
+    seed: int = 0,
+) -> np.ndarray:
+    """
+    Cluster speaker embeddings of long recordings in near-linear memory.
+
+    ``spectral_cluster`` builds an ``n`` x ``n`` affinity matrix, which
+    takes gigabytes for a few hours of audio. Here the embeddings are first
+    overclustered around ``num_landmarks`` landmarks, sampled at random and
+    refined by ``max_iter`` k-means iterations in chunks. The landmarks are
+    then clustered with ``spectral_cluster`` and every embedding takes the
+    speaker of its landmark. Recordings with fewer embeddings than
+    landmarks are clustered exactly.
+    """
+    n = embeddings.shape[0]
+    if n <= num_landmarks:
+        return spectral_cluster(embeddings, num_speakers, max_speakers)
+
+    points = embeddings / np.maximum(
+        np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12
+    )
+    rng = np.random.default_rng(seed)
+    landmarks = points[rng.choice(n, num_landmarks, replace=False)]
+    for _ in range(max_iter):
+        assignments = assign_to_centers(points, landmarks)
+        # sums over sorted runs, np.add.at is slow for this many rows
+        order = np.argsort(assignments, kind="stable")
+        _, starts, counts = np.unique(
+            assignments[order], return_index=True, return_counts=True
+        )
+        # landmarks left without embeddings are dropped
+        landmarks = np.add.reduceat(points[order], starts) / counts[:, None]
+    assignments = assign_to_centers(points, landmarks)
+
+    landmark_labels = spectral_cluster(landmarks, num_speakers, max_speakers)
+    return renumber_labels(landmark_labels[assignments])
+
+
+def renumber_labels(labels: np.ndarray) -> np.ndarray:
+    """
+    Renumber labels in the order they first appear in.
+    """
+    _, first, inverse = np.unique(labels, return_index=True, return_inverse=True)
+    order = np.argsort(np.argsort(first))
+    return order[inverse]
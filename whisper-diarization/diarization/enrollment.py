@@ -0,0 +1,230 @@
+import json
+import os
+import time
+
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+
+def _normalize(embeddings: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(embeddings, axis=-1, keepdims=True)
+    return embeddings / np.maximum(norms, 1e-12)
+
+
+def _replace(path: str, write):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+class SpeakerIndex:
+    """
+    Speaker embeddings of known people, to name the speakers of a recording.
+
+    The index is a directory with ``embeddings.npy``, one unit-length float16
+    row per enrolled speaker, and ``speakers.json`` with their names in the
+    same order. Searching normalizes the query embeddings and compares them
+    with every enrolled speaker in a single matrix product, which takes a
+    few milliseconds for 100k speakers.
+
+    Embeddings of different models can't be compared, so an index only
+    accepts embeddings of the ``model`` and size it was created with.
+    """
+
+    EMBEDDINGS_FILE = "embeddings.npy"
+    SPEAKERS_FILE = "speakers.json"
+
+    def __init__(self, path: str, model: Optional[str] = None):
+        self.path = path
+        self.model = model
+        self.dim = None
+        self._speakers = []
+        self._embeddings = np.zeros((0, 0), dtype=np.float16)
+        # searching in float32 is much faster than in float16, which numpy
+        # doesn't hand to BLAS, so a float32 copy is kept once it's needed
+        self._search_matrix = None
+
+        speakers_path = os.path.join(self.path, self.SPEAKERS_FILE)
+        if os.path.exists(speakers_path):
+            with open(speakers_path, encoding="utf-8") as f:
+                meta = json.load(f)
+            if model is not None and meta["model"] not in (None, model):
+                raise ValueError(
+                    f"{self.path} holds {meta['model']} embeddings, not {model}"
+                )
+            self.model = meta["model"]
+            self.dim = meta["dim"]
+            self._speakers = meta["speakers"]
+            self._embeddings = np.load(os.path.join(self.path, self.EMBEDDINGS_FILE))
+        self._rows = {speaker["name"]: i for i, speaker in enumerate(self._speakers)}
+
+    def __len__(self):
+        return len(self._speakers)
+
+    def __contains__(self, name: str):
+        return name in self._rows
+
+    def list_speakers(self) -> List[dict]:
+        """
+        Return the ``name``, number of enrolled ``samples`` and enrollment
+        times of every speaker.
+        """
+        return [dict(speaker) for speaker in self._speakers]
+
+    def enroll(self, name: str, embeddings: np.ndarray):
+        """
+        Add one or more embeddings of ``name`` to the index.
+
+        A speaker that is already enrolled keeps the average of all the
+        embeddings it was given, so it can be refined with every recording.
+        """
+        embeddings = _normalize(np.atleast_2d(np.asarray(embeddings, np.float32)))
+        if self.dim is None:
+            self.dim = embeddings.shape[1]
+            self._embeddings = np.zeros((0, self.dim), dtype=np.float16)
+        elif embeddings.shape[1] != self.dim:
+            raise ValueError(
+                f"Expected embeddings of size {self.dim}, got {embeddings.shape[1]}"
+            )
+
+        now = time.strftime("%Y-%m-%dT%H:%M:%S")
+        total = embeddings.sum(axis=0)
+        if name in self._rows:
+            row = self._rows[name]
+            speaker = self._speakers[row]
+            total += self._embeddings[row].astype(np.float32) * speaker["samples"]
+            speaker["samples"] += len(embeddings)
+            speaker["updated_at"] = now
+            self._embeddings[row] = _normalize(total)
+        else:
+            self._rows[name] = len(self._speakers)
+            self._speakers.append(
+                {
+                    "name": name,
+                    "samples": len(embeddings),
+                    "created_at": now,
+                    "updated_at": now,
+                }
+            )
+            self._embeddings = np.concatenate(
+                [self._embeddings, _normalize(total)[None].astype(np.float16)]
+            )
+        self._search_matrix = None
+
+    def delete(self, name: str) -> bool:
+        """
+        Remove ``name`` from the index, return whether it was enrolled.
+        """
+        row = self._rows.pop(name, None)
+        if row is None:
+            return False
+
+        del self._speakers[row]
+        self._embeddings = np.delete(self._embeddings, row, axis=0)
+        self._rows = {speaker["name"]: i for i, speaker in enumerate(self._speakers)}
+        self._search_matrix = None
+        return True
+
+    def search(self, embeddings: np.ndarray, top_k: int = 1):
+        """
+        Return the names and cosine similarities of the ``top_k`` enrolled
+        speakers closest to each embedding, best first.
+        """
+        queries = _normalize(np.atleast_2d(np.asarray(embeddings, np.float32)))
+        if not self._speakers:
+            return [[] for _ in queries], np.zeros((len(queries), 0), np.float32)
+        if queries.shape[1] != self.dim:
+            raise ValueError(
+                f"Expected embeddings of size {self.dim}, got {queries.shape[1]}"
+            )
+
+        if self._search_matrix is None:
+            self._search_matrix = self._embeddings.astype(np.float32)
+        scores = queries @ self._search_matrix.T
+
+        top_k = min(top_k, len(self._speakers))
+        rows = np.argpartition(-scores, top_k - 1, axis=1)[:, :top_k]
+        top_scores = np.take_along_axis(scores, rows, axis=1)
+        order = np.argsort(-top_scores, axis=1)
+        rows = np.take_along_axis(rows, order, axis=1)
+        top_scores = np.take_along_axis(top_scores, order, axis=1)
+        names = [[self._speakers[row]["name"] for row in query] for query in rows]
+        return names, top_scores
+
+    def identify(
+        self, embeddings: Dict[int, np.ndarray], threshold: float = 0.6
+    ) -> Dict[int, Optional[str]]:
+        """
+        Map the speakers of one recording to enrolled names.
+
+        Takes an embedding per speaker label and returns the enrolled name
+        of each, or None when nobody is at least ``threshold`` similar. Two
+        speakers of the same recording never get the same name, the most
+        similar pair wins.
+        """
+        labels = list(embeddings)
+        identities = dict.fromkeys(labels)
+        if not labels or not self._speakers:
+            return identities
+
+        names, scores = self.search(
+            np.stack([embeddings[label] for label in labels]),
+            top_k=len(labels),
+        )
+        candidates = sorted(
+            (
+                (score, i, name)
+                for i in range(len(labels))
+                for name, score in zip(names[i], scores[i])
+                if score >= threshold
+            ),
+            reverse=True,
+        )
+        taken = set()
+        for _, i, name in candidates:
+            if identities[labels[i]] is None and name not in taken:
+                identities[labels[i]] = name
+                taken.add(name)
+        return identities
+
+    def save(self):
+        os.makedirs(self.path, exist_ok=True)
+        _replace(
+            os.path.join(self.path, self.EMBEDDINGS_FILE),
+            lambda path: _write_npy(path, self._embeddings),
+        )
+        _replace(
+            os.path.join(self.path, self.SPEAKERS_FILE),
+            lambda path: _write_json(
+                path, {"model": self.model, "dim": self.dim, "speakers": self._speakers}
+            ),
+        )
+
+
+def _write_npy(path: str, array: np.ndarray):
+    # np.save would add .npy to the temporary file name
+    with open(path, "wb") as f:
+        np.save(f, array)
+
+
+def _write_json(path: str, data):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+
+
+def rename_speakers(
+    segments: Sequence[dict], identities: Dict[str, Optional[str]]
+) -> List[dict]:
+    """
+    Replace the ``speaker`` of every segment by its enrolled name, keeping
+    the anonymous label of speakers that weren't identified.
+    """
+    return [
+        {**segment, "speaker": identities.get(segment["speaker"]) or segment["speaker"]}
+        for segment in segments
+    ]
@@ -0,0 +1,197 @@
+import math
+
+from typing import Dict, List, Optional, Tuple, Union
+
+import numpy as np
+import torch
+
+from ..base import Diarizer, SpeakerTurns
+from ..clustering import landmark_spectral_cluster
+
+SAMPLE_RATE = 16000
+
+
+def detect_speech(
+    audio: np.ndarray,
+    frame_ms: int = 30,
+    hop_ms: int = 10,
+    threshold_db: float = 12.0,
+    min_speech_ms: int = 250,
+    min_silence_ms: int = 300,
+    pad_ms: int = 50,
+    block_frames: int = 6000,
+) -> List[Tuple[int, int]]:
+    """
+    Return the ``(start, end)`` samples of the speech regions of ``audio``.
+
+    Frames count as speech when they are ``threshold_db`` louder than the
+    noise floor, the 10th percentile of the frame energies, or close enough
+    to the loudest frames for recordings without any silence. Silences
+    shorter than ``min_silence_ms`` are bridged and regions shorter than
+    ``min_speech_ms`` dropped. Energies are summed ``block_frames`` frames
+    at a time.
+    """
+    frame = SAMPLE_RATE * frame_ms // 1000
+    hop = SAMPLE_RATE * hop_ms // 1000
+    if len(audio) < frame:
+        return []
+
+    # frame energies from cumulative sums, framing a long recording would
+    # copy every sample frame / hop times, and the sums run over blocks of
+    # frames so that only a block of the recording is copied to float64
+    starts = np.arange(0, len(audio) - frame + 1, hop)
+    energy = np.empty(len(starts))
+    for i in range(0, len(starts), block_frames):
+        block = starts[i : i + block_frames] - starts[i]
+        squared = np.square(
+            audio[starts[i] : starts[i] + block[-1] + frame], dtype=np.float64
+        )
+        cumulative = np.concatenate([[0.0], np.cumsum(squared)])
+        energy[i : i + len(block)] = cumulative[block + frame] - cumulative[block]
+    energy_db = 10 * np.log10(energy / frame + 1e-10)
+    threshold = min(
+        np.percentile(energy_db, 10) + threshold_db,
+        np.percentile(energy_db, 99) - 2 * threshold_db,
+    )
+
+    voiced = np.concatenate([[False], energy_db > threshold, [False]])
+    edges = np.flatnonzero(np.diff(voiced.astype(np.int8)))
+    regions = []
+    for first, last in zip(starts[edges[::2]], starts[edges[1::2] - 1] + frame):
+        if regions and first - regions[-1][1] < SAMPLE_RATE * min_silence_ms // 1000:
+            regions[-1][1] = last
+        else:
+            regions.append([first, last])
+
+    pad = SAMPLE_RATE * pad_ms // 1000
+    return [
+        (max(int(start) - pad, 0), min(int(end) + pad, len(audio)))
+        for start, end in regions
+        if end - start >= SAMPLE_RATE * min_speech_ms // 1000
+    ]
+
+
+class LiteDiarizer(Diarizer):
+    """
+    A fast diarizer for CPUs that doesn't need a Hugging Face token.
+
+    Speech is found by its energy, split into ``window_sec`` windows every
+    ``shift_sec``, and every window is embedded in batches by a small
+    ResNet34 speaker model. The embeddings are clustered with
+    ``landmark_spectral_cluster``, exactly up to ``num_landmarks`` windows
+    and around that many landmarks beyond, and every window is assigned the
+    audio up to the middle of its neighbours. There is no overlap
+    detection, so it suits calls with a few speakers taking turns, where it
+    is much cheaper than MSDD.
+    """
+
+    embedding_model = "pyannote/wespeaker-voxceleb-resnet34-LM"
+
+    def __init__(
+        self,
+        device: Union[str, torch.device] = "cpu",
+        window_sec: float = 1.5,
+        shift_sec: float = 0.75,
+        batch_size: int = 32,
+        num_landmarks: int = 500,
+    ):
+        super().__init__(device)
+        from pyannote.audio import Model
+
+        self.model = Model.from_pretrained(self.embedding_model).eval().to(device)
+        self.window = int(window_sec * SAMPLE_RATE)
+        self.shift = int(shift_sec * SAMPLE_RATE)
+        self.batch_size = batch_size
+        self.num_landmarks = num_landmarks
+
+    def diarize(
+        self,
+        audio: torch.Tensor,
+        num_speakers: Optional[int] = None,
+        max_speakers: int = 8,
+    ) -> SpeakerTurns:
+        audio = audio.detach().cpu().reshape(-1).numpy()
+        windows = self.get_windows(detect_speech(audio))
+        if not windows:
+            self.last_speaker_embeddings = [{}]
+            return []
+
+        embeddings = self.embed(audio, windows)
+        labels = landmark_spectral_cluster(
+            embeddings, num_speakers, max_speakers, self.num_landmarks
+        )
+        self.last_speaker_embeddings = [
+            self._get_speaker_embeddings(embeddings, labels)
+        ]
+        return self.get_turns(windows, labels)
+
+    def get_windows(self, regions: List[Tuple[int, int]]):
+        """
+        Return the ``(region, start, end)`` samples of every window, regions
+        shorter than a window are a window of their own.
+        """
+        windows = []
+        for region, (start, end) in enumerate(regions):
+            count = math.ceil(max(end - start - self.window, 0) / self.shift) + 1
+            for i in range(count):
+                window_start = max(
+                    min(start + i * self.shift, end - self.window), start
+                )
+                windows.append(
+                    (region, window_start, min(window_start + self.window, end))
+                )
+        return windows
+
+    def embed(self, audio: np.ndarray, windows) -> np.ndarray:
+        """
+        Return the speaker embedding of every ``(region, start, end)`` window
+        of ``audio``.
+        """
+        embeddings = []
+        with torch.inference_mode():
+            # only a batch of windows is copied out of the audio at a time
+            for i in range(0, len(windows), self.batch_size):
+                # short windows are filled by repeating them, so they batch
+                # with the rest
+                batch = np.stack(
+                    [
+                        np.resize(audio[start:end], self.window)
+                        for _, start, end in windows[i : i + self.batch_size]
+                    ]
+                )
+                batch = torch.from_numpy(batch).unsqueeze(1)
+                embeddings.append(self.model(batch.to(self.device)).float().cpu())
+        return torch.cat(embeddings).numpy()
+
+    @staticmethod
+    def _get_speaker_embeddings(
+        embeddings: np.ndarray, labels: np.ndarray
+    ) -> Dict[int, np.ndarray]:
+        embeddings = embeddings / np.maximum(
+            np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12
+        )
+        return {
+            int(speaker): embeddings[labels == speaker].mean(axis=0)
+            for speaker in np.unique(labels)
+        }
+
+    @staticmethod
+    def get_turns(windows, labels: np.ndarray) -> SpeakerTurns:
+        """
+        Give every window the audio between the middles of its neighbours in
+        the same region, and merge consecutive windows of the same speaker.
+        """
+        turns = []
+        # twice the center of every window
+        centers = [start + end for _, start, end in windows]
+        for i, ((region, start, end), speaker) in enumerate(zip(windows, labels)):
+            if i > 0 and windows[i - 1][0] == region:
+                start = (centers[i - 1] + centers[i]) // 4
+            if i + 1 < len(windows) and windows[i + 1][0] == region:
+                end = (centers[i] + centers[i + 1]) // 4
+            start_ms, end_ms = start * 1000 // SAMPLE_RATE, end * 1000 // SAMPLE_RATE
+            if turns and turns[-1][2] == speaker and turns[-1][1] >= start_ms:
+                turns[-1] = (turns[-1][0], end_ms, int(speaker))
+            else:
+                turns.append((start_ms, end_ms, int(speaker)))
+        return turns
@@ -1,79 +1,661 @@
+import hashlib
 import json
+import logging
+import math
 import os
+import shutil
 import tempfile
+import threading
+import time
+import weakref
 
-from typing import Union
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import List, Optional, Union
 
+import soundfile
 import torch
-import torchaudio
 
 from nemo.collections.asr.models.msdd_models import NeuralDiarizer
-from nemo.collections.asr.parts.utils.speaker_utils import rttm_to_labels
+from nemo.collections.asr.parts.utils.speaker_utils import (
+    audio_rttm_map,
+    get_embs_and_timestamps,
+    perform_clustering,
+    rttm_to_labels,
+)
 from omegaconf import OmegaConf
 
+from ..base import Diarizer
 
-class MSDDDiarizer:
-    def __init__(self, device: Union[str, torch.device]):
-        self.model: NeuralDiarizer = NeuralDiarizer(cfg=create_config()).to(device)
+logger = logging.getLogger(__name__)
 
-    def diarize(self, audio: torch.Tensor):
-        with tempfile.TemporaryDirectory() as temp_path:
-            torchaudio.save(
-                os.path.join(temp_path, "mono_file.wav"),
-                audio,
-                16000,
-                channels_first=True,
+# The telephonic MSDD model was trained on the five scales from 1.5 to 0.5
+# seconds, so every profile keeps them and trades speed for accuracy through
+# their shifts only, which NeMo needs shorter than the windows. Embedding
+# extraction runs once per subsegment and dominates the run time, so each
+# profile extracts about twice as many as the one before: on one CPU core
+# benchmark_diarizers.py measured a real-time factor of 0.36, 0.59 and 1.11
+# for them. diar_window_length counts base-scale steps and is scaled with
+# the base shift to keep the MSDD context.
+PROFILES = {
+    "fast": {
+        "window_length_in_sec": [1.5, 1.25, 1.0, 0.75, 0.5],
+        "shift_length_in_sec": [1.35, 1.125, 0.9, 0.675, 0.45],
+        "multiscale_weights": [1, 1, 1, 1, 1],
+        "infer_batch_size": 50,
+        "diar_window_length": 28,
+        # overlapping speech is only detected below this many speakers
+        "overlap_infer_spk_limit": 0,
+    },
+    "balanced": {
+        "window_length_in_sec": [1.5, 1.25, 1.0, 0.75, 0.5],
+        "shift_length_in_sec": [0.75, 0.625, 0.5, 0.375, 0.25],
+        "multiscale_weights": [1, 1, 1, 1, 1],
+        "infer_batch_size": 25,
+        "diar_window_length": 50,
+        "overlap_infer_spk_limit": 5,
+    },
+    "accurate": {
+        "window_length_in_sec": [1.5, 1.25, 1.0, 0.75, 0.5],
+        "shift_length_in_sec": [0.375, 0.3125, 0.25, 0.1875, 0.125],
+        "multiscale_weights": [1, 1, 1, 1, 1],
+        "infer_batch_size": 12,
+        "diar_window_length": 100,
+        "overlap_infer_spk_limit": 8,
+    },
+}
+DEFAULT_PROFILE = "balanced"
+
+DEFAULT_CLUSTERING_MEMORY_MB = 4096
+
+
+def get_clustering_chunking(
+    num_embeddings: int,
+    memory_mb: float,
+    num_scales: int,
+    max_num_speakers: int,
+    max_chunk_cluster_count: int = 50,
+):
+    """
+    Return the ``embeddings_per_chunk`` and ``chunk_cluster_count`` that keep
+    clustering ``num_embeddings`` base-scale segments within ``memory_mb``.
+
+    Clustering a chunk of ``k`` segments holds a ``k`` x ``k`` float32
+    affinity matrix per scale, plus the fused, binarized and Laplacian
+    matrices and the eigenvectors, so chunks are as large as the budget
+    allows. Recordings that fit are clustered in one piece. Longer ones are
+    split into even chunks, and each chunk is overclustered into as many
+    clusters as the budget leaves room for when the clusters of all chunks
+    are merged, up to ``max_chunk_cluster_count``.
+    """
+    bytes_per_pair = 4 * (num_scales + 4)
+    max_chunk = max(int(math.sqrt(memory_mb * 2**20 / bytes_per_pair)), 1)
+    if num_embeddings <= max_chunk:
+        return max_chunk, max_chunk_cluster_count
+
+    num_chunks = math.ceil(num_embeddings / max_chunk)
+    embeddings_per_chunk = math.ceil(num_embeddings / num_chunks)
+    chunk_cluster_count = min(max_chunk_cluster_count, max_chunk // num_chunks)
+    if chunk_cluster_count <= max_num_speakers:
+        logger.warning(
+            f"A clustering memory budget of {memory_mb}MB is too small for "
+            f"{num_embeddings} segments and {max_num_speakers} speakers, "
+            "clustering may use more memory than that."
+        )
+        chunk_cluster_count = max_num_speakers + 1
+    return embeddings_per_chunk, chunk_cluster_count
+
+
+def _get_rss_bytes() -> Optional[int]:
+    # the resident pages are the second field, /proc is only there on Linux
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class _PeakRSSSampler:
+    """
+    Sample the resident set size of the process every ``interval`` seconds
+    from a background thread while the ``with`` block runs, and keep the
+    highest value in ``peak_mb``.
+
+    ``ru_maxrss`` is the peak over the whole lifetime of the process, so it
+    can't tell one call from another. Spikes shorter than ``interval`` may be
+    missed. ``peak_mb`` stays None where RSS can't be read.
+    """
+
+    def __init__(self, interval: float = 0.05):
+        self.interval = interval
+        self.peak_mb = None
+        self._peak = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sample(self):
+        rss = _get_rss_bytes()
+        if rss is not None:
+            self._peak = rss if self._peak is None else max(self._peak, rss)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def __enter__(self):
+        self._sample()
+        if self._peak is not None:
+            self._thread = threading.Thread(
+                target=self._run, name="rss-sampler", daemon=True
             )
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self._sample()
+        if self._peak is not None:
+            self.peak_mb = self._peak / 2**20
+        return False
+
+
+def _get_tmpfs_dir() -> Optional[str]:
+    # NeMo only reads audio from files, so keep them in memory where possible
+    if os.path.isdir("/dev/shm") and os.access("/dev/shm", os.W_OK):
+        return "/dev/shm"
+    return None
+
 
-            manifest_path = os.path.join(temp_path, "manifest.json")
-            meta = {
-                "audio_filepath": os.path.join(temp_path, "mono_file.wav"),
-                "offset": 0,
-                "duration": None,
-                "label": "infer",
-                "text": "-",
-                "rttm_filepath": None,
-                "uem_filepath": None,
-            }
-
-            with open(manifest_path, "w") as f:
-                json.dump(meta, f)
-
-            self.model._initialize_configs(
-                manifest_path=manifest_path,
-                max_speakers=8,
-                num_speakers=None,
-                tmpdir=temp_path,
-                batch_size=24,
-                num_workers=0,
-                verbose=True,
+class MSDDDiarizer(Diarizer):
+    """
+    NeMo's ``NeuralDiarizer`` with a workspace that is kept for its lifetime.
+
+    Every call runs ``NeuralDiarizer.diarize`` as is. NeMo reads audio
+    through manifests and writes its results as RTTM files, so the waveforms,
+    the manifest and the outputs go into a directory that is created once
+    (on ``/dev/shm`` when it is available) and cleared between calls, and the
+    configs are only initialized again when the number of speakers changes.
+    The time spent in each stage of the last call is kept in
+    ``last_timings``.
+
+    The multiscale speaker embeddings of the last ``cache_size`` recordings
+    are kept in memory by the hash of their audio, and in ``cache_dir`` as
+    well when it is given. ``rediarize`` uses them to diarize the same audio
+    again with another number of speakers or threshold, rerunning only
+    clustering and MSDD.
+
+    ``profile`` picks one of ``PROFILES``, from ``"fast"`` to ``"accurate"``.
+    Long recordings are clustered in chunks sized to fit
+    ``clustering_memory_mb``, see ``get_clustering_chunking``. The peak
+    memory of the last call is kept in ``last_memory``, and the embedding of
+    every speaker found, to match them with a ``SpeakerIndex``, in
+    ``last_speaker_embeddings``.
+    """
+
+    embedding_model = "titanet_large"
+
+    def __init__(
+        self,
+        device: Union[str, torch.device],
+        workspace: Optional[str] = None,
+        profile: str = DEFAULT_PROFILE,
+        cache_dir: Optional[str] = None,
+        cache_size: int = 8,
+        clustering_memory_mb: float = DEFAULT_CLUSTERING_MEMORY_MB,
+    ):
+        super().__init__(device)
+        self.profile = profile
+        self.model: NeuralDiarizer = NeuralDiarizer(cfg=create_config(profile)).to(
+            device
+        )
+
+        if workspace is None:
+            self.workspace = tempfile.mkdtemp(prefix="msdd_", dir=_get_tmpfs_dir())
+            self._finalizer = weakref.finalize(
+                self, shutil.rmtree, self.workspace, ignore_errors=True
             )
-            self.model.clustering_embedding.clus_diar_model._diarizer_params.out_dir = (
-                temp_path
+        else:
+            self.workspace = workspace
+            os.makedirs(self.workspace, exist_ok=True)
+            self._finalizer = None
+
+        self.manifest_path = os.path.join(self.workspace, "manifest.json")
+        self.last_timings = {}
+        self.last_memory = {}
+        self.clustering_memory_mb = clustering_memory_mb
+        self._max_chunk_cluster_count = (
+            self.model._cfg.diarizer.clustering.parameters.chunk_cluster_count
+        )
+
+        self.cache_dir = cache_dir
+        if self.cache_dir is not None:
+            os.makedirs(self.cache_dir, exist_ok=True)
+        self.cache_size = cache_size
+        self._embeddings_cache = OrderedDict()
+        # embeddings only depend on the VAD, the scales and the speaker model
+        diarizer_cfg = self.model._cfg.diarizer
+        self._cache_settings = json.dumps(
+            OmegaConf.to_container(
+                OmegaConf.create(
+                    {
+                        "vad": diarizer_cfg.vad,
+                        "speaker_embeddings": diarizer_cfg.speaker_embeddings,
+                    }
+                ),
+                resolve=True,
+            ),
+            sort_keys=True,
+        ).encode()
+
+        self._speakers = None
+        self._configure(num_speakers=None, max_speakers=8)
+
+    def _configure(self, num_speakers: Optional[int], max_speakers: int):
+        if self._speakers == (num_speakers, max_speakers):
+            return
+        self.model._initialize_configs(
+            manifest_path=self.manifest_path,
+            max_speakers=max_speakers,
+            num_speakers=num_speakers,
+            tmpdir=self.workspace,
+            batch_size=24,
+            num_workers=0,
+            verbose=True,
+        )
+        diarizer_params = (
+            self.model.clustering_embedding.clus_diar_model._diarizer_params
+        )
+        diarizer_params.out_dir = self.workspace
+        diarizer_params.manifest_filepath = self.manifest_path
+        self.model.msdd_model.cfg.test_ds.manifest_filepath = self.manifest_path
+        self._speakers = (num_speakers, max_speakers)
+
+    def diarize(
+        self,
+        audio: torch.Tensor,
+        num_speakers: Optional[int] = None,
+        max_speakers: int = 8,
+        threshold: Optional[float] = None,
+    ):
+        return self.diarize_many([audio], num_speakers, max_speakers, threshold)[0]
+
+    def diarize_many(
+        self,
+        audios: List[torch.Tensor],
+        num_speakers: Optional[int] = None,
+        max_speakers: int = 8,
+        threshold: Optional[float] = None,
+    ):
+        """
+        Diarize several recordings at once and return the labels of each.
+
+        All of them go into a single manifest, so VAD, embedding extraction
+        and MSDD inference run over full batches instead of one short file
+        at a time. That pays off on a GPU, on a single CPU core it is about
+        a tenth slower than diarizing them one by one, see
+        ``benchmark_msdd.py``.
+        Speakers are clustered separately for every recording,
+        into exactly ``num_speakers`` if it's given or at most
+        ``max_speakers`` otherwise. ``threshold`` overrides the MSDD sigmoid
+        threshold of the config.
+        """
+        if not audios:
+            return []
+
+        with self._track_memory():
+            start = time.perf_counter()
+            uniq_ids = self._prepare(audios, num_speakers, max_speakers)
+            # the base scale is the last one and has the most segments
+            base_shift = self.model._cfg.diarizer.speaker_embeddings.parameters[
+                "shift_length_in_sec"
+            ][-1]
+            self._set_clustering_chunking(
+                math.ceil(max(audio.shape[-1] for audio in audios) / 16000 / base_shift)
             )
-            self.model.clustering_embedding.clus_diar_model._diarizer_params.manifest_filepath = (
-                manifest_path
+            prepared = time.perf_counter()
+
+            with self._sigmoid_threshold(threshold):
+                self.model.diarize()
+            diarized = time.perf_counter()
+
+            # NeMo keeps [embeddings, timestamps] by uniq_id for every scale
+            clus_diar_model = self.model.clustering_embedding.clus_diar_model
+            scales = list(clus_diar_model.multiscale_embeddings_and_timestamps.values())
+            for audio, uniq_id in zip(audios, uniq_ids):
+                self._store_embeddings(
+                    self._get_cache_key(audio),
+                    {
+                        "embeddings": [embeddings[uniq_id] for embeddings, _ in scales],
+                        "timestamps": [timestamps[uniq_id] for _, timestamps in scales],
+                    },
+                )
+            labels = self._read_labels(uniq_ids)
+            end = time.perf_counter()
+
+        self.last_timings = {
+            "prepare": prepared - start,
+            "diarize": diarized - prepared,
+            "labels": end - diarized,
+            "total": end - start,
+        }
+        self._log_run(audios)
+        return labels
+
+    def rediarize(
+        self,
+        audio: torch.Tensor,
+        num_speakers: Optional[int] = None,
+        max_speakers: int = 8,
+        threshold: Optional[float] = None,
+    ):
+        """
+        Diarize audio that was diarized before with another number of speakers
+        or MSDD threshold, reusing its cached embeddings.
+
+        VAD and embedding extraction are skipped, the rest of
+        ``NeuralDiarizer.diarize`` runs on the cached embeddings the way
+        ``ClusterEmbedding.run_clustering_diarizer`` would after extracting
+        them.
+        """
+        entry = self._get_cached_embeddings(self._get_cache_key(audio))
+        if entry is None:
+            raise LookupError(
+                "No cached embeddings for this audio, it has to be diarized first"
             )
-            self.model.msdd_model.cfg.test_ds.manifest_filepath = manifest_path
-            self.model.diarize()
 
-            pred_labels_clus = rttm_to_labels(
-                os.path.join(temp_path, "pred_rttms", "mono_file.rttm")
+        with self._track_memory():
+            start = time.perf_counter()
+            (uniq_id,) = self._prepare([audio], num_speakers, max_speakers)
+            self._set_clustering_chunking(entry["embeddings"][-1].shape[0])
+            prepared = time.perf_counter()
+
+            self._cluster(uniq_id, entry)
+            clustered = time.perf_counter()
+
+            model = self.model
+            model.msdd_model.pairwise_infer = True
+            model.get_emb_clus_infer(model.clustering_embedding)
+            preds_list, _, _ = model.run_pairwise_diarization()
+            # like NeuralDiarizer.diarize, the RTTM of the last threshold is kept
+            with self._sigmoid_threshold(threshold):
+                msdd_params = model._cfg.diarizer.msdd_model.parameters
+                for sigmoid_threshold in list(msdd_params.sigmoid_threshold):
+                    model.run_overlap_aware_eval(preds_list, sigmoid_threshold)
+            inferred = time.perf_counter()
+
+            labels = self._read_labels([uniq_id])[0]
+            end = time.perf_counter()
+
+        self.last_timings = {
+            "prepare": prepared - start,
+            "clustering": clustered - prepared,
+            "msdd": inferred - clustered,
+            "labels": end - inferred,
+            "total": end - start,
+        }
+        self._log_run([audio], cached=1)
+        return labels
+
+    def _prepare(
+        self,
+        audios: List[torch.Tensor],
+        num_speakers: Optional[int],
+        max_speakers: int,
+    ):
+        """
+        Write the audio and a manifest listing it into the cleared workspace,
+        and return the uniq_id NeMo gives every recording.
+        """
+        self._clear_workspace()
+        self._configure(num_speakers, max_speakers)
+
+        uniq_ids = []
+        with open(self.manifest_path, "w") as f:
+            for i, audio in enumerate(audios):
+                # NeMo identifies each recording by its file name
+                uniq_ids.append(f"mono_file_{i}")
+                audio_path = os.path.join(self.workspace, f"{uniq_ids[-1]}.wav")
+                # float WAV like torchaudio.save wrote, which now needs TorchCodec
+                soundfile.write(
+                    audio_path, audio.squeeze(0).cpu().numpy(), 16000, subtype="FLOAT"
+                )
+
+                meta = {
+                    "audio_filepath": audio_path,
+                    "offset": 0,
+                    "duration": None,
+                    "label": "infer",
+                    "text": "-",
+                    "num_speakers": num_speakers,
+                    "rttm_filepath": None,
+                    "uem_filepath": None,
+                }
+                f.write(json.dumps(meta) + "\n")
+        return uniq_ids
+
+    def _set_clustering_chunking(self, num_embeddings: int):
+        # NeMo clusters with these parameters of the config on every call
+        cluster_params = self.model._cfg.diarizer.clustering.parameters
+        (
+            cluster_params.embeddings_per_chunk,
+            cluster_params.chunk_cluster_count,
+        ) = get_clustering_chunking(
+            num_embeddings,
+            self.clustering_memory_mb,
+            num_scales=len(
+                self.model._cfg.diarizer.speaker_embeddings.parameters.window_length_in_sec
+            ),
+            max_num_speakers=cluster_params.max_num_speakers,
+            max_chunk_cluster_count=self._max_chunk_cluster_count,
+        )
+        logger.info(
+            f"Clustering up to {num_embeddings} segments per recording with "
+            f"embeddings_per_chunk={cluster_params.embeddings_per_chunk}, "
+            f"chunk_cluster_count={cluster_params.chunk_cluster_count} "
+            f"for a budget of {self.clustering_memory_mb}MB"
+        )
+
+    @contextmanager
+    def _sigmoid_threshold(self, threshold: Optional[float]):
+        """
+        Render the MSDD labels at ``threshold`` instead of the config's
+        thresholds while the block runs.
+        """
+        msdd_params = self.model._cfg.diarizer.msdd_model.parameters
+        thresholds = msdd_params.sigmoid_threshold
+        if threshold is not None:
+            msdd_params.sigmoid_threshold = [threshold]
+        try:
+            yield
+        finally:
+            msdd_params.sigmoid_threshold = thresholds
+
+    def _cluster(self, uniq_id: str, entry: dict):
+        """
+        Cluster cached embeddings and prepare the inputs of MSDD, like
+        ``ClusterEmbedding.run_clustering_diarizer`` does once the clustering
+        diarizer extracted them.
+        """
+        cluster_embedding = self.model.clustering_embedding
+        clus_diar_model = cluster_embedding.clus_diar_model
+        cluster_params = self.model._cfg.diarizer.clustering.parameters
+
+        scales = range(len(entry["embeddings"]))
+        clus_diar_model.multiscale_embeddings_and_timestamps = {
+            scale_idx: [
+                {uniq_id: entry["embeddings"][scale_idx]},
+                {uniq_id: entry["timestamps"][scale_idx]},
+            ]
+            for scale_idx in scales
+        }
+        embs_and_timestamps = get_embs_and_timestamps(
+            clus_diar_model.multiscale_embeddings_and_timestamps,
+            clus_diar_model.multiscale_args_dict,
+        )
+
+        # the cluster labels are written to out_rttm_dir/../speaker_outputs
+        cluster_embedding.out_rttm_dir = os.path.join(self.workspace, "pred_rttms")
+        os.makedirs(cluster_embedding.out_rttm_dir, exist_ok=True)
+        os.makedirs(os.path.join(self.workspace, "speaker_outputs"), exist_ok=True)
+        perform_clustering(
+            embs_and_timestamps=embs_and_timestamps,
+            AUDIO_RTTM_MAP=audio_rttm_map(self.manifest_path),
+            out_rttm_dir=cluster_embedding.out_rttm_dir,
+            clustering_params=cluster_params,
+            device=self.model.msdd_model.device,
+            verbose=self.model._cfg.verbose,
+        )
+
+        cluster_embedding.max_num_speakers = cluster_params.max_num_speakers
+        session_scale_mapping_dict = cluster_embedding.get_scale_map(
+            embs_and_timestamps
+        )
+        emb_scale_seq_dict = {
+            scale_idx: {uniq_id: entry["embeddings"][scale_idx]} for scale_idx in scales
+        }
+        clus_labels = cluster_embedding.load_clustering_labels(self.workspace)
+        emb_sess_avg_dict, base_clus_label_dict = (
+            cluster_embedding.get_cluster_avg_embs(
+                emb_scale_seq_dict, clus_labels, None, session_scale_mapping_dict
             )
+        )
+        emb_scale_seq_dict["session_scale_mapping"] = session_scale_mapping_dict
 
-            labels = []
-            for label in pred_labels_clus:
-                start, end, speaker = label.split()
-                start, end = float(start), float(end)
-                start, end = int(start * 1000), int(end * 1000)
-                labels.append((start, end, int(speaker.split("_")[1])))
+        cluster_embedding.emb_sess_test_dict = emb_sess_avg_dict
+        cluster_embedding.emb_seq_test = emb_scale_seq_dict
+        cluster_embedding.clus_test_label_dict = base_clus_label_dict
 
-            labels = sorted(labels, key=lambda x: x[0])
+    def _read_labels(self, uniq_ids: List[str]):
+        """
+        Read the RTTM NeMo wrote for every recording, and the embeddings of
+        the speakers found in it.
+        """
+        labels = []
+        for uniq_id in uniq_ids:
+            turns = []
+            for label in rttm_to_labels(
+                os.path.join(self.workspace, "pred_rttms", f"{uniq_id}.rttm")
+            ):
+                start, end, speaker = label.split()
+                start, end = int(float(start) * 1000), int(float(end) * 1000)
+                turns.append((start, end, int(speaker.split("_")[1])))
+            labels.append(sorted(turns, key=lambda x: x[0]))
 
+        self.last_speaker_embeddings = [
+            self._get_speaker_embeddings(uniq_id) for uniq_id in uniq_ids
+        ]
         return labels
 
+    @contextmanager
+    def _track_memory(self):
+        """
+        Keep the peak memory of the block in ``last_memory``.
+        """
+        device = self.model.msdd_model.device
+        if device.type == "cuda":
+            torch.cuda.reset_peak_memory_stats(device)
+        with _PeakRSSSampler() as sampler:
+            yield
+        self.last_memory = {"peak_rss_mb": sampler.peak_mb}
+        if device.type == "cuda":
+            self.last_memory["peak_cuda_mb"] = (
+                torch.cuda.max_memory_allocated(device) / 2**20
+            )
+
+    def _log_run(self, audios: List[torch.Tensor], cached: int = 0):
+        duration = sum(audio.shape[-1] for audio in audios) / 16000
+        logger.info(
+            f"MSDD diarization of {len(audios)} file(s), {duration:.1f}s of audio, "
+            f"{cached} with cached embeddings, took "
+            + ", ".join(f"{k} {v:.2f}s" for k, v in self.last_timings.items())
+        )
+        logger.info(
+            "MSDD peak memory: "
+            + ", ".join(
+                f"{k} {v:.0f}" for k, v in self.last_memory.items() if v is not None
+            )
+        )
+
+    def _get_speaker_embeddings(self, uniq_id: str):
+        """
+        Return the cluster-average TitaNet embedding of every speaker found
+        in a recording, from the scale with the longest windows.
+        """
+        cluster_embedding = self.model.clustering_embedding
+        avg_embs = cluster_embedding.emb_sess_test_dict[0][uniq_id]["avg_embs"]
+        speakers = {
+            int(label[-1]) for label in cluster_embedding.clus_test_label_dict[uniq_id]
+        }
+        return {
+            speaker: avg_embs[:, speaker].cpu().numpy() for speaker in sorted(speakers)
+        }
+
+    def _get_cache_key(self, audio: torch.Tensor) -> str:
+        digest = hashlib.sha256(audio.detach().cpu().contiguous().numpy().tobytes())
+        digest.update(self._cache_settings)
+        return digest.hexdigest()
+
+    def _get_cached_embeddings(self, key: str):
+        if key in self._embeddings_cache:
+            self._embeddings_cache.move_to_end(key)
+            return self._embeddings_cache[key]
+
+        if self.cache_dir is not None:
+            path = os.path.join(self.cache_dir, f"{key}.pt")
+            if os.path.exists(path):
+                try:
+                    entry = torch.load(path, map_location="cpu")
+                except Exception as e:
+                    logger.warning(f"Ignoring unreadable embedding cache {path}: {e}")
+                else:
+                    self._remember_embeddings(key, entry)
+                    return entry
+        return None
+
+    def _store_embeddings(self, key: str, entry: dict):
+        self._remember_embeddings(key, entry)
+        if self.cache_dir is None:
+            return
+
+        path = os.path.join(self.cache_dir, f"{key}.pt")
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            torch.save(entry, tmp_path)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Could not write embedding cache {path}: {e}")
+
+    def _remember_embeddings(self, key: str, entry: dict):
+        self._embeddings_cache[key] = entry
+        self._embeddings_cache.move_to_end(key)
+        while len(self._embeddings_cache) > self.cache_size:
+            self._embeddings_cache.popitem(last=False)
+
+    def _clear_workspace(self):
+        for name in os.listdir(self.workspace):
+            path = os.path.join(self.workspace, name)
+            if os.path.isdir(path) and not os.path.islink(path):
+                shutil.rmtree(path)
+            else:
+                os.remove(path)
+
+    def close(self):
+        """
+        Remove the workspace if it was created by this instance.
+        """
+        if self._finalizer is not None:
+            self._finalizer()
+
+
+def create_config(profile: str = DEFAULT_PROFILE):
+    if profile not in PROFILES:
+        raise ValueError(
+            f"Unknown diarization profile {profile!r}, "
+            f"choose one of {', '.join(PROFILES)}"
+        )
 
-def create_config():
     config = OmegaConf.load(
         os.path.join(os.path.dirname(__file__), "diar_infer_telephonic.yaml")
     )
@@ -97,4 +679,14 @@ def create_config():
         "diar_msdd_telephonic"  # Telephonic speaker diarization model
     )
 
+    settings = PROFILES[profile]
+    embedding_params = config.diarizer.speaker_embeddings.parameters
+    embedding_params.window_length_in_sec = settings["window_length_in_sec"]
+    embedding_params.shift_length_in_sec = settings["shift_length_in_sec"]
+    embedding_params.multiscale_weights = settings["multiscale_weights"]
+    msdd_params = config.diarizer.msdd_model.parameters
+    msdd_params.infer_batch_size = settings["infer_batch_size"]
+    msdd_params.diar_window_length = settings["diar_window_length"]
+    msdd_params.overlap_infer_spk_limit = settings["overlap_infer_spk_limit"]
+
     return config
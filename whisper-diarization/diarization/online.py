@@ -0,0 +1,328 @@
+from typing import Dict, List, Optional, Tuple, Union
+
+import numpy as np
+import torch
+
+from .base import Diarizer, SpeakerTurns
+from .clustering import spectral_cluster
+from .lite.lite import SAMPLE_RATE, LiteDiarizer, detect_speech
+
+
+def _normalize(embeddings: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(embeddings, axis=-1, keepdims=True)
+    return embeddings / np.maximum(norms, 1e-12)
+
+
+class OnlineDiarizer(Diarizer):
+    """
+    Diarizes a live stream chunk by chunk, in constant time per chunk.
+
+    Every chunk of speech passed to ``add_chunk`` is split into windows and
+    embedded like in ``LiteDiarizer``, and each window goes to the speaker
+    with the closest running centroid, or to a new speaker when none is
+    ``threshold`` similar. Windows of the last ``revision_sec`` seconds stay
+    open and are relabeled against the updated centroids after every chunk,
+    older ones are final and never change, so labels are revised with a
+    bounded latency.
+
+    Every ``recluster_every`` chunks, a reservoir of at most
+    ``reservoir_size`` embeddings sampled over the whole session is
+    clustered again with ``spectral_cluster``, which merges speakers that
+    were split early on and splits ones that were merged. Speakers keep the
+    id of the old speaker most of their embeddings had, and speakers merged
+    away are dropped, so there are never more than ``max_speakers``
+    centroids. The reservoir and the number of open windows are bounded as
+    well, so a chunk costs the same after two hours as after two minutes.
+
+    Sessions can share the model of one ``LiteDiarizer`` through
+    ``embedder``.
+    """
+
+    embedding_model = LiteDiarizer.embedding_model
+
+    def __init__(
+        self,
+        device: Union[str, torch.device] = "cpu",
+        threshold: float = 0.5,
+        max_speakers: int = 8,
+        revision_sec: float = 10.0,
+        recluster_every: int = 30,
+        reservoir_size: int = 500,
+        chunk_sec: float = 2.0,
+        seed: int = 0,
+        embedder: Optional[LiteDiarizer] = None,
+    ):
+        super().__init__(device)
+        self.embedder = embedder or LiteDiarizer(device)
+        self.threshold = threshold
+        self.max_speakers = max_speakers
+        self.revision_ms = int(revision_sec * 1000)
+        self.recluster_every = recluster_every
+        self.reservoir_size = reservoir_size
+        self.chunk_sec = chunk_sec
+        self.seed = seed
+        self.reset()
+
+    def reset(self):
+        """
+        Forget every speaker, to start a new session.
+        """
+        # the centroid sums, window counts and ids of the current speakers
+        self._sums = np.zeros((0, 0), dtype=np.float32)
+        self._counts = np.zeros(0, dtype=np.int64)
+        self._speaker_ids = np.zeros(0, dtype=np.int64)
+        self._next_speaker = 0
+        # [start_ms, end_ms, speaker] of the windows that can still change
+        self._open: List[list] = []
+        self._open_embeddings = np.zeros((0, 0), dtype=np.float32)
+        self._reservoir = np.zeros((0, 0), dtype=np.float32)
+        self._reservoir_speakers = np.zeros(0, dtype=np.int64)
+        self._seen = 0
+        self._chunks = 0
+        self._num_speakers = None
+        self._rng = np.random.default_rng(self.seed)
+        self.turns: SpeakerTurns = []
+        self.last_speaker_embeddings = [{}]
+
+    def add_chunk(
+        self, audio: Union[np.ndarray, torch.Tensor], start_sec: float
+    ) -> Tuple[SpeakerTurns, SpeakerTurns]:
+        """
+        Diarize the next chunk of 16 kHz audio, which starts ``start_sec``
+        seconds into the stream.
+
+        Returns the turns that became final with this chunk and the open
+        turns of the last ``revision_sec`` seconds, which later chunks may
+        still relabel.
+        """
+        if isinstance(audio, torch.Tensor):
+            audio = audio.detach().cpu().numpy()
+        audio = np.asarray(audio, dtype=np.float32).reshape(-1)
+        offset_ms = int(start_sec * 1000)
+
+        windows = self.embedder.get_windows(detect_speech(audio))
+        if windows:
+            embeddings = _normalize(self.embedder.embed(audio, windows))
+            # every window on its own, the span it owns between its neighbours
+            spans = LiteDiarizer.get_turns(windows, np.arange(len(windows)))
+            for (start_ms, end_ms, _), embedding in zip(spans, embeddings):
+                speaker = self._assign(embedding)
+                self._open.append([offset_ms + start_ms, offset_ms + end_ms, speaker])
+                self._sample(embedding, speaker)
+            self._open_embeddings = (
+                np.concatenate([self._open_embeddings, embeddings])
+                if len(self._open_embeddings)
+                else embeddings
+            )
+
+        self._chunks += 1
+        if self._chunks % self.recluster_every == 0:
+            self._recluster()
+        self._revise()
+
+        end_ms = offset_ms + len(audio) * 1000 // SAMPLE_RATE
+        final = self._finalize(end_ms - self.revision_ms)
+        self.last_speaker_embeddings = [self._get_speaker_embeddings()]
+        return final, self._merge(self._open)
+
+    def speaker_at(self, time_ms: int) -> Optional[int]:
+        """
+        Return the current speaker at ``time_ms``, recent times are the
+        cheapest to look up.
+        """
+        for turns in (self._merge(self._open), self.turns):
+            for start, end, speaker in reversed(turns):
+                if start <= time_ms < end:
+                    return speaker
+                if end <= time_ms:
+                    return None
+        return None
+
+    def finish(self) -> SpeakerTurns:
+        """
+        Make every open turn final, at the end of the stream.
+        """
+        self._revise()
+        return self._finalize(None)
+
+    def diarize(
+        self,
+        audio: torch.Tensor,
+        num_speakers: Optional[int] = None,
+        max_speakers: int = 8,
+    ) -> SpeakerTurns:
+        """
+        Diarize a whole recording as a stream of ``chunk_sec`` chunks.
+        """
+        self.reset()
+        self._num_speakers = num_speakers
+        max_speakers, self.max_speakers = (
+            self.max_speakers,
+            num_speakers or max_speakers,
+        )
+        try:
+            audio = audio.detach().cpu().reshape(-1).numpy()
+            chunk = int(self.chunk_sec * SAMPLE_RATE)
+            for start in range(0, len(audio), chunk):
+                self.add_chunk(audio[start : start + chunk], start / SAMPLE_RATE)
+            self.finish()
+        finally:
+            self.max_speakers = max_speakers
+        return self.turns
+
+    def _similarities(self, embeddings: np.ndarray) -> np.ndarray:
+        return embeddings @ _normalize(self._sums).T
+
+    def _assign(self, embedding: np.ndarray) -> int:
+        if len(self._counts):
+            similarities = self._similarities(embedding)
+            row = int(similarities.argmax())
+            if (
+                similarities[row] >= self.threshold
+                or len(self._counts) >= self.max_speakers
+            ):
+                self._sums[row] += embedding
+                self._counts[row] += 1
+                return int(self._speaker_ids[row])
+
+        speaker = self._new_speaker()
+        if len(self._counts):
+            self._sums = np.vstack([self._sums, embedding])
+        else:
+            self._sums = embedding[None].copy()
+        self._counts = np.append(self._counts, 1)
+        self._speaker_ids = np.append(self._speaker_ids, speaker)
+        return speaker
+
+    def _new_speaker(self) -> int:
+        speaker, self._next_speaker = self._next_speaker, self._next_speaker + 1
+        return speaker
+
+    def _sample(self, embedding: np.ndarray, speaker: int):
+        """
+        Keep a uniform sample of all the embeddings of the session.
+        """
+        self._seen += 1
+        if self._seen <= self.reservoir_size:
+            self._reservoir = (
+                np.vstack([self._reservoir, embedding])
+                if len(self._reservoir)
+                else embedding[None].copy()
+            )
+            self._reservoir_speakers = np.append(self._reservoir_speakers, speaker)
+            return
+
+        row = self._rng.integers(self._seen)
+        if row < self.reservoir_size:
+            self._reservoir[row] = embedding
+            self._reservoir_speakers[row] = speaker
+
+    def _recluster(self):
+        if len(self._reservoir) < 2:
+            return
+
+        labels = spectral_cluster(
+            self._reservoir, self._num_speakers, self.max_speakers
+        )
+        sizes = np.bincount(labels)
+        # bigger clusters pick their speaker first, every cluster is a row
+        clusters = [label for label in np.argsort(-sizes) if sizes[label]]
+        sums = np.zeros((len(clusters), self._reservoir.shape[1]), dtype=np.float32)
+        counts = np.zeros(len(clusters), dtype=np.int64)
+        speaker_ids = np.zeros(len(clusters), dtype=np.int64)
+        speakers = np.empty_like(self._reservoir_speakers)
+        taken = set()
+        for row, label in enumerate(clusters):
+            members = labels == label
+            previous, votes = np.unique(
+                self._reservoir_speakers[members], return_counts=True
+            )
+            speaker = int(previous[votes.argmax()])
+            if speaker in taken:
+                speaker = self._new_speaker()
+            taken.add(speaker)
+            speakers[members] = speaker
+            speaker_ids[row] = speaker
+            # the reservoir stands for every embedding seen so far
+            counts[row] = max(
+                round(members.sum() * self._seen / len(self._reservoir)), 1
+            )
+            sums[row] = self._reservoir[members].mean(axis=0) * counts[row]
+        # speakers no cluster kept are gone, along with their rows
+        self._sums, self._counts, self._speaker_ids = sums, counts, speaker_ids
+        self._reservoir_speakers = speakers
+
+    def _revise(self):
+        if not self._open:
+            return
+        rows = self._similarities(self._open_embeddings).argmax(axis=1)
+        speakers = self._speaker_ids[rows]
+        row_of = {
+            speaker: row for row, speaker in enumerate(self._speaker_ids.tolist())
+        }
+
+        # relabeled windows take their embedding along to their new centroid,
+        # unless their old speaker was merged away by reclustering
+        moved, old_rows = [], []
+        for i, (window, speaker) in enumerate(zip(self._open, speakers.tolist())):
+            if window[2] == speaker:
+                continue
+            if window[2] in row_of:
+                moved.append(i)
+                old_rows.append(row_of[window[2]])
+            window[2] = speaker
+        if not moved:
+            return
+        np.subtract.at(self._sums, old_rows, self._open_embeddings[moved])
+        np.subtract.at(self._counts, old_rows, 1)
+        np.add.at(self._sums, rows[moved], self._open_embeddings[moved])
+        np.add.at(self._counts, rows[moved], 1)
+
+        # speakers all of whose windows moved away are gone
+        alive = self._counts > 0
+        if not alive.all():
+            self._sums = self._sums[alive]
+            self._counts = self._counts[alive]
+            self._speaker_ids = self._speaker_ids[alive]
+
+    def _finalize(self, before_ms: Optional[int]) -> SpeakerTurns:
+        """
+        Make the open windows that end before ``before_ms`` final, or all of
+        them, and return the turns they add.
+        """
+        count = len(self._open)
+        if before_ms is not None:
+            count = next(
+                (i for i, window in enumerate(self._open) if window[1] > before_ms),
+                count,
+            )
+        final = self._merge(self._open[:count])
+        self._open = self._open[count:]
+        self._open_embeddings = self._open_embeddings[count:]
+
+        if final and self.turns:
+            last = self.turns[-1]
+            if last[2] == final[0][2] and last[1] >= final[0][0]:
+                self.turns[-1] = (last[0], final[0][1], last[2])
+                final[0] = self.turns[-1]
+                self.turns.extend(final[1:])
+                return final
+        self.turns.extend(final)
+        return final
+
+    @staticmethod
+    def _merge(windows) -> SpeakerTurns:
+        turns = []
+        for start, end, speaker in windows:
+            if turns and turns[-1][2] == speaker and turns[-1][1] >= start:
+                turns[-1] = (turns[-1][0], end, speaker)
+            else:
+                turns.append((start, end, speaker))
+        return turns
+
+    def _get_speaker_embeddings(self) -> Dict[int, np.ndarray]:
+        centroids = _normalize(self._sums)
+        return {
+            speaker: centroids[row]
+            for row, speaker in enumerate(self._speaker_ids.tolist())
+        }
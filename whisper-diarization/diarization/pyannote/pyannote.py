@@ -0,0 +1,73 @@
+import os
+
+from typing import Optional, Union
+
+import numpy as np
+import torch
+
+from ..base import Diarizer, SpeakerTurns
+
+PIPELINE = "pyannote/speaker-diarization-3.1"
+
+
+class PyannoteDiarizer(Diarizer):
+    """
+    The pyannote speaker diarization pipeline.
+
+    The pipeline is gated on Hugging Face, so it needs a token of an account
+    that accepted its terms, taken from ``HF_TOKEN`` when ``hf_token`` isn't
+    given.
+    """
+
+    embedding_model = "pyannote/wespeaker-voxceleb-resnet34-LM"
+
+    def __init__(
+        self,
+        device: Union[str, torch.device] = "cpu",
+        hf_token: Optional[str] = None,
+    ):
+        super().__init__(device)
+        from pyannote.audio import Pipeline
+
+        hf_token = hf_token or os.environ.get("HF_TOKEN")
+        if not hf_token:
+            raise ValueError(
+                f"{PIPELINE} needs a Hugging Face token, accept its terms at "
+                f"https://huggingface.co/{PIPELINE} and pass one, "
+                "or use the 'lite' diarizer instead"
+            )
+        self.pipeline = Pipeline.from_pretrained(PIPELINE, token=hf_token)
+        self.pipeline.to(torch.device(device))
+
+    def diarize(
+        self,
+        audio: torch.Tensor,
+        num_speakers: Optional[int] = None,
+        max_speakers: int = 8,
+    ) -> SpeakerTurns:
+        output = self.pipeline(
+            {"waveform": audio.detach().cpu().float(), "sample_rate": 16000},
+            num_speakers=num_speakers,
+            max_speakers=max_speakers,
+            return_embeddings=True,
+        )
+        if isinstance(output, tuple):
+            diarization, embeddings = output
+        else:  # pyannote.audio 4
+            diarization, embeddings = (
+                output.speaker_diarization,
+                output.speaker_embeddings,
+            )
+        # the embeddings are in the order of the sorted labels
+        speakers = {label: i for i, label in enumerate(diarization.labels())}
+        self.last_speaker_embeddings = [
+            {
+                i: np.asarray(embeddings[i], dtype=np.float32)
+                for i in speakers.values()
+                if i < len(embeddings) and not np.isnan(embeddings[i]).any()
+            }
+        ]
+        return sorted(
+            (int(turn.start * 1000), int(turn.end * 1000), speakers[label])
+            for turn, _, label in diarization.itertracks(yield_label=True)
+        )
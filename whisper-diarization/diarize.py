@@ -1,41 +1,29 @@
 import argparse
 import logging
 import os
-import re
-
-import faster_whisper
-import torch
-
-from ctc_forced_aligner import (
-    generate_emissions,
-    get_alignments,
-    get_spans,
-    load_alignment_model,
-    postprocess_results,
-    preprocess_text,
-)
-from deepmultilingualpunctuation import PunctuationModel
 
+from diarization import DIARIZERS
 from helpers import (
+    WordTable,
     cleanup,
+    configure_model_dir,
     find_numeral_symbol_tokens,
     get_realigned_ws_mapping_with_punctuation,
     get_sentences_speaker_mapping,
-    get_speaker_aware_transcript,
     get_words_speaker_mapping,
     langs_to_iso,
+    load_audio,
     process_language_arg,
     punct_model_langs,
     whisper_langs,
-    write_srt,
 )
+from writers import FORMATS, write_transcript
 
 mtypes = {"cpu": "int8", "cuda": "float16"}
 
 pid = os.getpid()
 temp_outputs_dir = f"temp_outputs_{pid}"
 temp_path = os.path.join(os.getcwd(), "temp_outputs")
-os.makedirs(temp_path, exist_ok=True)
 
 # Initialize parser
 parser = argparse.ArgumentParser()
@@ -87,19 +75,122 @@ parser.add_argument(
 parser.add_argument(
     "--device",
     dest="device",
-    default="cuda" if torch.cuda.is_available() else "cpu",
-    help="if you have a GPU use 'cuda', otherwise 'cpu'",
+    default=None,
+    help="if you have a GPU use 'cuda', otherwise 'cpu', defaults to 'cuda' if available",
+)
+
+parser.add_argument(
+    "--spill-emissions",
+    action="store_true",
+    dest="spill_emissions",
+    default=False,
+    help="Memory-maps the alignment emissions to disk instead of keeping them in RAM."
+    "This helps with multi-hour files on machines with limited memory.",
+)
+
+parser.add_argument(
+    "--alignment-workers",
+    type=int,
+    dest="alignment_workers",
+    default=0,
+    help="Number of threads used to align Whisper segments independently, "
+    "set to 0 to align the whole transcript in a single pass",
 )
 
 parser.add_argument(
     "--diarizer",
     default="msdd",
-    choices=["msdd"],
-    help="Choose the diarization model to use",
+    choices=list(DIARIZERS),
+    help="Choose the diarization model to use, 'lite' is a fast CPU diarizer for "
+    "calls with a few speakers and 'pyannote' needs a Hugging Face token",
+)
+
+parser.add_argument(
+    "--hf-token",
+    dest="hf_token",
+    default=os.environ.get("HF_TOKEN"),
+    help="Hugging Face token for the pyannote diarizer, defaults to $HF_TOKEN",
+)
+
+parser.add_argument(
+    "--diarization-profile",
+    dest="diarization_profile",
+    default="balanced",
+    choices=["fast", "balanced", "accurate"],
+    help="Trades MSDD accuracy for speed, 'fast' extracts about half as many "
+    "speaker embeddings as 'balanced' and skips overlapping speech detection, "
+    "'accurate' extracts twice as many",
+)
+
+parser.add_argument(
+    "--speaker-index",
+    dest="speaker_index",
+    default=None,
+    help="Directory of a speaker index, speakers that match an enrolled speaker "
+    "are named after them in the transcript",
+)
+
+parser.add_argument(
+    "--enroll",
+    nargs="+",
+    default=[],
+    metavar="SPEAKER=NAME",
+    help="Enrolls speakers of this recording into the speaker index, "
+    "e.g. '0=Alice' for Speaker 0",
+)
+
+parser.add_argument(
+    "--formats",
+    nargs="+",
+    default=["txt", "srt"],
+    choices=list(FORMATS),
+    help="Output formats to write next to the audio file",
+)
+
+parser.add_argument(
+    "--model-dir",
+    default=None,
+    help="Directory with the models downloaded by prefetch.py, "
+    "defaults to the usual Hugging Face, NeMo and torch caches",
+)
+
+parser.add_argument(
+    "--offline",
+    action="store_true",
+    default=False,
+    help="Only use models that are already downloaded",
 )
 
 args = parser.parse_args()
+logging.basicConfig(level=logging.INFO)
+enrollments = {}
+for enrollment in args.enroll:
+    speaker, _, name = enrollment.partition("=")
+    if not speaker.isdigit() or not name:
+        parser.error(f"--enroll expects SPEAKER=NAME, got {enrollment!r}")
+    enrollments[int(speaker)] = name
+if enrollments and args.speaker_index is None:
+    parser.error("--enroll requires --speaker-index")
 language = process_language_arg(args.language, args.model_name)
+configure_model_dir(args.model_dir, args.offline)
+
+# the heavy dependencies are only imported once the arguments are valid
+import faster_whisper  # noqa: E402
+import torch  # noqa: E402
+
+from ctc_forced_aligner import load_alignment_model  # noqa: E402
+
+from alignment import (  # noqa: E402
+    align_segments,
+    align_transcript,
+    generate_emissions_chunked,
+)
+from punctuation import get_punctuation_service, restore_punctuation  # noqa: E402
+
+if args.device is None:
+    args.device = "cuda" if torch.cuda.is_available() else "cpu"
+
+os.makedirs(temp_path, exist_ok=True)
 
 if args.stemming:
     # Isolate vocals from the rest of the audio
@@ -131,7 +222,7 @@ whisper_model = faster_whisper.WhisperModel(
     args.model_name, device=args.device, compute_type=mtypes[args.device]
 )
 whisper_pipeline = faster_whisper.BatchedInferencePipeline(whisper_model)
-audio_waveform = faster_whisper.decode_audio(vocal_target)
+audio_waveform = load_audio(vocal_target)
 suppress_tokens = (
     find_numeral_symbol_tokens(whisper_model.hf_tokenizer)
     if args.suppress_numerals
@@ -153,6 +244,7 @@ else:
         vad_filter=True,
     )
 
+transcript_segments = list(transcript_segments)
 full_transcript = "".join(segment.text for segment in transcript_segments)
 
 # clear gpu vram
@@ -165,69 +257,64 @@ alignment_model, alignment_tokenizer = load_alignment_model(
     dtype=torch.float16 if args.device == "cuda" else torch.float32,
 )
 
-emissions, stride = generate_emissions(
+emissions, stride = generate_emissions_chunked(
     alignment_model,
-    torch.from_numpy(audio_waveform)
-    .to(alignment_model.dtype)
-    .to(alignment_model.device),
+    audio_waveform,
     batch_size=args.batch_size,
+    spill_dir=temp_path if args.spill_emissions else None,
 )
 
 del alignment_model
 torch.cuda.empty_cache()
 
-tokens_starred, text_starred = preprocess_text(
-    full_transcript,
-    romanize=True,
-    language=langs_to_iso[info.language],
-)
-
-segments, scores, blank_token = get_alignments(
-    emissions,
-    tokens_starred,
-    alignment_tokenizer,
-)
-
-spans = get_spans(tokens_starred, segments, blank_token)
-
-word_timestamps = postprocess_results(text_starred, spans, stride, scores)
+if args.alignment_workers > 0:
+    word_timestamps = align_segments(
+        emissions,
+        stride,
+        transcript_segments,
+        langs_to_iso[info.language],
+        alignment_tokenizer,
+        num_workers=args.alignment_workers,
+    )
+else:
+    word_timestamps = align_transcript(
+        emissions,
+        stride,
+        full_transcript,
+        langs_to_iso[info.language],
+        alignment_tokenizer,
+    )
 
-if args.diarizer == "msdd":
-    from diarization import MSDDDiarizer
+del emissions
 
-    diarizer_model = MSDDDiarizer(device=args.device)
+from diarization import create_diarizer  # noqa: E402
 
+diarizer_model = create_diarizer(
+    args.diarizer,
+    device=args.device,
+    profile=args.diarization_profile,
+    hf_token=args.hf_token,
+)
 speaker_ts = diarizer_model.diarize(torch.from_numpy(audio_waveform).unsqueeze(0))
+speaker_embeddings = diarizer_model.last_speaker_embeddings[0]
+embedding_model = diarizer_model.embedding_model
+diarizer_model.close()
 del diarizer_model
 torch.cuda.empty_cache()
 
-wsm = get_words_speaker_mapping(word_timestamps, speaker_ts, "start")
+wsm = get_words_speaker_mapping(
+    WordTable.from_word_timestamps(word_timestamps), speaker_ts, "start"
+)
 
 if info.language in punct_model_langs:
     # restoring punctuation in the transcript to help realign the sentences
-    punct_model = PunctuationModel(model="kredor/punctuate-all")
+    punct_model = get_punctuation_service("kredor/punctuate-all")
 
-    words_list = list(map(lambda x: x["word"], wsm))
+    words_list = wsm.words
 
-    labled_words = punct_model.predict(words_list, chunk_size=230)
+    labled_words = punct_model.predict(words_list)
 
-    ending_puncts = ".?!"
-    model_puncts = ".,;:!?"
-
-    # We don't want to punctuate U.S.A. with a period. Right?
-    is_acronym = lambda x: re.fullmatch(r"\b(?:[a-zA-Z]\.){2,}", x)
-
-    for word_dict, labeled_tuple in zip(wsm, labled_words):
-        word = word_dict["word"]
-        if (
-            word
-            and labeled_tuple[1] in ending_puncts
-            and (word[-1] not in model_puncts or is_acronym(word))
-        ):
-            word += labeled_tuple[1]
-            if word.endswith(".."):
-                word = word.rstrip(".")
-            word_dict["word"] = word
+    wsm = restore_punctuation(wsm, labled_words)
 
 else:
     logging.warning(
@@ -238,10 +325,23 @@ else:
 wsm = get_realigned_ws_mapping_with_punctuation(wsm)
 ssm = get_sentences_speaker_mapping(wsm, speaker_ts)
 
-with open(f"{os.path.splitext(args.audio)[0]}.txt", "w", encoding="utf-8-sig") as f:
-    get_speaker_aware_transcript(ssm, f)
+if args.speaker_index is not None:
+    from diarization import SpeakerIndex, rename_speakers
+
+    speaker_index = SpeakerIndex(args.speaker_index, model=embedding_model)
+    for speaker, name in enrollments.items():
+        if speaker not in speaker_embeddings:
+            logging.warning(f"Speaker {speaker} wasn't found, not enrolling {name}.")
+            continue
+        speaker_index.enroll(name, speaker_embeddings[speaker])
+    if enrollments:
+        speaker_index.save()
+
+    identities = speaker_index.identify(speaker_embeddings)
+    ssm = rename_speakers(
+        ssm, {f"Speaker {speaker}": name for speaker, name in identities.items()}
+    )
 
-with open(f"{os.path.splitext(args.audio)[0]}.srt", "w", encoding="utf-8-sig") as srt:
-    write_srt(ssm, srt)
+write_transcript(ssm, os.path.splitext(args.audio)[0], args.formats)
 
 cleanup(temp_path)
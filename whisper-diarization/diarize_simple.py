@@ -3,7 +3,7 @@ Simplified diarization script using pyannote.audio
 This script provides speaker diarization without requiring ctc-forced-aligner
 """
 import argparse
-import json
+import logging
 import os
 import sys
 from pathlib import Path
@@ -16,27 +16,18 @@ os.environ['PYTHONWARNINGS'] = 'ignore'
 # Disable CUDA to avoid GPU-related errors on CPU-only systems
 os.environ['CUDA_VISIBLE_DEVICES'] = ''
 
-import torch
-from faster_whisper import WhisperModel
+# torch, faster-whisper and pyannote are imported where they are used,
+# so that --help and argument errors don't wait for them
+from diarization import DIARIZERS  # noqa: E402
+from helpers import configure_model_dir, load_audio  # noqa: E402
+from writers import FORMATS, write_transcript  # noqa: E402
 
-# Import pyannote with error handling
-try:
-    from pyannote.audio import Pipeline
-    PYANNOTE_AVAILABLE = True
-except ImportError:
-    PYANNOTE_AVAILABLE = False
-    print("Warning: pyannote.audio not available. Diarization will be skipped.")
-
-def format_timestamp(seconds):
-    """Convert seconds to SRT timestamp format"""
-    hours = int(seconds // 3600)
-    minutes = int((seconds % 3600) // 60)
-    secs = int(seconds % 60)
-    millis = int((seconds % 1) * 1000)
-    return f"{hours:02d}:{minutes:02d}:{secs:02d},{millis:03d}"
+DEFAULT_FORMATS = ("txt", "srt", "json")
 
 def transcribe_with_whisper(audio_path, model_name="base", device="cpu", language=None):
     """Transcribe audio using faster-whisper"""
+    from faster_whisper import WhisperModel
+    
     print(f"Loading Whisper model: {model_name}")
     
     compute_type = "int8" if device == "cpu" else "float16"
@@ -44,7 +35,7 @@ def transcribe_with_whisper(audio_path, model_name="base", device="cpu", languag
     
     print(f"Transcribing audio: {audio_path}")
     segments, info = model.transcribe(
-        audio_path,
+        load_audio(audio_path),
         language=language,
         beam_size=5,
         word_timestamps=True
@@ -69,60 +60,77 @@ def transcribe_with_whisper(audio_path, model_name="base", device="cpu", languag
     
     return transcription, info
 
-def diarize_audio(audio_path, hf_token=None):
-    """Perform speaker diarization using pyannote.audio"""
-    print("Loading diarization model...")
-    
-    if not PYANNOTE_AVAILABLE:
-        print("Pyannote not available, skipping diarization...")
-        return None
+def diarize_audio(audio_path, diarizer="lite", hf_token=None, profile="balanced"):
+    """
+    Perform speaker diarization with one of the diarization backends
+
+    Returns the speaker segments, the embedding of every speaker and the name
+    of the model they come from, or None and no embeddings if it failed.
+    """
+    print(f"Loading {diarizer} diarization model...")
     
     try:
-        # Force CPU to avoid CUDA issues on systems without GPU
-        import os
-        os.environ['CUDA_VISIBLE_DEVICES'] = ''  # Disable CUDA
-        
-        device = torch.device("cpu")  # Force CPU
-        
-        if hf_token:
-            pipeline = Pipeline.from_pretrained(
-                "pyannote/speaker-diarization-3.1",
-                token=hf_token
-            )
-        else:
-            # Try without token (will fail if model requires authentication)
-            pipeline = Pipeline.from_pretrained(
-                "pyannote/speaker-diarization-3.1"
-            )
+        import torch
+        from diarization import create_diarizer
         
-        # Move to device
-        if pipeline is not None and hasattr(pipeline, 'to'):
-            pipeline.to(device)
+        # Force CPU to avoid CUDA issues on systems without GPU
+        model = create_diarizer(diarizer, device="cpu", hf_token=hf_token, profile=profile)
         
         print(f"Running diarization on: {audio_path}")
-        if pipeline is not None:
-            diarization = pipeline(audio_path)
-        else:
-            raise Exception("Failed to initialize pipeline")
+        audio = torch.from_numpy(load_audio(audio_path)).unsqueeze(0)
+        with model:
+            turns = model.diarize(audio)
         
         # Convert to list of segments
         speaker_segments = []
-        for turn, _, speaker in diarization.itertracks(yield_label=True):
+        for start, end, speaker in turns:
             speaker_segments.append({
-                "start": turn.start,
-                "end": turn.end,
-                "speaker": speaker
+                "start": start / 1000,
+                "end": end / 1000,
+                "speaker": f"SPEAKER_{speaker:02d}"
             })
         
-        return speaker_segments
+        return speaker_segments, model.last_speaker_embeddings[0], model.embedding_model
     
     except Exception as e:
         print(f"Diarization failed: {str(e)}")
-        print("\nNote: pyannote models require a Hugging Face token.")
-        print("Get one at: https://huggingface.co/settings/tokens")
-        print("Then accept the terms at: https://huggingface.co/pyannote/speaker-diarization-3.1")
+        if diarizer == "pyannote":
+            print("\nNote: pyannote models require a Hugging Face token.")
+            print("Get one at: https://huggingface.co/settings/tokens")
+            print("Then accept the terms at: "
+                  "https://huggingface.co/pyannote/speaker-diarization-3.1")
+            print("Or use --diarizer lite, which doesn't need one.")
         print("\nFor now, returning single speaker...")
-        return None
+        return None, {}, None
+
+def identify_speakers(transcription, speaker_embeddings, embedding_model, index_path, enrollments):
+    """Enroll speakers into the speaker index and name the ones it knows"""
+    from diarization import SpeakerIndex, rename_speakers
+    
+    try:
+        speaker_index = SpeakerIndex(index_path, model=embedding_model)
+    except ValueError as e:
+        # e.g. an index of MSDD's TitaNet embeddings used with the lite diarizer
+        print(f"Speaker identification skipped: {e}")
+        return transcription
+    
+    for speaker, name in enrollments.items():
+        if speaker not in speaker_embeddings:
+            print(f"Speaker {speaker} wasn't found, not enrolling {name}")
+            continue
+        speaker_index.enroll(name, speaker_embeddings[speaker])
+        print(f"Enrolled SPEAKER_{speaker:02d} as {name}")
+    if enrollments:
+        speaker_index.save()
+    
+    identities = speaker_index.identify(speaker_embeddings)
+    for speaker, name in identities.items():
+        if name is not None:
+            print(f"Identified SPEAKER_{speaker:02d} as {name}")
+    return rename_speakers(
+        transcription,
+        {f"SPEAKER_{speaker:02d}": name for speaker, name in identities.items()}
+    )
 
 def assign_speakers_to_transcript(transcription, speaker_segments):
     """Assign speakers to transcription segments"""
@@ -147,54 +155,74 @@ def assign_speakers_to_transcript(transcription, speaker_segments):
     
     return transcription
 
-def generate_outputs(transcription, output_dir, audio_name):
-    """Generate output files (TXT, SRT, JSON)"""
+def generate_outputs(transcription, output_dir, audio_name, formats=DEFAULT_FORMATS):
+    """Generate output files in every requested format in a single pass"""
     os.makedirs(output_dir, exist_ok=True)
     
     base_name = Path(audio_name).stem
     
-    # Generate TXT
-    txt_path = os.path.join(output_dir, f"{base_name}.txt")
-    with open(txt_path, "w", encoding="utf-8") as f:
-        current_speaker = None
-        for segment in transcription:
-            if segment["speaker"] != current_speaker:
-                current_speaker = segment["speaker"]
-                f.write(f"\n[{current_speaker}]\n")
-            f.write(segment["text"] + " ")
-    
-    print(f"Saved transcript: {txt_path}")
-    
-    # Generate SRT
-    srt_path = os.path.join(output_dir, f"{base_name}.srt")
-    with open(srt_path, "w", encoding="utf-8", errors="replace") as f:
-        for i, segment in enumerate(transcription, 1):
-            f.write(f"{i}\n")
-            f.write(f"{format_timestamp(segment['start'])} --> {format_timestamp(segment['end'])}\n")
-            f.write(f"[{segment['speaker']}] {segment['text']}\n\n")
-    
-    print(f"Saved SRT: {srt_path}")
-    
-    # Generate JSON
-    json_path = os.path.join(output_dir, f"{base_name}.json")
-    with open(json_path, "w", encoding="utf-8", errors="replace") as f:
-        json.dump(transcription, f, indent=2, ensure_ascii=False)
+    paths = write_transcript(
+        transcription,
+        os.path.join(output_dir, base_name),
+        formats,
+        encoding="utf-8"
+    )
     
-    print(f"Saved JSON: {json_path}")
+    for fmt, path in paths.items():
+        print(f"Saved {fmt.upper()}: {path}")
     
-    return txt_path, srt_path, json_path
+    return paths
 
 def main():
-    parser = argparse.ArgumentParser(description="Simplified audio transcription with speaker diarization")
+    parser = argparse.ArgumentParser(
+        description="Simplified audio transcription with speaker diarization"
+    )
     parser.add_argument("--audio-files", nargs="+", required=True, help="Path to audio file(s)")
-    parser.add_argument("--whisper-model", default="base", help="Whisper model size (tiny/base/small/medium/large)")
+    parser.add_argument("--whisper-model", default="base",
+                        help="Whisper model size (tiny/base/small/medium/large)")
     parser.add_argument("--device", default="cpu", help="Device to use (cpu/cuda)")
     parser.add_argument("--language", default=None, help="Language code (e.g., en, es, fr)")
-    parser.add_argument("--hf-token", default=None, help="Hugging Face token for pyannote models")
+    parser.add_argument("--hf-token", default=os.environ.get("HF_TOKEN"),
+                        help="Hugging Face token for pyannote models")
+    parser.add_argument("--diarizer", default=None, choices=list(DIARIZERS),
+                        help="Diarization model to use, defaults to pyannote with a "
+                        "Hugging Face token and lite without")
+    parser.add_argument("--diarization-profile", default="balanced",
+                        choices=["fast", "balanced", "accurate"],
+                        help="Trades MSDD accuracy for speed")
     parser.add_argument("--output-dir", default="outputs", help="Output directory")
     parser.add_argument("--no-diarization", action="store_true", help="Skip speaker diarization")
+    parser.add_argument("--formats", nargs="+", default=list(DEFAULT_FORMATS),
+                        choices=list(FORMATS),
+                        help="Output formats to write (txt/timestamped/srt/vtt/rttm/json/jsonl)")
+    parser.add_argument("--speaker-index", default=None,
+                        help="Directory of a speaker index, speakers that match an enrolled "
+                        "speaker are named after them")
+    parser.add_argument("--enroll", nargs="+", default=[], metavar="SPEAKER=NAME",
+                        help="Enrolls speakers of the recording into the speaker index, "
+                        "e.g. '0=Alice' for SPEAKER_00")
+    parser.add_argument("--model-dir", default=None,
+                        help="Directory with the models downloaded by prefetch.py")
+    parser.add_argument("--offline", action="store_true",
+                        help="Only use models that are already downloaded")
     
     args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    if args.diarizer is None:
+        args.diarizer = "pyannote" if args.hf_token else "lite"
+    enrollments = {}
+    for enrollment in args.enroll:
+        speaker, _, name = enrollment.partition("=")
+        if not speaker.isdigit() or not name:
+            parser.error(f"--enroll expects SPEAKER=NAME, got {enrollment!r}")
+        enrollments[int(speaker)] = name
+    if enrollments and args.speaker_index is None:
+        parser.error("--enroll requires --speaker-index")
+    if enrollments and len(args.audio_files) > 1:
+        parser.error("--enroll takes a single audio file")
+    
+    # Has to happen before any model library is imported
+    configure_model_dir(args.model_dir, args.offline)
     
     for audio_path in args.audio_files:
         if not os.path.exists(audio_path):
@@ -213,23 +241,38 @@ def main():
             language=args.language
         )
         
-        print(f"\nDetected language: {info.language} (probability: {info.language_probability:.2f})")
+        print(f"\nDetected language: {info.language} "
+              f"(probability: {info.language_probability:.2f})")
         print(f"Duration: {info.duration:.2f} seconds")
         print(f"Segments: {len(transcription)}")
         
         # Step 2: Diarization (optional)
-        speaker_segments = None
+        speaker_segments, speaker_embeddings = None, {}
         if not args.no_diarization:
-            speaker_segments = diarize_audio(audio_path, args.hf_token)
+            speaker_segments, speaker_embeddings, embedding_model = diarize_audio(
+                audio_path,
+                diarizer=args.diarizer,
+                hf_token=args.hf_token,
+                profile=args.diarization_profile
+            )
         
         # Step 3: Assign speakers to transcript
         transcription = assign_speakers_to_transcript(transcription, speaker_segments)
+        if args.speaker_index is not None and speaker_embeddings:
+            transcription = identify_speakers(
+                transcription,
+                speaker_embeddings,
+                embedding_model,
+                args.speaker_index,
+                enrollments
+            )
         
         # Step 4: Generate outputs
-        txt_path, srt_path, json_path = generate_outputs(
+        generate_outputs(
             transcription,
             args.output_dir,
-            os.path.basename(audio_path)
+            os.path.basename(audio_path),
+            args.formats
         )
         
         print(f"\n[OK] Processing complete for: {audio_path}")
@@ -1,7 +1,16 @@
+import copy
+import hashlib
+import json
+import logging
 import os
+import re
 import shutil
+import wave
 
-import nltk
+from operator import itemgetter
+from typing import Optional
+
+import numpy as np
 
 punct_model_langs = [
     "en",
@@ -245,6 +254,173 @@ langs_to_iso = {
 }
 
 
+class WordTable:
+    """
+    Word-level transcript stored as columns instead of one dict per word.
+
+    Timestamps are int32 milliseconds, speakers are int16 indices into
+    ``speakers`` and the words are kept as one string sliced by ``offsets``,
+    so a word costs a few bytes plus its text instead of a dict, two ints and
+    a string object. Indexing and iterating yield the same dicts that
+    ``get_words_speaker_mapping`` returns for a list of word timestamps, and
+    ``from_records`` / ``to_records`` convert from and to such lists.
+    """
+
+    def __init__(self, words, start_time, end_time, speaker_ids=None, speakers=(None,)):
+        lengths = np.fromiter(map(len, words), dtype=np.int64, count=len(words))
+        self.text = "".join(words)
+        self.offsets = np.concatenate([[0], np.cumsum(lengths)])
+        self.start_time = np.asarray(start_time, dtype=np.int32)
+        self.end_time = np.asarray(end_time, dtype=np.int32)
+        self.speaker_ids = (
+            np.zeros(len(words), dtype=np.int16)
+            if speaker_ids is None
+            else np.asarray(speaker_ids, dtype=np.int16)
+        )
+        self.speakers = list(speakers)
+
+    @classmethod
+    def from_word_timestamps(cls, word_timestamps):
+        """
+        Build a table without speakers from the aligner's ``text``, ``start``
+        and ``end`` (in seconds) word timestamps.
+        """
+        return cls(
+            [w["text"] for w in word_timestamps],
+            (np.array([w["start"] for w in word_timestamps]) * 1000).astype(np.int64),
+            (np.array([w["end"] for w in word_timestamps]) * 1000).astype(np.int64),
+        )
+
+    @classmethod
+    def from_records(cls, word_speaker_mapping):
+        speaker_ids, speakers = _encode_speakers(
+            [w["speaker"] for w in word_speaker_mapping]
+        )
+        return cls(
+            [w["word"] for w in word_speaker_mapping],
+            [w["start_time"] for w in word_speaker_mapping],
+            [w["end_time"] for w in word_speaker_mapping],
+            speaker_ids,
+            speakers,
+        )
+
+    def to_records(self):
+        return list(self)
+
+    @property
+    def words(self):
+        offsets = self.offsets.tolist()
+        return [self.text[a:b] for a, b in zip(offsets[:-1], offsets[1:])]
+
+    @property
+    def speaker_labels(self):
+        return [self.speakers[i] for i in self.speaker_ids.tolist()]
+
+    def with_speakers(self, speaker_ids, speakers):
+        """
+        Return a table sharing the words and timestamps with new speakers.
+        """
+        table = copy.copy(self)
+        table.speaker_ids = np.asarray(speaker_ids, dtype=np.int16)
+        table.speakers = list(speakers)
+        return table
+
+    def words_at(self, indices):
+        """
+        Return the words at ``indices`` without slicing out the others.
+        """
+        indices = np.asarray(indices, dtype=np.int64)
+        starts = self.offsets[indices].tolist()
+        ends = self.offsets[indices + 1].tolist()
+        return [self.text[a:b] for a, b in zip(starts, ends)]
+
+    def with_words(self, indices, words):
+        """
+        Return a table sharing the timestamps and speakers with the words at
+        ``indices`` (in increasing order) replaced by ``words``.
+
+        Only the replaced words are touched, the rest of the text is copied
+        in the pieces between them.
+        """
+        table = copy.copy(self)
+        if not len(indices):
+            return table
+
+        indices = np.asarray(indices, dtype=np.int64)
+        starts = self.offsets[indices]
+        ends = self.offsets[indices + 1]
+        growth = np.zeros(len(self), dtype=np.int64)
+        growth[indices] = np.fromiter(map(len, words), np.int64, len(words))
+        growth[indices] -= ends - starts
+
+        pieces = []
+        for start, previous_end, word in zip(
+            starts.tolist(), [0] + ends[:-1].tolist(), words
+        ):
+            pieces.append(self.text[previous_end:start])
+            pieces.append(word)
+        pieces.append(self.text[ends[-1] :])
+
+        table.text = "".join(pieces)
+        table.offsets = self.offsets + np.concatenate([[0], np.cumsum(growth)])
+        return table
+
+    def __len__(self):
+        return len(self.start_time)
+
+    def __getitem__(self, index):
+        index = range(len(self))[index]
+        return {
+            "word": self.text[self.offsets[index] : self.offsets[index + 1]],
+            "start_time": int(self.start_time[index]),
+            "end_time": int(self.end_time[index]),
+            "speaker": self.speakers[self.speaker_ids[index]],
+        }
+
+    def __iter__(self):
+        for word, start, end, speaker in zip(*_get_word_columns(self)):
+            yield {
+                "word": word,
+                "start_time": start,
+                "end_time": end,
+                "speaker": speaker,
+            }
+
+
+def _encode_speakers(labels, speakers=()):
+    """
+    Return int16 ids for ``labels`` and the list of speakers they index,
+    starting from ``speakers`` and adding new labels as they appear.
+    """
+    index = {speaker: i for i, speaker in enumerate(speakers)}
+    for label in labels:
+        index.setdefault(label, len(index))
+    assert len(index) <= np.iinfo(np.int16).max, "too many speakers"
+    speaker_ids = np.fromiter(
+        (index[label] for label in labels), dtype=np.int16, count=len(labels)
+    )
+    return speaker_ids, list(index)
+
+
+def _get_word_columns(word_speaker_mapping):
+    """
+    Return the words, start times, end times and speakers as lists.
+    """
+    if isinstance(word_speaker_mapping, WordTable):
+        return (
+            word_speaker_mapping.words,
+            word_speaker_mapping.start_time.tolist(),
+            word_speaker_mapping.end_time.tolist(),
+            word_speaker_mapping.speaker_labels,
+        )
+    return (
+        [w["word"] for w in word_speaker_mapping],
+        [w["start_time"] for w in word_speaker_mapping],
+        [w["end_time"] for w in word_speaker_mapping],
+        [w["speaker"] for w in word_speaker_mapping],
+    )
+
+
 def get_word_ts_anchor(s, e, option="start"):
     if option == "end":
         return e
@@ -253,139 +429,249 @@ def get_word_ts_anchor(s, e, option="start"):
     return s
 
 
+def get_words_speaker_ids(
+    word_starts, word_ends, turn_ends, word_anchor_options=("start", "mid", "end")
+):
+    """
+    Return the speaker turn index of every word for each anchor option.
+
+    Words are matched to the first turn that ends at or after their anchor,
+    never going back to an earlier turn than the previous word's, and words
+    past the second to last turn belong to the last one. Because the turn
+    index only moves forward, this is a ``searchsorted`` of the running
+    maximum of the anchors into the running maximum of the turn ends.
+    The result has one row per option in ``word_anchor_options``.
+    """
+    word_starts = np.asarray(word_starts, dtype=np.float64)
+    word_ends = np.asarray(word_ends, dtype=np.float64)
+    anchors = np.stack(
+        [get_word_ts_anchor(word_starts, word_ends, o) for o in word_anchor_options]
+    )
+    turn_ends = np.maximum.accumulate(np.asarray(turn_ends[:-1], dtype=np.float64))
+    return np.searchsorted(turn_ends, np.maximum.accumulate(anchors, axis=1))
+
+
 def get_words_speaker_mapping(wrd_ts, spk_ts, word_anchor_option="start"):
-    s, e, sp = spk_ts[0]
-    wrd_pos, turn_idx = 0, 0
-    wrd_spk_mapping = []
-    for wrd_dict in wrd_ts:
-        ws, we, wrd = (
-            int(wrd_dict["start"] * 1000),
-            int(wrd_dict["end"] * 1000),
-            wrd_dict["text"],
-        )
-        wrd_pos = get_word_ts_anchor(ws, we, word_anchor_option)
-        while wrd_pos > float(e):
-            turn_idx += 1
-            turn_idx = min(turn_idx, len(spk_ts) - 1)
-            s, e, sp = spk_ts[turn_idx]
-            if turn_idx == len(spk_ts) - 1:
-                e = get_word_ts_anchor(ws, we, option="end")
-        wrd_spk_mapping.append(
-            {"word": wrd, "start_time": ws, "end_time": we, "speaker": sp}
-        )
-    return wrd_spk_mapping
+    """
+    Assign every word the speaker of the turn its anchor falls in.
 
+    ``wrd_ts`` is either the aligner's list of word timestamps, which gives
+    a list of word dicts, or a ``WordTable`` built from it, which gives a
+    ``WordTable`` with the speakers filled in. Without any speaker turns,
+    e.g. when the diarizer found no speech, every word is given speaker 0.
 
-sentence_ending_punctuations = ".?!"
+    Matching the words is vectorized either way, but on the list path most
+    of the time goes into reading and building the word dicts, so it is only
+    somewhat faster than the loop it replaced; ``benchmark_helpers.py``
+    compares both paths with it.
+    """
+    if not spk_ts:
+        spk_ts = [(0, 0, 0)]
+    turn_ends = [e for _, e, _ in spk_ts]
+    if isinstance(wrd_ts, WordTable):
+        (turn_ids,) = get_words_speaker_ids(
+            wrd_ts.start_time, wrd_ts.end_time, turn_ends, (word_anchor_option,)
+        )
+        turn_speaker_ids, speakers = _encode_speakers([sp for _, _, sp in spk_ts])
+        return wrd_ts.with_speakers(turn_speaker_ids[turn_ids], speakers)
+
+    if not wrd_ts:
+        return []
+
+    # the dicts are built straight from the columns, going through a
+    # WordTable and back would cost more than the vectorized matching saves
+    word_starts = _get_ms_column(wrd_ts, "start")
+    word_ends = _get_ms_column(wrd_ts, "end")
+    (turn_ids,) = get_words_speaker_ids(
+        word_starts, word_ends, turn_ends, (word_anchor_option,)
+    )
+    speakers = [sp for _, _, sp in spk_ts]
+
+    return [
+        {"word": wrd, "start_time": ws, "end_time": we, "speaker": sp}
+        for wrd, ws, we, sp in zip(
+            map(itemgetter("text"), wrd_ts),
+            word_starts.tolist(),
+            word_ends.tolist(),
+            map(speakers.__getitem__, turn_ids.tolist()),
+        )
+    ]
 
 
-def get_first_word_idx_of_sentence(word_idx, word_list, speaker_list, max_words):
-    is_word_sentence_end = (
-        lambda x: x >= 0 and word_list[x][-1] in sentence_ending_punctuations
+def _get_ms_column(word_timestamps, key):
+    """
+    Return the ``key`` timestamps in seconds as int64 milliseconds.
+    """
+    seconds = np.fromiter(
+        map(itemgetter(key), word_timestamps),
+        dtype=np.float64,
+        count=len(word_timestamps),
     )
-    left_idx = word_idx
-    while (
-        left_idx > 0
-        and word_idx - left_idx < max_words
-        and speaker_list[left_idx - 1] == speaker_list[left_idx]
-        and not is_word_sentence_end(left_idx - 1)
-    ):
-        left_idx -= 1
+    return (seconds * 1000).astype(np.int64)
 
-    return left_idx if left_idx == 0 or is_word_sentence_end(left_idx - 1) else -1
 
+sentence_ending_punctuations = ".?!"
 
-def get_last_word_idx_of_sentence(word_idx, word_list, max_words):
-    is_word_sentence_end = (
-        lambda x: x >= 0 and word_list[x][-1] in sentence_ending_punctuations
-    )
-    right_idx = word_idx
-    while (
-        right_idx < len(word_list) - 1
-        and right_idx - word_idx < max_words
-        and not is_word_sentence_end(right_idx)
-    ):
-        right_idx += 1
 
+def _get_sentence_ends(word_speaker_mapping):
+    """
+    Return whether each word ends with sentence-ending punctuation.
+    """
+    if not isinstance(word_speaker_mapping, WordTable):
+        return [
+            bool(line_dict["word"])
+            and line_dict["word"][-1] in sentence_ending_punctuations
+            for line_dict in word_speaker_mapping
+        ]
+
+    table = word_speaker_mapping
+    if not table.text:
+        return [False] * len(table)
+    # look up the last character of every word without slicing the words out
+    chars = np.frombuffer(table.text.encode("utf-32-le"), dtype=np.uint32)
+    last_chars = chars[np.maximum(table.offsets[1:] - 1, 0)]
     return (
-        right_idx
-        if right_idx == len(word_list) - 1 or is_word_sentence_end(right_idx)
-        else -1
-    )
+        (table.offsets[1:] > table.offsets[:-1])
+        & np.isin(last_chars, [ord(c) for c in sentence_ending_punctuations])
+    ).tolist()
 
 
 def get_realigned_ws_mapping_with_punctuation(
     word_speaker_mapping, max_words_in_sentence=50
 ):
-    is_word_sentence_end = (
-        lambda x: x >= 0
-        and word_speaker_mapping[x]["word"][-1] in sentence_ending_punctuations
+    """
+    Give every sentence that straddles a speaker change to its majority speaker.
+
+    A sentence is only relabelled when it is found within
+    ``max_words_in_sentence`` words around the speaker change, starts inside
+    the run of the speaker before the change and holds at least half of its
+    words for the majority speaker. The previous and next sentence ends and
+    the start of each speaker run are precomputed, and relabelled sentences
+    end on a sentence end, so no later sentence overlaps them and the whole
+    pass is linear in the number of words.
+
+    A ``WordTable`` gives a ``WordTable`` sharing the words and timestamps,
+    its speaker ids are relabelled without going through the labels; for a
+    list, entries whose speaker doesn't change are shared with it.
+    """
+    is_sentence_end = _get_sentence_ends(word_speaker_mapping)
+    is_table = isinstance(word_speaker_mapping, WordTable)
+    speaker_list = (
+        word_speaker_mapping.speaker_ids.tolist()
+        if is_table
+        else [line_dict["speaker"] for line_dict in word_speaker_mapping]
     )
-    wsp_len = len(word_speaker_mapping)
+    wsp_len = len(speaker_list)
 
-    words_list, speaker_list = [], []
-    for k, line_dict in enumerate(word_speaker_mapping):
-        word, speaker = line_dict["word"], line_dict["speaker"]
-        words_list.append(word)
-        speaker_list.append(speaker)
+    prev_sentence_end, run_start = [-1] * wsp_len, [0] * wsp_len
+    for k in range(1, wsp_len):
+        prev_sentence_end[k] = (
+            k - 1 if is_sentence_end[k - 1] else prev_sentence_end[k - 1]
+        )
+        run_start[k] = run_start[k - 1] if speaker_list[k] == speaker_list[k - 1] else k
+
+    next_sentence_end = [wsp_len - 1] * wsp_len
+    for k in range(wsp_len - 2, -1, -1):
+        next_sentence_end[k] = k if is_sentence_end[k] else next_sentence_end[k + 1]
 
     k = 0
-    while k < len(word_speaker_mapping):
-        line_dict = word_speaker_mapping[k]
-        if (
-            k < wsp_len - 1
-            and speaker_list[k] != speaker_list[k + 1]
-            and not is_word_sentence_end(k)
-        ):
-            left_idx = get_first_word_idx_of_sentence(
-                k, words_list, speaker_list, max_words_in_sentence
-            )
-            right_idx = (
-                get_last_word_idx_of_sentence(
-                    k, words_list, max_words_in_sentence - k + left_idx - 1
-                )
-                if left_idx > -1
-                else -1
-            )
-            if min(left_idx, right_idx) == -1:
-                k += 1
-                continue
-
-            spk_labels = speaker_list[left_idx : right_idx + 1]
-            mod_speaker = max(set(spk_labels), key=spk_labels.count)
-            if spk_labels.count(mod_speaker) < len(spk_labels) // 2:
-                k += 1
-                continue
-
-            speaker_list[left_idx : right_idx + 1] = [mod_speaker] * (
-                right_idx - left_idx + 1
-            )
-            k = right_idx
+    while k < wsp_len - 1:
+        if speaker_list[k] == speaker_list[k + 1] or is_sentence_end[k]:
+            k += 1
+            continue
+
+        # the sentence has to start within reach and inside the current speaker run
+        left_idx = prev_sentence_end[k] + 1
+        if left_idx < max(k - max_words_in_sentence, run_start[k]):
+            k += 1
+            continue
+
+        words_left = max(max_words_in_sentence - (k - left_idx) - 1, 0)
+        right_idx = next_sentence_end[k]
+        if right_idx > k + words_left:
+            k += 1
+            continue
+
+        spk_counts = {}
+        for speaker in speaker_list[left_idx : right_idx + 1]:
+            spk_counts[speaker] = spk_counts.get(speaker, 0) + 1
+        if is_table:
+            # counted by speaker id, ties are broken on the labels below
+            spk_counts = {
+                word_speaker_mapping.speakers[speaker_id]: count
+                for speaker_id, count in spk_counts.items()
+            }
+        # ties go to the first label of a set built in order of appearance,
+        # the same one max(set(spk_labels), key=spk_labels.count) would pick
+        mod_speaker = max(set(list(spk_counts)), key=spk_counts.__getitem__)
+        if spk_counts[mod_speaker] < (right_idx - left_idx + 1) // 2:
+            k += 1
+            continue
+
+        if is_table:
+            mod_speaker = word_speaker_mapping.speakers.index(mod_speaker)
+        speaker_list[left_idx : right_idx + 1] = [mod_speaker] * (
+            right_idx - left_idx + 1
+        )
+        k = right_idx + 1
+
+    if is_table:
+        return word_speaker_mapping.with_speakers(
+            speaker_list, word_speaker_mapping.speakers
+        )
+
+    return [
+        (
+            line_dict
+            if line_dict["speaker"] == speaker
+            else {**line_dict, "speaker": speaker}
+        )
+        for line_dict, speaker in zip(word_speaker_mapping, speaker_list)
+    ]
+
 
-        k += 1
+_sentence_tokenizer = None
 
-    k, realigned_list = 0, []
-    while k < len(word_speaker_mapping):
-        line_dict = word_speaker_mapping[k].copy()
-        line_dict["speaker"] = speaker_list[k]
-        realigned_list.append(line_dict)
-        k += 1
 
-    return realigned_list
+def _get_sentence_tokenizer():
+    global _sentence_tokenizer
+    if _sentence_tokenizer is None:
+        # nltk takes a while to import and is only needed once sentences are built
+        import nltk
+
+        _sentence_tokenizer = nltk.tokenize.PunktSentenceTokenizer()
+    return _sentence_tokenizer
+
+
+def _get_sentence_tail(words):
+    """
+    Return the end of a sentence that decides whether the next word breaks it.
+
+    Punkt labels a token from the token itself and the one after it, and its
+    tokens don't cross whitespace except for spaced ellipses (". . ."), so
+    the last word is enough unless it could be part of such an ellipsis.
+    """
+    i = len(words) - 1
+    while i > 0 and (not words[i].strip() or words[i].lstrip().startswith(".")):
+        i -= 1
+    return "".join(w + " " for w in words[max(i, 0) :])
 
 
 def get_sentences_speaker_mapping(word_speaker_mapping, spk_ts):
-    sentence_checker = nltk.tokenize.PunktSentenceTokenizer().text_contains_sentbreak
+    sentence_checker = _get_sentence_tokenizer().text_contains_sentbreak
     s, e, spk = spk_ts[0]
     prev_spk = spk
 
     snts = []
     snt = {"speaker": f"Speaker {spk}", "start_time": s, "end_time": e, "text": ""}
+    snt_words = []
 
-    for wrd_dict in word_speaker_mapping:
-        wrd, spk = wrd_dict["word"], wrd_dict["speaker"]
-        s, e = wrd_dict["start_time"], wrd_dict["end_time"]
-        if spk != prev_spk or sentence_checker(snt["text"] + " " + wrd):
+    for wrd, s, e, spk in zip(*_get_word_columns(word_speaker_mapping)):
+        # the words before the tail were already checked against their next word
+        if spk != prev_spk or sentence_checker(
+            _get_sentence_tail(snt_words) + " " + wrd
+        ):
+            snt["text"] = "".join(w + " " for w in snt_words)
             snts.append(snt)
             snt = {
                 "speaker": f"Speaker {spk}",
@@ -393,11 +679,13 @@ def get_sentences_speaker_mapping(word_speaker_mapping, spk_ts):
                 "end_time": e,
                 "text": "",
             }
+            snt_words = []
         else:
             snt["end_time"] = e
-        snt["text"] += wrd + " "
+        snt_words.append(wrd)
         prev_spk = spk
 
+    snt["text"] = "".join(w + " " for w in snt_words)
     snts.append(snt)
     return snts
 
@@ -452,70 +740,165 @@ def write_srt(transcript, file):
             f"{format_timestamp(segment['end_time'])}\n"
             f"{segment['speaker']}: {segment['text'].strip().replace('-->', '->')}\n",
             file=file,
-            flush=True,
         )
 
 
-def find_numeral_symbol_tokens(tokenizer):
-    numeral_symbol_tokens = [
-        -1,
-    ]
-    for token, token_id in tokenizer.get_vocab().items():
-        has_numeral_symbol = any(c in "0123456789%$£" for c in token)
-        if has_numeral_symbol:
-            numeral_symbol_tokens.append(token_id)
-    return numeral_symbol_tokens
-
-
-def _get_next_start_timestamp(word_timestamps, current_word_index, final_timestamp):
-    # if current word is the last word
-    if current_word_index == len(word_timestamps) - 1:
-        return word_timestamps[current_word_index]["start"]
-
-    next_word_index = current_word_index + 1
-    while current_word_index < len(word_timestamps) - 1:
-        if word_timestamps[next_word_index].get("start") is None:
-            # if next word doesn't have a start timestamp
-            # merge it with the current word and delete it
-            word_timestamps[current_word_index]["word"] += (
-                " " + word_timestamps[next_word_index]["word"]
-            )
+numeral_symbols = "0123456789%$£"
 
-            word_timestamps[next_word_index]["word"] = None
-            next_word_index += 1
-            if next_word_index == len(word_timestamps):
-                return final_timestamp
+_numeral_symbol_tokens = {}
 
-        else:
-            return word_timestamps[next_word_index]["start"]
+
+def _get_cache_dir():
+    cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.join(
+        os.path.expanduser("~"), ".cache"
+    )
+    return os.path.join(cache_home, "whisper-diarization")
+
+
+def _get_vocab_hash(vocab):
+    # listing the tokens by id identifies the vocabulary regardless of dict order
+    tokens = sorted(vocab, key=vocab.__getitem__)
+    return hashlib.sha256(
+        json.dumps(tokens, ensure_ascii=False).encode("utf-8")
+    ).hexdigest()
+
+
+def find_numeral_symbol_tokens(tokenizer, symbols=numeral_symbols, cache_dir=None):
+    """
+    Return -1 followed by the ids of the tokens that contain any of ``symbols``.
+
+    The result only depends on the vocabulary and ``symbols``, so it is
+    memoized in-process and saved as a small JSON file in ``cache_dir``
+    (``$XDG_CACHE_HOME/whisper-diarization`` by default) keyed by their hash,
+    and later runs with the same tokenizer skip scanning the vocabulary.
+    """
+    vocab = tokenizer.get_vocab()
+    key = hashlib.sha256(
+        f"{_get_vocab_hash(vocab)}:{symbols}".encode("utf-8")
+    ).hexdigest()
+    if key in _numeral_symbol_tokens:
+        return list(_numeral_symbol_tokens[key])
+
+    cache_file = os.path.join(
+        cache_dir or _get_cache_dir(), "numeral_symbol_tokens", f"{key}.json"
+    )
+    try:
+        with open(cache_file, encoding="utf-8") as f:
+            numeral_symbol_tokens = json.load(f)["tokens"]
+    except (OSError, ValueError, KeyError):
+        has_numeral_symbol = re.compile(f"[{re.escape(symbols)}]").search
+        numeral_symbol_tokens = [
+            -1,
+        ]
+        for token, token_id in vocab.items():
+            if has_numeral_symbol(token):
+                numeral_symbol_tokens.append(token_id)
+
+        try:
+            os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+            tmp_file = f"{cache_file}.{os.getpid()}.tmp"
+            with open(tmp_file, "w", encoding="utf-8") as f:
+                json.dump({"symbols": symbols, "tokens": numeral_symbol_tokens}, f)
+            os.replace(tmp_file, cache_file)
+        except OSError as e:
+            logging.debug(f"Could not cache the suppressed tokens: {e}")
+
+    _numeral_symbol_tokens[key] = numeral_symbol_tokens
+    return list(numeral_symbol_tokens)
 
 
 def filter_missing_timestamps(
-    word_timestamps, initial_timestamp=0, final_timestamp=None
+    word_timestamps, initial_timestamp=0, final_timestamp=None, text_key="word"
 ):
-    # handle the first and last word
-    if word_timestamps[0].get("start") is None:
-        word_timestamps[0]["start"] = (
-            initial_timestamp if initial_timestamp is not None else 0
-        )
-        word_timestamps[0]["end"] = _get_next_start_timestamp(
-            word_timestamps, 0, final_timestamp
-        )
+    """
+    Fill in the words that the aligner left without timestamps.
+
+    Every run of consecutive words without a start is merged into its first
+    word, which starts at the previous word's end (or ``initial_timestamp``
+    for the first word) and ends at the next timed word's start (or
+    ``final_timestamp`` when the run reaches the end; a single missing last
+    word ends where it starts). Each run is scanned once, when its first
+    word is reached, so this is linear in the number of words. The input
+    isn't modified: filled words are new dicts and timed words are shared
+    with it. Those copies are the only cost the in-place version didn't
+    have, so when every other word is missing this is about as fast as it
+    rather than faster. The text of a word is read from ``text_key``, the
+    aligner's word timestamps keep it in ``"text"``.
+    """
+    n = len(word_timestamps)
+    result = []
+    append = result.append
+    i = 0
+    while i < n:
+        ws = word_timestamps[i]
+        if ws.get("start") is not None:
+            append(ws)
+            i += 1
+            continue
+
+        j = i + 1
+        while j < n and word_timestamps[j].get("start") is None:
+            j += 1
+        if i == 0:
+            start = initial_timestamp if initial_timestamp is not None else 0
+        else:
+            start = word_timestamps[i - 1]["end"]
 
-    result = [
-        word_timestamps[0],
-    ]
+        if i == n - 1:
+            end = start
+        elif j == n:
+            end = final_timestamp
+        else:
+            end = word_timestamps[j]["start"]
+
+        # copying and then setting the keys is cheaper than unpacking into a
+        # new dict, which matters when most gaps are a single word
+        ws = ws.copy()
+        if j > i + 1:
+            ws[text_key] = " ".join(w[text_key] for w in word_timestamps[i:j])
+        ws["start"] = start
+        ws["end"] = end
+        append(ws)
+        i = j
+    return result
 
-    for i, ws in enumerate(word_timestamps[1:], start=1):
-        # if ws doesn't have a start and end
-        # use the previous end as start and next start as end
-        if ws.get("start") is None and ws.get("word") is not None:
-            ws["start"] = word_timestamps[i - 1]["end"]
-            ws["end"] = _get_next_start_timestamp(word_timestamps, i, final_timestamp)
 
-        if ws["word"] is not None:
-            result.append(ws)
-    return result
+def configure_model_dir(model_dir: Optional[str] = None, offline: bool = False):
+    """
+    Point the Hugging Face, NeMo and torch hub caches at ``model_dir``.
+
+    Those libraries read the environment when they are imported, so this has
+    to run first. With ``offline`` they only use what is already cached.
+    """
+    if model_dir is not None:
+        model_dir = os.path.abspath(model_dir)
+        os.environ["HF_HOME"] = os.path.join(model_dir, "huggingface")
+        os.environ["NEMO_CACHE_DIR"] = os.path.join(model_dir, "nemo")
+        os.environ["TORCH_HOME"] = os.path.join(model_dir, "torch")
+    if offline:
+        os.environ["HF_HUB_OFFLINE"] = "1"
+        os.environ["TRANSFORMERS_OFFLINE"] = "1"
+    return model_dir
+
+
+def load_audio(path: str) -> np.ndarray:
+    """
+    Load an audio file as 16 kHz mono float32 samples.
+
+    16 kHz mono PCM16 WAV files, which the web interface uploads, are read
+    as they are, anything else is decoded and resampled by faster-whisper.
+    """
+    try:
+        with wave.open(path, "rb") as f:
+            if (f.getframerate(), f.getnchannels(), f.getsampwidth()) == (16000, 1, 2):
+                frames = f.readframes(f.getnframes())
+                return np.frombuffer(frames, dtype="<i2").astype(np.float32) / 32768.0
+    except (wave.Error, EOFError):
+        pass
+
+    import faster_whisper
+
+    return faster_whisper.decode_audio(path)
 
 
 def cleanup(path: str):
@@ -0,0 +1,264 @@
+import argparse
+import json
+import logging
+import os
+import time
+
+from helpers import configure_model_dir
+
+mtypes = {"cpu": "int8", "cuda": "float16"}
+
+WHISPER_MODELS = ["medium.en", "base"]
+PYANNOTE_PIPELINE = "pyannote/speaker-diarization-3.1"
+PUNCTUATION_MODEL = "kredor/punctuate-all"
+DEMUCS_MODEL = "htdemucs"
+MODELS = ["whisper", "alignment", "punctuation", "msdd", "lite", "pyannote", "demucs"]
+
+MANIFEST_NAME = "manifest.json"
+WARMUP_AUDIO = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "tests", "assets", "test.opus"
+)
+WARMUP_SECONDS = 10
+
+
+def load_warmup_audio():
+    """
+    Return a few seconds of 16 kHz mono speech to run every model on once.
+    """
+    import faster_whisper
+    import numpy as np
+
+    if os.path.exists(WARMUP_AUDIO):
+        return faster_whisper.decode_audio(WARMUP_AUDIO)[: WARMUP_SECONDS * 16000]
+    logging.warning(f"{WARMUP_AUDIO} not found, warming up on noise instead.")
+    noise = np.random.default_rng(0).normal(0, 0.1, WARMUP_SECONDS * 16000)
+    return noise.astype(np.float32)
+
+
+def prefetch_whisper(device, audio, args):
+    import faster_whisper
+
+    for model_name in args.whisper_models:
+        model = faster_whisper.WhisperModel(
+            model_name, device=device, compute_type=mtypes[device]
+        )
+        segments, _ = model.transcribe(audio, beam_size=1)
+        list(segments)
+        del model
+
+
+def prefetch_alignment(device, audio, args):
+    import torch
+
+    from ctc_forced_aligner import load_alignment_model
+
+    from alignment import generate_emissions_chunked
+
+    model, _ = load_alignment_model(
+        device,
+        dtype=torch.float16 if device == "cuda" else torch.float32,
+    )
+    generate_emissions_chunked(model, audio, batch_size=1)
+
+
+def prefetch_punctuation(device, audio, args):
+    from deepmultilingualpunctuation import PunctuationModel
+
+    model = PunctuationModel(model=PUNCTUATION_MODEL)
+    model.predict("this is a short warmup sentence to load the model".split())
+
+
+def prefetch_msdd(device, audio, args):
+    import torch
+
+    from diarization import MSDDDiarizer
+
+    # loads titanet_large, vad_multilingual_marblenet and diar_msdd_telephonic
+    MSDDDiarizer(device=device).diarize(torch.from_numpy(audio).unsqueeze(0))
+
+
+def prefetch_lite(device, audio, args):
+    import torch
+
+    from diarization import create_diarizer
+
+    # loads the wespeaker ResNet34 embedding model
+    create_diarizer("lite", device=device).diarize(torch.from_numpy(audio).unsqueeze(0))
+
+
+def prefetch_pyannote(device, audio, args):
+    import torch
+
+    from pyannote.audio import Pipeline
+
+    pipeline = Pipeline.from_pretrained(PYANNOTE_PIPELINE, token=args.hf_token)
+    pipeline.to(torch.device(device))
+    pipeline({"waveform": torch.from_numpy(audio).unsqueeze(0), "sample_rate": 16000})
+
+
+def prefetch_demucs(device, audio, args):
+    import torch
+
+    from demucs.apply import apply_model
+    from demucs.pretrained import get_model
+
+    model = get_model(DEMUCS_MODEL)
+    # a second of silence at the model's own rate is enough to warm it up
+    apply_model(
+        model, torch.zeros(1, model.audio_channels, model.samplerate), device=device
+    )
+
+
+PREFETCHERS = {
+    "whisper": prefetch_whisper,
+    "alignment": prefetch_alignment,
+    "punctuation": prefetch_punctuation,
+    "msdd": prefetch_msdd,
+    "lite": prefetch_lite,
+    "pyannote": prefetch_pyannote,
+    "demucs": prefetch_demucs,
+}
+
+
+def list_model_files(model_dir):
+    """
+    Return the size of every file in ``model_dir`` by its relative path.
+    """
+    files = {}
+    for root, _, names in os.walk(model_dir):
+        for name in names:
+            path = os.path.join(root, name)
+            if name == MANIFEST_NAME and root == model_dir:
+                continue
+            files[os.path.relpath(path, model_dir)] = os.path.getsize(path)
+    return files
+
+
+def verify_model_dir(model_dir):
+    """
+    Check that every file in the manifest is still there with the same size,
+    and return the list of problems found.
+    """
+    manifest_path = os.path.join(model_dir, MANIFEST_NAME)
+    if not os.path.exists(manifest_path):
+        return [f"{manifest_path} not found, run prefetch without --verify first"]
+
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+
+    problems = [
+        f"{model} failed during prefetch: {result['error']}"
+        for model, result in manifest["models"].items()
+        if result["status"] == "failed"
+    ]
+    files = list_model_files(model_dir)
+    for path, size in manifest["files"].items():
+        if path not in files:
+            problems.append(f"missing {path}")
+        elif files[path] != size:
+            problems.append(f"{path} is {files[path]} bytes, expected {size}")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Download every model used by the diarization scripts into a "
+        "local directory and run each of them once."
+    )
+    parser.add_argument(
+        "--model-dir",
+        required=True,
+        help="Directory the Hugging Face, NeMo and torch hub caches are stored in",
+    )
+    parser.add_argument(
+        "--models",
+        nargs="+",
+        default=MODELS,
+        choices=MODELS,
+        help="Models to prefetch, defaults to all of them",
+    )
+    parser.add_argument(
+        "--whisper-models",
+        nargs="+",
+        default=WHISPER_MODELS,
+        help="Whisper models to prefetch",
+    )
+    parser.add_argument(
+        "--hf-token",
+        default=os.environ.get("HF_TOKEN"),
+        help="Hugging Face token for the gated pyannote pipeline, "
+        "pyannote is skipped without one",
+    )
+    parser.add_argument(
+        "--device",
+        default=None,
+        help="Device to run the warmup on, defaults to 'cuda' if available",
+    )
+    parser.add_argument(
+        "--verify",
+        action="store_true",
+        help="Don't download anything, check the directory against its manifest "
+        "and load every model from it in offline mode",
+    )
+    args = parser.parse_args()
+
+    model_dir = configure_model_dir(args.model_dir, offline=args.verify)
+    os.makedirs(model_dir, exist_ok=True)
+
+    if args.verify:
+        problems = verify_model_dir(model_dir)
+        for problem in problems:
+            logging.error(problem)
+        if problems:
+            raise SystemExit(1)
+
+    import torch
+
+    device = args.device or ("cuda" if torch.cuda.is_available() else "cpu")
+    audio = load_warmup_audio()
+
+    results = {}
+    for model in args.models:
+        if model == "pyannote" and not args.hf_token:
+            logging.warning("No Hugging Face token given, skipping pyannote.")
+            results[model] = {"status": "skipped"}
+            continue
+
+        start = time.perf_counter()
+        try:
+            PREFETCHERS[model](device, audio, args)
+        except Exception as e:
+            logging.error(f"Failed to prefetch {model}: {e}")
+            results[model] = {"status": "failed", "error": str(e)}
+        else:
+            results[model] = {"status": "ok"}
+        results[model]["seconds"] = round(time.perf_counter() - start, 2)
+        print(f"{model}: {results[model]['status']} in {results[model]['seconds']}s")
+
+        if device == "cuda":
+            torch.cuda.empty_cache()
+
+    failed = [
+        model for model, result in results.items() if result["status"] == "failed"
+    ]
+    if not args.verify:
+        with open(os.path.join(model_dir, MANIFEST_NAME), "w") as f:
+            json.dump(
+                {
+                    "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                    "whisper_models": args.whisper_models,
+                    "models": results,
+                    "files": list_model_files(model_dir),
+                },
+                f,
+                indent=2,
+            )
+
+    if failed:
+        raise SystemExit(f"Failed to prefetch: {', '.join(failed)}")
+    print(f"Models are ready in {model_dir}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -0,0 +1,248 @@
+import queue
+import re
+import threading
+import time
+
+from concurrent.futures import Future
+from itertools import compress
+from operator import itemgetter
+from typing import List
+
+from helpers import WordTable
+
+ending_puncts = ".?!"
+model_puncts = ".,;:!?"
+
+
+class _Chunk:
+    __slots__ = ("text", "future")
+
+    def __init__(self, text: str):
+        self.text = text
+        self.future = Future()
+
+
+class PunctuationService:
+    """
+    Keeps a punctuation model loaded and batches chunks from concurrent jobs.
+
+    Each call to ``predict`` splits its words into the same overlapping chunks
+    as ``PunctuationModel.predict`` and queues them. A worker thread collects
+    queued chunks from all jobs until ``max_batch_size`` chunks are waiting or
+    ``max_latency`` seconds passed since the first one, runs them through the
+    model in a single forward pass and hands every job its own labels back.
+    """
+
+    def __init__(
+        self,
+        model: str = "kredor/punctuate-all",
+        chunk_size: int = 230,
+        max_batch_size: int = 16,
+        max_latency: float = 0.05,
+    ):
+        from deepmultilingualpunctuation import PunctuationModel
+
+        self.model = PunctuationModel(model=model)
+        self.chunk_size = chunk_size
+        self.max_batch_size = max_batch_size
+        self.max_latency = max_latency
+
+        self._stats_lock = threading.Lock()
+        self._stats = {"jobs": 0, "words": 0, "chunks": 0, "batches": 0}
+        self._forward_time = 0.0
+
+        self._queue = queue.Queue()
+        self._queue_lock = threading.Lock()
+        self._closed = False
+        self._worker = threading.Thread(target=self._run, daemon=True)
+        self._worker.start()
+
+    def predict(self, words: List[str]):
+        """
+        Return ``[word, label, score]`` for every word, like ``PunctuationModel.predict``.
+        """
+        if not words:
+            return []
+
+        overlap = 5 if len(words) > self.chunk_size else 0
+        batches = [
+            words[i : i + self.chunk_size]
+            for i in range(0, len(words), self.chunk_size - overlap)
+        ]
+        # if the last batch is smaller than the overlap, we can just remove it
+        if len(batches[-1]) <= overlap:
+            batches.pop()
+
+        chunks = [_Chunk(" ".join(batch)) for batch in batches]
+        # nothing is queued behind the worker's stop
+        with self._queue_lock:
+            if self._closed:
+                raise RuntimeError("the punctuation service is closed")
+            for chunk in chunks:
+                self._queue.put(chunk)
+
+        tagged_words = []
+        for i, (batch, chunk) in enumerate(zip(batches, chunks)):
+            result = chunk.future.result()
+            assert (
+                len(chunk.text) == result[-1]["end"]
+            ), "chunk size too large, text got clipped"
+
+            # use last batch completely
+            batch_overlap = 0 if i == len(batches) - 1 else overlap
+            char_index, result_index, score = 0, 0, 0.0
+            for word in batch[: len(batch) - batch_overlap]:
+                char_index += len(word) + 1
+                # if any subtoken of an word is labled as sentence end
+                # we label the whole word as sentence end
+                label = "0"
+                while (
+                    result_index < len(result)
+                    and char_index > result[result_index]["end"]
+                ):
+                    label = result[result_index]["entity"]
+                    score = result[result_index]["score"]
+                    result_index += 1
+                tagged_words.append([word, label, score])
+
+        assert len(tagged_words) == len(words)
+
+        with self._stats_lock:
+            self._stats["jobs"] += 1
+            self._stats["words"] += len(words)
+        return tagged_words
+
+    def stats(self) -> dict:
+        """
+        Throughput counters since the service started.
+        """
+        with self._stats_lock:
+            stats = dict(self._stats)
+            forward_time = self._forward_time
+        stats["forward_seconds"] = forward_time
+        stats["mean_batch_size"] = stats["chunks"] / max(stats["batches"], 1)
+        stats["words_per_second"] = stats["words"] / forward_time if forward_time else 0
+        return stats
+
+    def close(self):
+        """
+        Finish the chunks that are already queued and stop the worker,
+        ``predict`` raises from then on.
+        """
+        with self._queue_lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue.put(None)
+        self._worker.join()
+
+    def _next_batch(self):
+        chunk = self._queue.get()
+        if chunk is None:
+            return None
+
+        batch = [chunk]
+        deadline = time.monotonic() + self.max_latency
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.monotonic()
+            try:
+                if timeout > 0:
+                    chunk = self._queue.get(timeout=timeout)
+                else:
+                    # chunks that are already waiting still join the batch
+                    chunk = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if chunk is None:
+                # put the stop back, it's handled after this batch
+                self._queue.put(None)
+                break
+            batch.append(chunk)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                break
+
+            start = time.perf_counter()
+            try:
+                results = self.model.pipe(
+                    [chunk.text for chunk in batch], batch_size=len(batch)
+                )
+            except Exception as e:
+                for chunk in batch:
+                    chunk.future.set_exception(e)
+                continue
+            elapsed = time.perf_counter() - start
+
+            for chunk, result in zip(batch, results):
+                chunk.future.set_result(result)
+
+            with self._stats_lock:
+                self._stats["chunks"] += len(batch)
+                self._stats["batches"] += 1
+                self._forward_time += elapsed
+
+
+_services = {}
+_services_lock = threading.Lock()
+
+
+def get_punctuation_service(
+    model: str = "kredor/punctuate-all", **kwargs
+) -> PunctuationService:
+    """
+    Return the process-wide service for ``model``, loading it on first use.
+    """
+    with _services_lock:
+        if model not in _services:
+            _services[model] = PunctuationService(model=model, **kwargs)
+        return _services[model]
+
+
+def _is_acronym(word):
+    # We don't want to punctuate U.S.A. with a period. Right?
+    return re.fullmatch(r"\b(?:[a-zA-Z]\.){2,}", word)
+
+
+def _punctuate_word(word, label):
+    if (
+        word
+        and label in ending_puncts
+        and (word[-1] not in model_puncts or _is_acronym(word))
+    ):
+        word += label
+        if word.endswith(".."):
+            word = word.rstrip(".")
+    return word
+
+
+def restore_punctuation(word_speaker_mapping, labeled_words):
+    """
+    Append the predicted sentence-ending punctuation to the words.
+
+    A list of word dicts is updated in place and returned, a ``WordTable``
+    gives a new table in which only the words that end a sentence are
+    touched.
+    """
+    if isinstance(word_speaker_mapping, WordTable):
+        table = word_speaker_mapping
+        # most words end no sentence, they are skipped without a Python loop
+        labels = map(itemgetter(1), labeled_words)
+        sentence_ends = list(
+            compress(range(len(table)), map(ending_puncts.__contains__, labels))
+        )
+        indices, words = [], []
+        for i, word in zip(sentence_ends, table.words_at(sentence_ends)):
+            punctuated = _punctuate_word(word, labeled_words[i][1])
+            if punctuated != word:
+                indices.append(i)
+                words.append(punctuated)
+        return table.with_words(indices, words)
+
+    for word_dict, labeled_tuple in zip(word_speaker_mapping, labeled_words):
+        if labeled_tuple[1] in ending_puncts:
+            word_dict["word"] = _punctuate_word(word_dict["word"], labeled_tuple[1])
+    return word_speaker_mapping
@@ -0,0 +1,55 @@
+import argparse
+import json
+
+from diarization import SpeakerIndex
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="List or delete the speakers enrolled in a speaker index. "
+        "Speakers are enrolled with the --enroll option of diarize.py and "
+        "diarize_simple.py."
+    )
+    parser.add_argument(
+        "speaker_index",
+        help="Directory of the speaker index",
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+    list_parser = commands.add_parser("list", help="List the enrolled speakers")
+    list_parser.add_argument(
+        "--json",
+        action="store_true",
+        help="Print the speakers as JSON",
+    )
+    delete_parser = commands.add_parser("delete", help="Delete enrolled speakers")
+    delete_parser.add_argument("names", nargs="+", help="Names of the speakers")
+    args = parser.parse_args()
+
+    speaker_index = SpeakerIndex(args.speaker_index)
+
+    if args.command == "list":
+        speakers = speaker_index.list_speakers()
+        if args.json:
+            print(json.dumps(speakers, ensure_ascii=False, indent=2))
+            return
+        print(f"{len(speakers)} speaker(s) of {speaker_index.model} embeddings")
+        for speaker in speakers:
+            print(
+                f"{speaker['name']}: {speaker['samples']} sample(s), "
+                f"enrolled {speaker['created_at']}, updated {speaker['updated_at']}"
+            )
+        return
+
+    deleted, missing = [], []
+    for name in dict.fromkeys(args.names):
+        (deleted if speaker_index.delete(name) else missing).append(name)
+    if deleted:
+        speaker_index.save()
+    for name in deleted:
+        print(f"Deleted {name}")
+    if missing:
+        raise SystemExit(f"Not enrolled: {', '.join(missing)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,290 @@
+"""
+Check that MSDDDiarizer gives the same speaker turns as NeMo's stock
+NeuralDiarizer pipeline, run the way the diarizer used to run it, both when
+it diarizes audio and when it rediarizes it from cached embeddings. Besides
+the turns, the clustering labels and MSDD speaker probabilities they are
+made from have to be identical, and rediarize is timed against diarizing
+the audio from scratch.
+
+Needs NeMo and its pretrained models, so it isn't collected by pytest. Run it
+with ``python tests/check_msdd.py [--device cuda] [--profile balanced]``.
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import faster_whisper  # noqa: E402
+import soundfile  # noqa: E402
+import torch  # noqa: E402
+
+from nemo.collections.asr.models.msdd_models import NeuralDiarizer  # noqa: E402
+from nemo.collections.asr.parts.utils.speaker_utils import (  # noqa: E402
+    get_uniq_id_list_from_manifest,
+    rttm_to_labels,
+)
+
+from diarization.msdd.msdd import PROFILES, MSDDDiarizer, create_config  # noqa: E402
+
+TEST_AUDIO = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "assets", "test.opus"
+)
+
+# settings rediarize is checked with, against the stock pipeline with the same
+REDIARIZE_OPTIONS = [
+    {},
+    {"num_speakers": 2},
+    {"num_speakers": 3},
+    {"max_speakers": 4},
+    {"threshold": 0.5},
+    {"num_speakers": 2, "threshold": 0.9},
+]
+
+
+def record_outputs(model):
+    """
+    Keep the clustering labels and MSDD speaker probabilities of every
+    recording ``model`` diarizes in ``model.last_outputs``, in the order of
+    its manifest.
+    """
+    run_pairwise_diarization = model.run_pairwise_diarization
+
+    def recorded():
+        preds_list, targets_list, signal_lengths_list = run_pairwise_diarization()
+        uniq_ids = get_uniq_id_list_from_manifest(
+            model.msdd_model.cfg.test_ds.manifest_filepath
+        )
+        clus_labels = model.clustering_embedding.clus_test_label_dict
+        model.last_outputs = [
+            (clus_labels[uniq_id], preds)
+            for uniq_id, preds in zip(uniq_ids, preds_list)
+        ]
+        return preds_list, targets_list, signal_lengths_list
+
+    model.run_pairwise_diarization = recorded
+
+
+def stock_diarize(model, audio, num_speakers=None, max_speakers=8, threshold=None):
+    """
+    Diarize ``audio`` with ``NeuralDiarizer.diarize`` in a fresh directory,
+    configured from scratch for the call, and return the labels, the outputs
+    of ``record_outputs`` and the seconds it took.
+    """
+    started = time.perf_counter()
+    msdd_params = model._cfg.diarizer.msdd_model.parameters
+    thresholds = msdd_params.sigmoid_threshold
+    if threshold is not None:
+        msdd_params.sigmoid_threshold = [threshold]
+
+    with tempfile.TemporaryDirectory() as temp_path:
+        audio_path = os.path.join(temp_path, "mono_file.wav")
+        soundfile.write(
+            audio_path, audio.squeeze(0).cpu().numpy(), 16000, subtype="FLOAT"
+        )
+        manifest_path = os.path.join(temp_path, "manifest.json")
+        meta = {
+            "audio_filepath": audio_path,
+            "offset": 0,
+            "duration": None,
+            "label": "infer",
+            "text": "-",
+            "num_speakers": num_speakers,
+            "rttm_filepath": None,
+            "uem_filepath": None,
+        }
+        with open(manifest_path, "w") as f:
+            json.dump(meta, f)
+
+        model._initialize_configs(
+            manifest_path=manifest_path,
+            max_speakers=max_speakers,
+            num_speakers=num_speakers,
+            tmpdir=temp_path,
+            batch_size=24,
+            num_workers=0,
+            verbose=True,
+        )
+        diarizer_params = model.clustering_embedding.clus_diar_model._diarizer_params
+        diarizer_params.out_dir = temp_path
+        diarizer_params.manifest_filepath = manifest_path
+        model.msdd_model.cfg.test_ds.manifest_filepath = manifest_path
+        try:
+            model.diarize()
+        finally:
+            msdd_params.sigmoid_threshold = thresholds
+
+        labels = []
+        for label in rttm_to_labels(
+            os.path.join(temp_path, "pred_rttms", "mono_file.rttm")
+        ):
+            start, end, speaker = label.split()
+            start, end = int(float(start) * 1000), int(float(end) * 1000)
+            labels.append((start, end, int(speaker.split("_")[1])))
+    (outputs,) = model.last_outputs
+    return sorted(labels, key=lambda x: x[0]), outputs, time.perf_counter() - started
+
+
+def get_disagreement_ms(labels, expected):
+    """
+    Return how many milliseconds are given a different set of speakers by
+    ``labels`` than by ``expected``.
+    """
+    boundaries = sorted(
+        {t for start, end, _ in labels + expected for t in (start, end)}
+    )
+
+    def speakers_at(turns, t):
+        return {speaker for start, end, speaker in turns if start <= t < end}
+
+    return sum(
+        end - start
+        for start, end in zip(boundaries, boundaries[1:])
+        if speakers_at(labels, start) != speakers_at(expected, start)
+    )
+
+
+def same_outputs(outputs, expected):
+    """
+    Return whether the clustering labels are identical and the MSDD speaker
+    probabilities of every base-scale segment are. Batches of several
+    recordings change the probabilities by rounding, and pad the shorter
+    recordings with probabilities past their last segment.
+    """
+    (clus_labels, preds), (expected_clus_labels, expected_preds) = outputs, expected
+    length = len(expected_clus_labels)
+    return clus_labels == expected_clus_labels and torch.allclose(
+        preds[:, :length], expected_preds[:, :length], rtol=0, atol=1e-6
+    )
+
+
+def compare(name, labels, outputs, expected, tolerance_ms):
+    """
+    Print how ``labels`` and their ``outputs`` differ from the ``expected``
+    labels and outputs of the stock pipeline, and return whether they are
+    within ``tolerance_ms``. Outputs only have to be identical without a
+    tolerance.
+    """
+    expected_labels, expected_outputs, _ = expected
+    disagreement = get_disagreement_ms(labels, expected_labels)
+    same = labels == expected_labels
+    outputs_same = same_outputs(outputs, expected_outputs)
+    print(
+        f"{name:<40} {len(labels):>5} turns, stock {len(expected_labels):>5}, "
+        f"{'identical' if same else f'{disagreement} ms differ'}, "
+        f"{'same' if outputs_same else 'other'} clustering and MSDD outputs"
+    )
+    return disagreement <= tolerance_ms and (outputs_same or tolerance_ms > 0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "-a",
+        "--audio",
+        default=TEST_AUDIO,
+        help="Audio file to diarize, defaults to the bundled test audio",
+    )
+    parser.add_argument(
+        "--device",
+        default="cuda" if torch.cuda.is_available() else "cpu",
+        help="Device to run the models on",
+    )
+    parser.add_argument(
+        "--profile",
+        default="balanced",
+        choices=list(PROFILES),
+        help="MSDD profile to compare with",
+    )
+    parser.add_argument(
+        "--tolerance-ms",
+        type=int,
+        default=0,
+        help="Fail when more than this many milliseconds get other speakers "
+        "than with the stock pipeline",
+    )
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    audio = torch.from_numpy(faster_whisper.decode_audio(args.audio)).unsqueeze(0)
+    half = audio.shape[-1] // 2
+    # recordings of different lengths, so batches mix them
+    recordings = {
+        "full": audio,
+        "first half": audio[:, :half],
+        "second half": audio[:, half:],
+    }
+
+    stock = NeuralDiarizer(cfg=create_config(args.profile)).to(args.device)
+    record_outputs(stock)
+    expected = {name: stock_diarize(stock, rec) for name, rec in recordings.items()}
+
+    diarizer = MSDDDiarizer(args.device, profile=args.profile)
+    record_outputs(diarizer.model)
+    ok = True
+    diarize_seconds = {}
+    try:
+        for name, rec in recordings.items():
+            labels = diarizer.diarize(rec)
+            diarize_seconds[name] = diarizer.last_timings["total"]
+            ok &= compare(
+                f"diarize {name}",
+                labels,
+                diarizer.model.last_outputs[0],
+                expected[name],
+                args.tolerance_ms,
+            )
+        batched = diarizer.diarize_many(list(recordings.values()))
+        for name, labels, outputs in zip(
+            recordings, batched, diarizer.model.last_outputs
+        ):
+            ok &= compare(
+                f"diarize_many {name}",
+                labels,
+                outputs,
+                expected[name],
+                args.tolerance_ms,
+            )
+
+        # diarize_many cached the embeddings of every recording
+        timings = []
+        for options in REDIARIZE_OPTIONS:
+            name = "rediarize " + (
+                ", ".join(f"{k}={v}" for k, v in options.items()) or "defaults"
+            )
+            labels = diarizer.rediarize(audio, **options)
+            stock_expected = stock_diarize(stock, audio, **options)
+            ok &= compare(
+                name,
+                labels,
+                diarizer.model.last_outputs[0],
+                stock_expected,
+                args.tolerance_ms,
+            )
+            timings.append((name, diarizer.last_timings["total"], stock_expected[2]))
+    finally:
+        diarizer.close()
+
+    print(
+        f"\ndiarize of the full audio took {diarize_seconds['full']:.2f}s, "
+        f"the stock pipeline {expected['full'][2]:.2f}s"
+    )
+    for name, seconds, stock_seconds in timings:
+        print(
+            f"{name:<40} {seconds:>6.2f}s, "
+            f"{seconds / diarize_seconds['full']:>6.1%} of "
+            f"diarize, stock pipeline {stock_seconds:.2f}s"
+        )
+
+    if not ok:
+        sys.exit("MSDDDiarizer disagrees with the stock pipeline")
+    print("MSDDDiarizer matches the stock pipeline")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Check filter_missing_timestamps on the edge cases and against the
+implementation it replaced on a seeded corpus of random transcripts.
+
+Runs under pytest, or on its own with ``python
+tests/test_filter_missing_timestamps.py [--cases N] [--seed S]``.
+"""
+
+import argparse
+import copy
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmark_helpers import baseline_filter_missing_timestamps  # noqa: E402
+from helpers import filter_missing_timestamps  # noqa: E402
+
+
+def transcript(timed):
+    """
+    Return word timestamps one second apart, untimed where ``timed`` is false.
+    """
+    return [
+        (
+            {"word": f"w{i}", "start": float(i), "end": i + 0.5}
+            if is_timed
+            else {"word": f"w{i}"}
+        )
+        for i, is_timed in enumerate(timed)
+    ]
+
+
+def test_leading_missing():
+    result = filter_missing_timestamps(transcript([0, 0, 1, 1]), initial_timestamp=0.25)
+    assert result == [
+        {"word": "w0 w1", "start": 0.25, "end": 2.0},
+        {"word": "w2", "start": 2.0, "end": 2.5},
+        {"word": "w3", "start": 3.0, "end": 3.5},
+    ]
+
+
+def test_trailing_missing():
+    result = filter_missing_timestamps(transcript([1, 1, 0, 0]), final_timestamp=9.0)
+    assert result == [
+        {"word": "w0", "start": 0.0, "end": 0.5},
+        {"word": "w1", "start": 1.0, "end": 1.5},
+        {"word": "w2 w3", "start": 1.5, "end": 9.0},
+    ]
+
+
+def test_single_missing_last_word_ends_where_it_starts():
+    result = filter_missing_timestamps(transcript([1, 0]), final_timestamp=9.0)
+    assert result[-1] == {"word": "w1", "start": 0.5, "end": 0.5}
+
+
+def test_all_missing():
+    result = filter_missing_timestamps(
+        transcript([0] * 5), initial_timestamp=None, final_timestamp=7.0
+    )
+    assert result == [{"word": "w0 w1 w2 w3 w4", "start": 0, "end": 7.0}]
+
+
+def test_inner_run_is_merged_into_the_gap():
+    result = filter_missing_timestamps(transcript([1, 0, 0, 0, 1]))
+    assert result[1] == {"word": "w1 w2 w3", "start": 0.5, "end": 4.0}
+    assert len(result) == 3
+
+
+def test_text_key():
+    word_timestamps = [
+        {"text": "a", "start": 0.0, "end": 0.5},
+        {"text": "b c", "start": None, "end": None},
+        {"text": "d", "start": 2.0, "end": 2.5},
+    ]
+    assert filter_missing_timestamps(word_timestamps, text_key="text")[1] == {
+        "text": "b c",
+        "start": 0.5,
+        "end": 2.0,
+    }
+
+
+def test_empty():
+    assert filter_missing_timestamps([]) == []
+
+
+def corpus(cases=2000, seed=0):
+    rng = random.Random(seed)
+    for _ in range(cases):
+        num_words = rng.choice([1, 2, 3, rng.randint(4, 30), rng.randint(30, 300)])
+        missing_rate = rng.choice([0.0, 0.1, 0.5, 0.9, 1.0])
+        timed = [rng.random() >= missing_rate for _ in range(num_words)]
+        initial_timestamp = rng.choice([0, None, 0.25])
+        final_timestamp = rng.choice([None, num_words + 1.0])
+        yield transcript(timed), initial_timestamp, final_timestamp
+
+
+def check(cases=2000, seed=0):
+    """
+    Return the number of cases on which the result matches the baseline and
+    the input is left as it was.
+    """
+    for i, (word_timestamps, initial, final) in enumerate(corpus(cases, seed)):
+        original = copy.deepcopy(word_timestamps)
+        expected = baseline_filter_missing_timestamps(
+            copy.deepcopy(word_timestamps), initial, final
+        )
+        result = filter_missing_timestamps(word_timestamps, initial, final)
+        assert result == expected, f"case {i}: result differs from the baseline"
+        assert word_timestamps == original, f"case {i}: input was modified"
+    return cases
+
+
+def test_matches_baseline():
+    check()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--cases", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    print(f"{check(args.cases, args.seed)} cases match the baseline")
@@ -0,0 +1,201 @@
+"""
+Compare get_realigned_ws_mapping_with_punctuation with the implementation it
+replaced on a seeded corpus of random transcripts.
+
+Runs under pytest, or on its own with ``python tests/test_realignment.py
+[--cases N] [--seed S]`` to fuzz a bigger corpus.
+"""
+
+import argparse
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from helpers import (  # noqa: E402
+    WordTable,
+    get_realigned_ws_mapping_with_punctuation,
+    sentence_ending_punctuations,
+)
+
+WORDS = ["so", "the", "call", "went", "fine,", "right", "yes.", "no?", "ok!", "a."]
+
+
+def baseline_get_first_word_idx_of_sentence(
+    word_idx, word_list, speaker_list, max_words
+):
+    is_word_sentence_end = (
+        lambda x: x >= 0 and word_list[x][-1] in sentence_ending_punctuations
+    )
+    left_idx = word_idx
+    while (
+        left_idx > 0
+        and word_idx - left_idx < max_words
+        and speaker_list[left_idx - 1] == speaker_list[left_idx]
+        and not is_word_sentence_end(left_idx - 1)
+    ):
+        left_idx -= 1
+
+    return left_idx if left_idx == 0 or is_word_sentence_end(left_idx - 1) else -1
+
+
+def baseline_get_last_word_idx_of_sentence(word_idx, word_list, max_words):
+    is_word_sentence_end = (
+        lambda x: x >= 0 and word_list[x][-1] in sentence_ending_punctuations
+    )
+    right_idx = word_idx
+    while (
+        right_idx < len(word_list) - 1
+        and right_idx - word_idx < max_words
+        and not is_word_sentence_end(right_idx)
+    ):
+        right_idx += 1
+
+    return (
+        right_idx
+        if right_idx == len(word_list) - 1 or is_word_sentence_end(right_idx)
+        else -1
+    )
+
+
+def baseline_get_realigned_ws_mapping_with_punctuation(
+    word_speaker_mapping, max_words_in_sentence=50
+):
+    is_word_sentence_end = (
+        lambda x: x >= 0
+        and word_speaker_mapping[x]["word"][-1] in sentence_ending_punctuations
+    )
+    wsp_len = len(word_speaker_mapping)
+
+    words_list, speaker_list = [], []
+    for k, line_dict in enumerate(word_speaker_mapping):
+        word, speaker = line_dict["word"], line_dict["speaker"]
+        words_list.append(word)
+        speaker_list.append(speaker)
+
+    k = 0
+    while k < len(word_speaker_mapping):
+        line_dict = word_speaker_mapping[k]
+        if (
+            k < wsp_len - 1
+            and speaker_list[k] != speaker_list[k + 1]
+            and not is_word_sentence_end(k)
+        ):
+            left_idx = baseline_get_first_word_idx_of_sentence(
+                k, words_list, speaker_list, max_words_in_sentence
+            )
+            right_idx = (
+                baseline_get_last_word_idx_of_sentence(
+                    k, words_list, max_words_in_sentence - k + left_idx - 1
+                )
+                if left_idx > -1
+                else -1
+            )
+            if min(left_idx, right_idx) == -1:
+                k += 1
+                continue
+
+            spk_labels = speaker_list[left_idx : right_idx + 1]
+            mod_speaker = max(set(spk_labels), key=spk_labels.count)
+            if spk_labels.count(mod_speaker) < len(spk_labels) // 2:
+                k += 1
+                continue
+
+            speaker_list[left_idx : right_idx + 1] = [mod_speaker] * (
+                right_idx - left_idx + 1
+            )
+            k = right_idx
+
+        k += 1
+
+    k, realigned_list = 0, []
+    while k < len(word_speaker_mapping):
+        line_dict = word_speaker_mapping[k].copy()
+        line_dict["speaker"] = speaker_list[k]
+        realigned_list.append(line_dict)
+        k += 1
+
+    return realigned_list
+
+
+def random_mapping(rng):
+    """
+    Return a word-speaker mapping with speaker runs and sentences of random
+    lengths, so that speaker changes fall inside and between sentences.
+    """
+    num_words = rng.choice([1, 2, 3, rng.randint(4, 40), rng.randint(40, 400)])
+    num_speakers = rng.randint(1, 4)
+    speakers = rng.choice(
+        [list(range(num_speakers)), [f"SPEAKER_{i:02d}" for i in range(num_speakers)]]
+    )
+    sentence_end_rate = rng.choice([0.02, 0.1, 0.3])
+    speaker_change_rate = rng.choice([0.02, 0.1, 0.4])
+
+    mapping, speaker, time = [], rng.choice(speakers), 0
+    for _ in range(num_words):
+        if rng.random() < speaker_change_rate:
+            speaker = rng.choice(speakers)
+        word = rng.choice(WORDS)
+        if rng.random() < sentence_end_rate:
+            word = word.rstrip(",") + rng.choice(sentence_ending_punctuations)
+        mapping.append(
+            {
+                "word": word,
+                "start_time": time,
+                "end_time": time + 300,
+                "speaker": speaker,
+            }
+        )
+        time += 350
+    return mapping
+
+
+def corpus(cases=2000, seed=0):
+    rng = random.Random(seed)
+    for _ in range(cases):
+        yield random_mapping(rng), rng.choice([1, 3, 5, 10, 50])
+
+
+def check(cases=2000, seed=0):
+    """
+    Return the number of cases on which the list and WordTable paths both
+    give the baseline result.
+    """
+    for i, (mapping, max_words) in enumerate(corpus(cases, seed)):
+        expected = baseline_get_realigned_ws_mapping_with_punctuation(
+            mapping, max_words
+        )
+        realigned = get_realigned_ws_mapping_with_punctuation(mapping, max_words)
+        assert realigned == expected, f"case {i}: list result differs from the baseline"
+
+        table = get_realigned_ws_mapping_with_punctuation(
+            WordTable.from_records(mapping), max_words
+        )
+        assert (
+            table.to_records() == expected
+        ), f"case {i}: WordTable result differs from the baseline"
+    return cases
+
+
+def test_matches_baseline():
+    check()
+
+
+def test_input_is_not_modified():
+    for mapping, max_words in corpus(200, seed=1):
+        original = [dict(line_dict) for line_dict in mapping]
+        get_realigned_ws_mapping_with_punctuation(mapping, max_words)
+        assert mapping == original
+
+
+def test_empty():
+    assert get_realigned_ws_mapping_with_punctuation([]) == []
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--cases", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    print(f"{check(args.cases, args.seed)} cases match the baseline")
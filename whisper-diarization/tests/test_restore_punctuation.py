@@ -0,0 +1,60 @@
+"""
+Check that restore_punctuation gives the same words for a WordTable, which
+only rewrites the words that end a sentence, as for a list of word dicts.
+"""
+
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from helpers import WordTable  # noqa: E402
+from punctuation import restore_punctuation  # noqa: E402
+
+WORDS = ["so", "fine,", "yes.", "no?", "U.S.A.", "Mr.", "e.g", "", "ok!", "wait..."]
+LABELS = ["0", "0", "0", ",", ".", "?", "!", ":"]
+
+
+def random_case(rng):
+    num_words = rng.choice([1, 2, rng.randint(3, 50), rng.randint(50, 500)])
+    mapping = [
+        {
+            "word": rng.choice(WORDS),
+            "start_time": i * 100,
+            "end_time": i * 100 + 90,
+            "speaker": rng.randint(0, 2),
+        }
+        for i in range(num_words)
+    ]
+    labeled_words = [
+        [word_dict["word"], rng.choice(LABELS), 0.9] for word_dict in mapping
+    ]
+    return mapping, labeled_words
+
+
+def test_table_matches_list():
+    rng = random.Random(0)
+    for i in range(500):
+        mapping, labeled_words = random_case(rng)
+        table = restore_punctuation(WordTable.from_records(mapping), labeled_words)
+        expected = restore_punctuation(mapping, labeled_words)
+        assert table.to_records() == expected, f"case {i} differs"
+
+
+def test_punctuated_words_are_kept():
+    mapping = [
+        {"word": word, "start_time": 0, "end_time": 0, "speaker": 0}
+        for word in ["fine,", "wait", "ok.", "why?"]
+    ]
+    labeled_words = [[None, ".", 0.9] for _ in mapping]
+    table = restore_punctuation(WordTable.from_records(mapping), labeled_words)
+    assert table.words == ["fine,", "wait.", "ok.", "why?"]
+
+
+def test_nothing_to_punctuate_shares_the_text():
+    table = WordTable.from_records(
+        [{"word": "so", "start_time": 0, "end_time": 0, "speaker": 0}]
+    )
+    punctuated = restore_punctuation(table, [["so", "0", 0.9]])
+    assert punctuated.text is table.text
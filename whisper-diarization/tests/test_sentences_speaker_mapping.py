@@ -0,0 +1,152 @@
+"""
+Compare get_sentences_speaker_mapping, which only hands Punkt the end of the
+current sentence, with the implementation that checked the whole sentence on
+every word, on a seeded corpus of random transcripts.
+
+Runs under pytest, or on its own with ``python tests/test_sentences_speaker_mapping.py
+[--cases N] [--seed S]`` to fuzz a bigger corpus.
+"""
+
+import argparse
+import os
+import random
+import sys
+
+import nltk
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from helpers import WordTable, get_sentences_speaker_mapping  # noqa: E402
+
+# abbreviations, initials, numbers, ellipses spaced and unspaced, quotes and
+# the leading spaces and empty words Whisper sometimes gives
+WORDS = [
+    "so",
+    "the",
+    "call",
+    "went",
+    "fine,",
+    "right",
+    "yes.",
+    "no?",
+    "ok!",
+    "a.",
+    "Mr.",
+    "Dr.",
+    "U.S.",
+    "e.g.",
+    "J.",
+    "3.5",
+    "12.",
+    "...",
+    ".",
+    ". .",
+    "..",
+    "well...",
+    '"yes."',
+    "(no).",
+    "'ok!'",
+    " Then",
+    " we",
+    "",
+    " ",
+    "It",
+    "And",
+]
+
+
+def baseline_get_sentences_speaker_mapping(word_speaker_mapping, spk_ts):
+    sentence_checker = nltk.tokenize.PunktSentenceTokenizer().text_contains_sentbreak
+    s, e, spk = spk_ts[0]
+    prev_spk = spk
+
+    snts = []
+    snt = {"speaker": f"Speaker {spk}", "start_time": s, "end_time": e, "text": ""}
+
+    for wrd_dict in word_speaker_mapping:
+        wrd, spk = wrd_dict["word"], wrd_dict["speaker"]
+        s, e = wrd_dict["start_time"], wrd_dict["end_time"]
+        if spk != prev_spk or sentence_checker(snt["text"] + " " + wrd):
+            snts.append(snt)
+            snt = {
+                "speaker": f"Speaker {spk}",
+                "start_time": s,
+                "end_time": e,
+                "text": "",
+            }
+        else:
+            snt["end_time"] = e
+        snt["text"] += wrd + " "
+        prev_spk = spk
+
+    snts.append(snt)
+    return snts
+
+
+def random_mapping(rng):
+    """
+    Return a word-speaker mapping and speaker turns, with sentences and
+    speaker runs of random lengths.
+    """
+    num_words = rng.choice([1, 2, 3, rng.randint(4, 40), rng.randint(40, 300)])
+    num_speakers = rng.randint(1, 3)
+    speaker_change_rate = rng.choice([0.0, 0.05, 0.3])
+
+    mapping, speaker, time = [], rng.randrange(num_speakers), 0
+    for _ in range(num_words):
+        if rng.random() < speaker_change_rate:
+            speaker = rng.randrange(num_speakers)
+        mapping.append(
+            {
+                "word": rng.choice(WORDS),
+                "start_time": time,
+                "end_time": time + 300,
+                "speaker": speaker,
+            }
+        )
+        time += 350
+    spk_ts = [[0, time, mapping[0]["speaker"]]]
+    return mapping, spk_ts
+
+
+def check(cases=1000, seed=0):
+    """
+    Return the number of cases on which the list and WordTable paths both
+    give the baseline sentences.
+    """
+    rng = random.Random(seed)
+    for i in range(cases):
+        mapping, spk_ts = random_mapping(rng)
+        expected = baseline_get_sentences_speaker_mapping(mapping, spk_ts)
+        assert (
+            get_sentences_speaker_mapping(mapping, spk_ts) == expected
+        ), f"case {i}: list result differs from the baseline"
+        assert (
+            get_sentences_speaker_mapping(WordTable.from_records(mapping), spk_ts)
+            == expected
+        ), f"case {i}: WordTable result differs from the baseline"
+    return cases
+
+
+def test_matches_baseline():
+    check()
+
+
+def test_spaced_ellipsis():
+    words = ["he", "said", ".", ".", ".", "and", "left.", "Then", "she", "came."]
+    mapping = [
+        {"word": word, "start_time": i * 100, "end_time": i * 100 + 90, "speaker": 0}
+        for i, word in enumerate(words)
+    ]
+    spk_ts = [[0, 1000, 0]]
+    assert get_sentences_speaker_mapping(
+        mapping, spk_ts
+    ) == baseline_get_sentences_speaker_mapping(mapping, spk_ts)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--cases", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    print(f"{check(args.cases, args.seed)} cases match the baseline")
@@ -0,0 +1,103 @@
+"""
+Check that SpeakerIndex enrolls, identifies and deletes speakers, and that
+an index reads back from disk the way it was saved.
+"""
+
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from diarization import SpeakerIndex  # noqa: E402
+
+DIM = 16
+
+
+def random_speakers(num_speakers, seed=0):
+    rng = np.random.default_rng(seed)
+    return {f"speaker {i}": rng.standard_normal(DIM) for i in range(num_speakers)}
+
+
+def noisy(embedding, seed, scale=0.1):
+    rng = np.random.default_rng(seed)
+    return embedding + scale * np.linalg.norm(embedding) * rng.standard_normal(DIM)
+
+
+def test_enroll_averages_samples(tmp_path):
+    index = SpeakerIndex(str(tmp_path), model="model")
+    first, second = np.eye(DIM)[0], np.eye(DIM)[1]
+    index.enroll("Alice", first)
+    index.enroll("Alice", [second, second])
+
+    assert len(index) == 1 and "Alice" in index
+    (speaker,) = index.list_speakers()
+    assert speaker["name"] == "Alice" and speaker["samples"] == 3
+    names, scores = index.search(first + 2 * second)
+    assert names == [["Alice"]]
+    assert scores[0, 0] == pytest.approx(1, abs=1e-3)
+
+    with pytest.raises(ValueError):
+        index.enroll("Bob", np.ones(DIM + 1))
+
+
+def test_identify(tmp_path):
+    speakers = random_speakers(20)
+    index = SpeakerIndex(str(tmp_path), model="model")
+    for name, embedding in speakers.items():
+        index.enroll(name, embedding)
+
+    identities = index.identify(
+        {
+            0: noisy(speakers["speaker 3"], 1),
+            1: noisy(speakers["speaker 7"], 2),
+            # nobody enrolled
+            2: np.random.default_rng(3).standard_normal(DIM),
+        }
+    )
+    assert identities == {0: "speaker 3", 1: "speaker 7", 2: None}
+
+
+def test_identify_gives_every_name_once(tmp_path):
+    speakers = random_speakers(2)
+    index = SpeakerIndex(str(tmp_path), model="model")
+    index.enroll("speaker 0", speakers["speaker 0"])
+
+    identities = index.identify(
+        {
+            0: noisy(speakers["speaker 0"], 1, scale=0.3),
+            1: noisy(speakers["speaker 0"], 2, scale=0.05),
+        },
+        threshold=0.5,
+    )
+    assert identities == {0: None, 1: "speaker 0"}
+
+
+def test_save_and_load(tmp_path):
+    speakers = random_speakers(5)
+    index = SpeakerIndex(str(tmp_path), model="model")
+    for name, embedding in speakers.items():
+        index.enroll(name, embedding)
+    assert index.delete("speaker 1")
+    assert not index.delete("speaker 1")
+    index.save()
+
+    loaded = SpeakerIndex(str(tmp_path))
+    assert loaded.model == "model" and loaded.dim == DIM
+    assert loaded.list_speakers() == index.list_speakers()
+    assert "speaker 1" not in loaded
+    queries = np.stack([speakers[f"speaker {i}"] for i in (0, 2, 3, 4)])
+    names, scores = loaded.search(queries, top_k=2)
+    assert names == index.search(queries, top_k=2)[0]
+    assert [row[0] for row in names] == [
+        "speaker 0",
+        "speaker 2",
+        "speaker 3",
+        "speaker 4",
+    ]
+    np.testing.assert_allclose(scores, index.search(queries, top_k=2)[1])
+
+    with pytest.raises(ValueError):
+        SpeakerIndex(str(tmp_path), model="another model")
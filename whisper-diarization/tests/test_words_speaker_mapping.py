@@ -0,0 +1,49 @@
+"""
+Compare get_words_speaker_mapping with the word-by-word loop it replaced on
+synthetic transcripts, and check the transcripts without speaker turns.
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmark_helpers import (  # noqa: E402
+    baseline_get_words_speaker_mapping,
+    synthesize_transcript,
+)
+from helpers import WordTable, get_words_speaker_mapping  # noqa: E402
+
+
+def test_matches_baseline():
+    for seed in range(5):
+        word_timestamps, speaker_ts = synthesize_transcript(2000, seed=seed)
+        for anchor in ("start", "mid", "end"):
+            expected = baseline_get_words_speaker_mapping(
+                word_timestamps, speaker_ts, anchor
+            )
+            assert (
+                get_words_speaker_mapping(word_timestamps, speaker_ts, anchor)
+                == expected
+            )
+            table = WordTable.from_word_timestamps(word_timestamps)
+            assert (
+                get_words_speaker_mapping(table, speaker_ts, anchor).to_records()
+                == expected
+            )
+
+
+def test_no_speaker_turns_gives_speaker_0():
+    word_timestamps, _ = synthesize_transcript(50)
+    mapping = get_words_speaker_mapping(word_timestamps, [])
+    assert [line_dict["speaker"] for line_dict in mapping] == [0] * 50
+
+    table = get_words_speaker_mapping(
+        WordTable.from_word_timestamps(word_timestamps), []
+    )
+    assert table.to_records() == mapping
+
+
+def test_empty():
+    assert get_words_speaker_mapping([], []) == []
+    assert get_words_speaker_mapping([], [[0, 1000, 1]]) == []
@@ -0,0 +1,258 @@
+import json
+import os
+
+from helpers import format_timestamp
+
+# text formats are meant for people and keep the byte order mark that
+# editors on Windows need, the rest are parsed by tools and never get one
+TEXT_FORMATS = ("txt", "timestamped", "srt", "vtt")
+
+
+def normalize_segment(segment):
+    """
+    Return a segment as ``speaker``, ``start_time`` and ``end_time`` in
+    milliseconds, ``text`` and, if it has any, ``words``.
+
+    Accepts the sentence dicts of ``get_sentences_speaker_mapping`` as well
+    as segments with ``start`` and ``end`` in seconds.
+    """
+    if "start_time" in segment:
+        start, end = segment["start_time"], segment["end_time"]
+    else:
+        start, end = segment["start"] * 1000, segment["end"] * 1000
+
+    normalized = {
+        "speaker": segment["speaker"],
+        "start_time": int(round(start)),
+        "end_time": int(round(end)),
+        "text": segment["text"],
+    }
+    if segment.get("words"):
+        normalized["words"] = segment["words"]
+    return normalized
+
+
+def _to_json_object(segment):
+    obj = {
+        "speaker": segment["speaker"],
+        "start": segment["start_time"] / 1000,
+        "end": segment["end_time"] / 1000,
+        "text": segment["text"].strip(),
+    }
+    if "words" in segment:
+        obj["words"] = segment["words"]
+    return obj
+
+
+class _TXTFormat:
+    def __init__(self, f, file_id):
+        self.f = f
+        self.previous_speaker = None
+
+    def write(self, segment):
+        speaker = segment["speaker"]
+        # If this speaker doesn't match the previous one, start a new paragraph
+        if self.previous_speaker is None:
+            self.f.write(f"{speaker}: ")
+        elif speaker != self.previous_speaker:
+            self.f.write(f"\n\n{speaker}: ")
+        self.previous_speaker = speaker
+
+        self.f.write(segment["text"] + " ")
+
+    def close(self):
+        pass
+
+
+class _TimestampedTXTFormat:
+    # written next to the plain TXT, not over it
+    extension = "timestamped.txt"
+
+    def __init__(self, f, file_id):
+        self.f = f
+
+    def write(self, segment):
+        self.f.write(
+            f"[{_format_clock(segment['start_time'])} - "
+            f"{_format_clock(segment['end_time'])}] {segment['speaker']}:\n"
+            f"{segment['text'].strip()}\n\n"
+        )
+
+    def close(self):
+        pass
+
+
+def _format_clock(milliseconds):
+    seconds = milliseconds // 1000
+    return f"{seconds // 3600:02d}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+
+
+class _SRTFormat:
+    def __init__(self, f, file_id):
+        self.f = f
+        self.index = 0
+
+    def write(self, segment):
+        self.index += 1
+        self.f.write(
+            f"{self.index}\n"
+            f"{format_timestamp(segment['start_time'])} --> "
+            f"{format_timestamp(segment['end_time'])}\n"
+            f"{segment['speaker']}: {segment['text'].strip().replace('-->', '->')}\n\n"
+        )
+
+    def close(self):
+        pass
+
+
+class _VTTFormat:
+    def __init__(self, f, file_id):
+        self.f = f
+        self.f.write("WEBVTT\n\n")
+
+    def write(self, segment):
+        self.f.write(
+            f"{format_timestamp(segment['start_time'], decimal_marker='.')} --> "
+            f"{format_timestamp(segment['end_time'], decimal_marker='.')}\n"
+            f"<v {segment['speaker']}>{segment['text'].strip().replace('-->', '->')}\n\n"
+        )
+
+    def close(self):
+        pass
+
+
+class _RTTMFormat:
+    def __init__(self, f, file_id):
+        self.f = f
+        self.file_id = file_id.replace(" ", "_")
+
+    def write(self, segment):
+        start, end = segment["start_time"], segment["end_time"]
+        speaker = str(segment["speaker"]).replace(" ", "_")
+        self.f.write(
+            f"SPEAKER {self.file_id} 1 {start / 1000:.3f} {(end - start) / 1000:.3f} "
+            f"<NA> <NA> {speaker} <NA> <NA>\n"
+        )
+
+    def close(self):
+        pass
+
+
+class _JSONFormat:
+    def __init__(self, f, file_id):
+        self.f = f
+        self.empty = True
+
+    def write(self, segment):
+        # json doesn't leave raw newlines in strings, so indenting is safe
+        item = json.dumps(_to_json_object(segment), ensure_ascii=False, indent=2)
+        self.f.write(("[\n  " if self.empty else ",\n  ") + item.replace("\n", "\n  "))
+        self.empty = False
+
+    def close(self):
+        self.f.write("[]\n" if self.empty else "\n]\n")
+
+
+class _JSONLFormat:
+    def __init__(self, f, file_id):
+        self.f = f
+
+    def write(self, segment):
+        self.f.write(json.dumps(_to_json_object(segment), ensure_ascii=False) + "\n")
+
+    def close(self):
+        pass
+
+
+FORMATS = {
+    "txt": _TXTFormat,
+    "timestamped": _TimestampedTXTFormat,
+    "srt": _SRTFormat,
+    "vtt": _VTTFormat,
+    "rttm": _RTTMFormat,
+    "json": _JSONFormat,
+    "jsonl": _JSONLFormat,
+}
+
+
+def output_path(base_path: str, fmt: str) -> str:
+    """
+    Return the path ``TranscriptWriter`` writes the ``fmt`` transcript to.
+    """
+    return f"{base_path}.{getattr(FORMATS[fmt], 'extension', fmt)}"
+
+
+class TranscriptWriter:
+    """
+    Writes a transcript to several formats while walking it once.
+
+    Every requested format goes to its own buffered ``<base_path>.<format>``
+    file, so writing a segment only copies it into the buffers and the
+    files are flushed in ``buffer_size`` blocks. ``timestamped`` is a TXT
+    that gives every segment its times, in ``<base_path>.timestamped.txt``.
+    Segments are normalized with ``normalize_segment``; JSON and JSON Lines
+    hold the start and end in seconds and the words when the segments have
+    them.
+    """
+
+    def __init__(
+        self,
+        base_path: str,
+        formats=("txt", "srt"),
+        encoding: str = "utf-8-sig",
+        buffer_size: int = 1 << 16,
+    ):
+        unknown = [fmt for fmt in formats if fmt not in FORMATS]
+        if unknown:
+            raise ValueError(f"Unsupported output formats: {', '.join(unknown)}")
+
+        file_id = os.path.basename(base_path)
+        self.paths = {}
+        self._formats = []
+        try:
+            for fmt in dict.fromkeys(formats):
+                path = output_path(base_path, fmt)
+                f = open(
+                    path,
+                    "w",
+                    encoding=encoding if fmt in TEXT_FORMATS else "utf-8",
+                    errors="replace",
+                    buffering=buffer_size,
+                )
+                self.paths[fmt] = path
+                self._formats.append(FORMATS[fmt](f, file_id))
+        except BaseException:
+            self.close()
+            raise
+
+    def write(self, segment):
+        segment = normalize_segment(segment)
+        for output in self._formats:
+            output.write(segment)
+
+    def write_all(self, segments):
+        for segment in segments:
+            self.write(segment)
+
+    def close(self):
+        for output in self._formats:
+            try:
+                output.close()
+            finally:
+                output.f.close()
+        self._formats = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def write_transcript(segments, base_path: str, formats=("txt", "srt"), **kwargs):
+    """
+    Write ``segments`` to every format in ``formats`` and return their paths.
+    """
+    with TranscriptWriter(base_path, formats, **kwargs) as writer:
+        writer.write_all(segments)
+    return writer.paths